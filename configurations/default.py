@@ -24,6 +24,23 @@ config = {
         "engine": "diskcache", 
         "params": {"size_limit": int(4*2**30)}
     },
+    # Index of data source directories for the file browser.  Local
+    # directory listings can be up to max_age seconds stale, and the first
+    # listing of a directory reads every data file inside it.
+    # "catalog": {"path": "~/.reductus/catalog.db", "max_age": 60},
+    # Run submit_job calculations in a pool of worker processes.  Set
+    # "broker" to the redis connection arguments, e.g., {"host": "localhost"},
+    # to queue the jobs for "python -m dataflow.jobs" workers instead.
+    # The local pool only works with a single server process; use the
+    # broker when running several (e.g., start_flask_many.sh).
+    # "jobs": {"workers": 4, "ttl": 600},
+    # Compress responses larger than min_size bytes using the encodings
+    # accepted by the client.  Set "cache" to keep the compressed responses
+    # in the cache so that repeated requests are not compressed again.
+    # "compression": {"min_size": 1024, "cache": True},
+    # Store detector values from these loaders in single precision to halve
+    # the memory and cache size of large detector arrays.
+    # "precision": {"candor": "single", "vsans": "single"},
     "data_sources": [
         {
             "name": "local",
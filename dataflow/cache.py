@@ -15,6 +15,8 @@ import os
 import subprocess
 import time
 import tempfile
+import threading
+import contextlib
 
 try:
     # CRUFT: use cPickle for python 2.7
@@ -24,6 +26,11 @@ except ImportError:
 
 PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL # use the best
 
+#: Prefix for the cache keys used to lock calculations between processes
+LOCK_PREFIX = "lock:"
+#: Time (seconds) after which the lock of a process which died expires
+LOCK_TIMEOUT = 600
+
 def memory_cache():
     from . import fakeredis
     return fakeredis.MemoryCache()
@@ -77,6 +84,8 @@ class CacheManager(object):
         self._engine = None
         self._use_compression = False
         self._pickle_protocol = PICKLE_PROTOCOL
+        self._locks = {}  # key => [lock, number of users]
+        self._locks_guard = threading.Lock()
 
     @property
     def engine(self):
@@ -194,6 +203,56 @@ class CacheManager(object):
     def exists(self, key):
         return self._cache.exists(key)
 
+    @contextlib.contextmanager
+    def lock(self, key):
+        """
+        Context manager which holds a lock on *key* while the value is
+        computed, so that concurrent requests for the same value can wait
+        for the first calculation and then retrieve it from the cache.
+
+        Threads within the process use a lock for each key.  Processes
+        sharing a redis or diskcache cache also lock the key in the cache,
+        with the lock expiring after *LOCK_TIMEOUT* seconds in case the
+        process holding it dies.
+        """
+        with self._thread_lock(key):
+            engine = getattr(self, '_cache_engine', None)
+            if engine == "redis":
+                lock = self._cache.lock(LOCK_PREFIX + key, timeout=LOCK_TIMEOUT)
+            elif engine == "diskcache":
+                from diskcache import Lock
+                lock = Lock(self._cache, LOCK_PREFIX + key, expire=LOCK_TIMEOUT)
+            else:
+                lock = None
+            if lock is None:
+                yield
+                return
+            lock.acquire()
+            try:
+                yield
+            finally:
+                try:
+                    lock.release()
+                except Exception as exc:
+                    # Redis raises an error if the lock expired during a long
+                    # calculation; the value is cached either way.
+                    warnings.warn("releasing lock on %s failed with: %s"
+                                  % (key, exc))
+
+    @contextlib.contextmanager
+    def _thread_lock(self, key):
+        with self._locks_guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
 
 # Singleton cache manager if you only need one cache
 CACHE_MANAGER = CacheManager()
@@ -204,3 +263,26 @@ use_diskcache = CACHE_MANAGER.use_diskcache
 get_cache = CACHE_MANAGER.get_cache_manager
 get_file_cache = CACHE_MANAGER.get_file_cache
 set_test_cache = CACHE_MANAGER.use_memory
+
+
+def test_lock():
+    import time
+
+    manager = CacheManager()
+    manager.use_memory()
+    calls = []
+    def compute(key):
+        with manager.lock(key):
+            if not manager.exists(key):
+                calls.append(key)
+                time.sleep(0.05)
+                manager.store(key, len(calls))
+        return manager.retrieve(key)
+    threads = [threading.Thread(target=compute, args=(key,))
+               for key in ("a", "b")*4]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(calls) == ["a", "b"]
+    assert manager._locks == {}
@@ -22,6 +22,7 @@ from .cache import get_cache
 from .core import lookup_module, lookup_datatype
 from .core import Bundle
 from .automod import validate
+from . import precision
 
 IS_PY3 = sys.version_info[0] >= 3
 
@@ -99,24 +100,36 @@ def process_template(template, config, target=(None, None)):
             results.update((_key(node, k), v) for k, v in bundles.items())
             continue
 
-        # Fields set for the current node
-        template_fields = node_info.get('config', {})
-        user_fields = config.get(str(node), {})
-
-        # Evaluate the node
-        print("calculating %s %s"%(node, module.id))
-        outputs = _eval_node(node_id, module, inputs, template_fields, user_fields)
-
-        # Collect the outputs
-        bundles = {}
-        for terminal in module.outputs:
-            tid = terminal["id"]
-            bundles[tid] = _bundle(terminal, outputs[tid])
-        #print "caching", module.id, bundles
-        #print "caching",_serialize(bundles, module.outputs)
-        if module.cached:
-            print("caching %s %s %s"%(node, module.id, fingerprints[node]))
-            cache.store(fingerprints[node], bundles)
+        # Only one request computes the node at a time.  Concurrent requests
+        # for the same fingerprint wait for the lock, then find the value
+        # in the cache.
+        lock = cache.lock(fingerprints[node]) if module.cached else _no_lock()
+        with lock:
+            if module.cached and cache.exists(fingerprints[node]):
+                print("retrieving value computed by another request for node %d: %s"
+                      %(node, fingerprints[node]))
+                bundles = cache.retrieve(fingerprints[node])
+                results.update((_key(node, k), v) for k, v in bundles.items())
+                continue
+
+            # Fields set for the current node
+            template_fields = node_info.get('config', {})
+            user_fields = config.get(str(node), {})
+
+            # Evaluate the node
+            print("calculating %s %s"%(node, module.id))
+            outputs = _eval_node(node_id, module, inputs, template_fields, user_fields)
+
+            # Collect the outputs
+            bundles = {}
+            for terminal in module.outputs:
+                tid = terminal["id"]
+                bundles[tid] = _bundle(terminal, outputs[tid])
+            #print "caching", module.id, bundles
+            #print "caching",_serialize(bundles, module.outputs)
+            if module.cached:
+                print("caching %s %s %s"%(node, module.id, fingerprints[node]))
+                cache.store(fingerprints[node], bundles)
         results.update((_key(node, k), v) for k, v in bundles.items())
 
     #print list(sorted(results.keys()))
@@ -126,6 +139,13 @@ def process_template(template, config, target=(None, None)):
     else:
         return results[_key(return_node, return_terminal)]
 
+@contextlib.contextmanager
+def _no_lock():
+    """
+    Stand-in for the cache lock for modules which are not cached.
+    """
+    yield
+
 def _bundle(terminal, values):
     """
     Build a bundle for the terminal values.  The bundle has to carry the
@@ -335,6 +355,9 @@ def fingerprint_node(module, node_config, inputs_fp):
     config_str = str(_format_ordered(config))
     current_module_version = lookup_module(module['module']).version
     parts = [module['module'], current_module_version, config_str] + inputs_fp
+    policy = precision.fingerprint()
+    if policy:
+        parts.append(policy)
     return generate_fingerprint(parts)
 
 def generate_fingerprint(parts):
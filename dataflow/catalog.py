@@ -0,0 +1,394 @@
+"""
+Persistent catalog of the files available in each data source.
+
+Listing a large experiment directory requires a stat for every file, and
+remote sources require a round trip to the file helper for every request.
+The :class:`FileCatalog` keeps an SQLite index of the files seen in each
+directory (path, mtime, size) along with a summary of the entries in each
+file (instrument, sample name, intent, polarization and scan range) so that
+the directory tree can be served from the index.
+
+The catalog is updated incrementally.  For local sources, only files whose
+mtime or size has changed since the last scan are re-indexed.  For remote
+sources the listing returned by the file helper is stored and reused until
+it is older than *max_age* seconds.
+
+Entry summaries are produced by extractors registered with
+:func:`register_extractor` for a given file suffix.  An extractor is called
+as *extractor(filename, file_obj)* and returns a list of dicts with keys
+*entry, instrument, sample, intent, polarization, scan_min, scan_max*.
+Missing keys are stored as NULL.
+
+A singleton catalog is configured with :func:`use_catalog` and retrieved
+with :func:`get_catalog`, which returns None if no catalog is configured.
+"""
+from __future__ import print_function
+
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+ENTRY_FIELDS = (
+    "entry", "instrument", "sample", "intent", "polarization",
+    "scan_min", "scan_max",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS directories (
+    source TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (source, directory)
+);
+CREATE TABLE IF NOT EXISTS files (
+    source TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    mtime INTEGER,
+    size INTEGER,
+    PRIMARY KEY (source, directory, name)
+);
+CREATE TABLE IF NOT EXISTS entries (
+    source TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    entry TEXT,
+    instrument TEXT,
+    sample TEXT,
+    intent TEXT,
+    polarization TEXT,
+    scan_min REAL,
+    scan_max REAL
+);
+CREATE INDEX IF NOT EXISTS entries_by_file
+    ON entries (source, directory, name);
+CREATE INDEX IF NOT EXISTS entries_by_sample
+    ON entries (source, sample);
+"""
+
+_EXTRACTORS = []
+
+def register_extractor(suffix, extractor):
+    """
+    Register *extractor(filename, file_obj)* for files ending in *suffix*.
+
+    Later registrations take precedence over earlier ones.
+    """
+    _EXTRACTORS.insert(0, (suffix, extractor))
+
+def find_extractor(filename):
+    """
+    Return the extractor for *filename*, or None if there isn't one.
+    """
+    for suffix, extractor in _EXTRACTORS:
+        if filename.endswith(suffix):
+            return extractor
+    return None
+
+def _directory_key(pathlist):
+    return "/".join(pathlist)
+
+
+class FileCatalog(object):
+    """
+    SQLite-backed index of files in the data sources.
+
+    *path* is the database file, or ":memory:" for a transient catalog.
+
+    *max_age* is the number of seconds for which a directory listing is
+    considered current.  Local directories are rescanned after *max_age*,
+    and remote listings are refetched from the file helper.
+    """
+    def __init__(self, path=":memory:", max_age=60.):
+        if path != ":memory:":
+            path = os.path.expanduser(path)
+            dirname = os.path.dirname(path)
+            if dirname and not os.path.exists(dirname):
+                os.makedirs(dirname)
+        self.path = path
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def is_current(self, source, pathlist, now=None):
+        """
+        Return True if the listing for *pathlist* is younger than *max_age*.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            row = self.db.execute(
+                "SELECT updated FROM directories"
+                " WHERE source=? AND directory=?",
+                (source, _directory_key(pathlist))).fetchone()
+        return row is not None and now - row[0] < self.max_age
+
+    def update_local(self, source, pathlist):
+        """
+        Rescan the local directory *pathlist*, reindexing changed files.
+
+        Only absolute paths are supported.  Files whose mtime and size
+        are unchanged since the previous scan are not reopened.
+
+        Returns the list of file names which were (re)indexed.
+        """
+        path = os.path.join(os.sep, *pathlist)
+        directory = _directory_key(pathlist)
+        with self.lock:
+            known = dict(
+                (name, (is_dir, mtime, size))
+                for name, is_dir, mtime, size in self.db.execute(
+                    "SELECT name, is_dir, mtime, size FROM files"
+                    " WHERE source=? AND directory=?", (source, directory)))
+
+        current = {}
+        for item in os.scandir(path):
+            if item.name.startswith("."):
+                continue
+            try:
+                stat = item.stat()
+                is_dir = item.is_dir()
+            except OSError:
+                # you've probably hit an unfulfilled path link or something.
+                continue
+            size = 0 if is_dir else stat.st_size
+            current[item.name] = (int(is_dir), int(stat.st_mtime), size)
+
+        changed = [name for name, info in current.items()
+                   if known.get(name) != info]
+        removed = [name for name in known if name not in current]
+        summaries = dict(
+            (name, self._extract(os.path.join(path, name)))
+            for name in changed if not current[name][0])
+
+        with self.lock, self.db:
+            for name in removed + changed:
+                self._forget(source, directory, name)
+            self.db.executemany(
+                "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                [(source, directory, name) + current[name]
+                 for name in changed])
+            for name, entries in summaries.items():
+                self._insert_entries(source, directory, name, entries)
+            self._touch(source, directory)
+
+        return [name for name in changed if not current[name][0]]
+
+    def update_listing(self, source, pathlist, listing):
+        """
+        Store the *listing* returned by a remote file helper for *pathlist*.
+
+        *listing* has the same structure as returned by :meth:`listing`.
+        Entry summaries are not available for remote files.
+        """
+        directory = _directory_key(pathlist)
+        files_metadata = listing.get("files_metadata", {})
+        rows = [(source, directory, name, 1, None, None)
+                for name in listing.get("subdirs", [])]
+        rows.extend(
+            (source, directory, name, 0,
+             files_metadata.get(name, {}).get("mtime", None),
+             files_metadata.get(name, {}).get("size", None))
+            for name in listing.get("files", []))
+        with self.lock, self.db:
+            self.db.execute(
+                "DELETE FROM files WHERE source=? AND directory=?",
+                (source, directory))
+            self.db.executemany(
+                "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._touch(source, directory)
+
+    def listing(self, source, pathlist):
+        """
+        Return the indexed contents of *pathlist* for the UI file tree.
+
+        The result is *{subdirs, files, pathlist, files_metadata}* with
+        subdirectories and files ordered by mtime, and *files_metadata*
+        giving *{name: {mtime, size, entries}}* for each file.
+        """
+        directory = _directory_key(pathlist)
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT name, is_dir, mtime, size FROM files"
+                " WHERE source=? AND directory=?"
+                " ORDER BY mtime, name", (source, directory)).fetchall()
+            entries = self.db.execute(
+                "SELECT name, " + ", ".join(ENTRY_FIELDS) + " FROM entries"
+                " WHERE source=? AND directory=?",
+                (source, directory)).fetchall()
+
+        subdirs, files, files_metadata = [], [], {}
+        for name, is_dir, mtime, size in rows:
+            if is_dir:
+                subdirs.append(name)
+            else:
+                files.append(name)
+                files_metadata[name] = {"mtime": mtime}
+                if size is not None:
+                    files_metadata[name]["size"] = size
+        for row in entries:
+            summary = dict(zip(ENTRY_FIELDS, row[1:]))
+            files_metadata[row[0]].setdefault("entries", []).append(summary)
+
+        return {
+            "subdirs": subdirs,
+            "files": files,
+            "pathlist": pathlist,
+            "files_metadata": files_metadata,
+        }
+
+    def find(self, source, pathlist=None, **conditions):
+        """
+        Search the entries of *source* for matching fields.
+
+        *pathlist* restricts the search to the directory and its
+        subdirectories.  *conditions* are exact matches on any of
+        *instrument, sample, intent, polarization*.  Use *scan_min* and
+        *scan_max* to select entries whose scan range overlaps the interval.
+
+        Returns a list of dicts with *pathlist, name* and the entry fields.
+        """
+        where, args = ["source=?"], [source]
+        if pathlist:
+            directory = _directory_key(pathlist)
+            where.append("(directory=? OR directory LIKE ?)")
+            args.extend([directory, directory + "/%"])
+        for key in ("instrument", "sample", "intent", "polarization"):
+            if key in conditions:
+                where.append(key + "=?")
+                args.append(conditions.pop(key))
+        if "scan_min" in conditions:
+            where.append("scan_max>=?")
+            args.append(conditions.pop("scan_min"))
+        if "scan_max" in conditions:
+            where.append("scan_min<=?")
+            args.append(conditions.pop("scan_max"))
+        if conditions:
+            raise TypeError("unknown search fields %s" % ", ".join(conditions))
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT directory, name, " + ", ".join(ENTRY_FIELDS)
+                + " FROM entries WHERE " + " AND ".join(where)
+                + " ORDER BY directory, name, entry", args).fetchall()
+        return [
+            dict(zip(ENTRY_FIELDS, row[2:]),
+                 pathlist=row[0].split("/") if row[0] else [], name=row[1])
+            for row in rows]
+
+    def _extract(self, filename):
+        extractor = find_extractor(filename)
+        if extractor is None:
+            return []
+        try:
+            with open(filename, 'rb') as fid:
+                file_obj = io.BytesIO(fid.read())
+            return extractor(filename, file_obj)
+        except Exception as exc:
+            # A file that cannot be summarized is still listed.
+            logging.warning("catalog could not index %s: %s", filename, exc)
+            return []
+
+    def _forget(self, source, directory, name):
+        self.db.execute(
+            "DELETE FROM files WHERE source=? AND directory=? AND name=?",
+            (source, directory, name))
+        self.db.execute(
+            "DELETE FROM entries WHERE source=? AND directory=? AND name=?",
+            (source, directory, name))
+
+    def _insert_entries(self, source, directory, name, entries):
+        self.db.executemany(
+            "INSERT INTO entries VALUES (?, ?, ?" + ", ?"*len(ENTRY_FIELDS) + ")",
+            [(source, directory, name)
+             + tuple(entry.get(key, None) for key in ENTRY_FIELDS)
+             for entry in entries])
+
+    def _touch(self, source, directory):
+        self.db.execute(
+            "INSERT OR REPLACE INTO directories VALUES (?, ?, ?)",
+            (source, directory, time.time()))
+
+
+# Singleton catalog, or None if the catalog is not configured
+CATALOG = None
+
+def use_catalog(path="~/.reductus/catalog.db", max_age=60.):
+    """
+    Configure the singleton catalog.
+    """
+    global CATALOG
+    if CATALOG is not None:
+        CATALOG.close()
+    CATALOG = FileCatalog(path=path, max_age=max_age)
+    return CATALOG
+
+def get_catalog():
+    """
+    Return the singleton catalog, or None if it is not configured.
+    """
+    return CATALOG
+
+
+def test_catalog():
+    import tempfile
+    import shutil
+
+    def extractor(filename, file_obj):
+        text = file_obj.read().decode('ascii')
+        return [{"entry": "entry", "sample": text, "scan_min": 0., "scan_max": 1.}]
+    register_extractor(".catalogtest", extractor)
+
+    root = tempfile.mkdtemp()
+    try:
+        pathlist = root.strip(os.sep).split(os.sep)
+        os.mkdir(os.path.join(root, "sub"))
+        with open(os.path.join(root, "a.catalogtest"), "w") as fid:
+            fid.write("alpha")
+        with open(os.path.join(root, "b.txt"), "w") as fid:
+            fid.write("beta")
+        os.utime(os.path.join(root, "a.catalogtest"), (1000, 1000))
+        os.utime(os.path.join(root, "b.txt"), (2000, 2000))
+
+        catalog = FileCatalog(max_age=60.)
+        assert not catalog.is_current("local", pathlist)
+        assert sorted(catalog.update_local("local", pathlist)) == ["a.catalogtest", "b.txt"]
+        assert catalog.is_current("local", pathlist)
+        listing = catalog.listing("local", pathlist)
+        assert listing["subdirs"] == ["sub"]
+        assert listing["files"] == ["a.catalogtest", "b.txt"]
+        assert listing["files_metadata"]["b.txt"] == {"mtime": 2000, "size": 4}
+        assert listing["files_metadata"]["a.catalogtest"]["entries"][0]["sample"] == "alpha"
+
+        # unchanged files are not reindexed; modified files are
+        assert catalog.update_local("local", pathlist) == []
+        with open(os.path.join(root, "a.catalogtest"), "w") as fid:
+            fid.write("gamma")
+        assert catalog.update_local("local", pathlist) == ["a.catalogtest"]
+        found = catalog.find("local", sample="gamma")
+        assert [(f["pathlist"], f["name"]) for f in found] == [(pathlist, "a.catalogtest")]
+        assert catalog.find("local", sample="alpha") == []
+        assert len(catalog.find("local", pathlist=pathlist[:1], scan_min=0.5)) == 1
+        assert catalog.find("local", scan_min=2.) == []
+
+        # removed files are dropped
+        os.remove(os.path.join(root, "a.catalogtest"))
+        catalog.update_local("local", pathlist)
+        assert catalog.listing("local", pathlist)["files"] == ["b.txt"]
+        assert catalog.find("local", sample="gamma") == []
+
+        # remote listings round trip
+        remote = {"subdirs": ["x"], "files": ["f1"], "files_metadata": {"f1": {"mtime": 5}}}
+        catalog.update_listing("ncnr", ["pub"], remote)
+        assert catalog.listing("ncnr", ["pub"]) == dict(remote, pathlist=["pub"])
+        catalog.close()
+    finally:
+        _EXTRACTORS[:] = [(s, e) for s, e in _EXTRACTORS if e is not extractor]
+        shutil.rmtree(root)
@@ -4,6 +4,9 @@ import copy
 from .core import load_instrument, lookup_instrument
 from .cache import get_cache
 from . import fetch
+from . import catalog
+from . import jobs
+from . import precision
 from configurations import default
 
 DEFAULT_CONFIG = copy.deepcopy(default.config)
@@ -63,6 +66,18 @@ def apply_config(user_config=None, user_overrides=None):
 
         cache_manager._use_compression = cache_compression
 
+    catalog_config = config.get('catalog', False)
+    if catalog_config:
+        catalog.use_catalog(**catalog_config)
+
+    precision_config = config.get('precision', False)
+    if precision_config:
+        precision.use_precision(**precision_config)
+
+    jobs_config = config.get('jobs', False)
+    if jobs_config:
+        jobs.use_jobs(config=config, **jobs_config)
+
     # Load refl instrument if nothing specified in config.
     # Note: instrument names do not match instrument ids.
     instruments = config.get('instruments', ['refl'])
@@ -573,7 +573,9 @@ class DataType(object):
     Data objects are displayed to the user, with the display format
     returned by *data.get_plottable()*.  The details of the plottable
     object are still fluid, and defined by the webreduce server.  See
-    web_gui/static/js/webreduce/editor.js for the implementation.
+    web_gui/static/js/webreduce/editor.js for the implementation.  Numeric
+    columns and images should be left as numpy arrays so that they can be
+    sent to the client as binary buffers (see :mod:`dataflow.lib.msgpack_ndarray`).
 
     **Metadata**
 
@@ -645,9 +647,29 @@ class Bundle(object):
         self.datatype = datatype
         self.values = values
 
-    def todict(self):
-        values = [v.todict() for v in self.values]
-        return {'datatype': self.datatype.id, 'values': values}
+    def todict(self, start=None, stop=None, fields=None):
+        """
+        Return the bundle as a dictionary of python values.
+
+        *start* and *stop* select a range of datasets, in which case the
+        *offset* of the first dataset and the *total* number of datasets
+        are also returned.
+
+        *fields* lists the attributes to return for each dataset, with
+        "group.attribute" selecting an attribute of a group, such as
+        "sample.angle_x".  Data types whose *todict* does not accept
+        *fields* are converted in full then reduced to the selected fields.
+        """
+        paged = start is not None or stop is not None
+        values = self.values[start:stop] if paged else self.values
+        state = {
+            'datatype': self.datatype.id,
+            'values': [_todict(v, fields) for v in values],
+        }
+        if paged:
+            state['offset'] = slice(start, stop).indices(len(self.values))[0]
+            state['total'] = len(self.values)
+        return state
 
     def get_plottable(self):
         values = [v.get_plottable() for v in self.values]
@@ -669,6 +691,22 @@ class Bundle(object):
             concatenate=concatenate)
         return {'datatype': self.datatype.id, 'values': to_export}
 
+    def stream_export(self, export_type="column", template_data=None, concatenate=True):
+        """
+        Return *(filename, chunks)* for the export, with the export built
+        as the chunks are consumed.  See :func:`dataflow.lib.exporters.stream_export`.
+        """
+        from .lib.exporters import stream_export
+        if export_type not in self.datatype.export_types:
+            raise ValueError("{self.datatype.id} does not provide {export_type} export.".format(self=self, export_type=export_type))
+        exporter_info = self.datatype.export_types[export_type]
+        return stream_export(
+            self.values,
+            exporter_info["exporter"],
+            export_method=exporter_info["method_name"],
+            template_data=template_data,
+            concatenate=concatenate)
+
     @staticmethod
     def fromdict(state):
         datatype = lookup_datatype(state['datatype'])
@@ -679,6 +717,31 @@ class Bundle(object):
             values.append(obj)
         return Bundle(datatype, values)
 
+def _todict(value, fields):
+    if fields is None:
+        return value.todict()
+    if 'fields' in inspect.signature(value.todict).parameters:
+        return value.todict(fields=fields)
+    return _select_fields(value.todict(), fields)
+
+def _select_fields(state, fields):
+    """
+    Return the *fields* of *state*, with "name.attribute" selecting an
+    attribute of a dictionary within *state*.  Missing fields are skipped.
+    """
+    selected = {}
+    for field in fields:
+        name, _, attr = field.partition('.')
+        if name not in state:
+            continue
+        if not attr:
+            selected[name] = state[name]
+        elif isinstance(state[name], dict) and attr in state[name]:
+            group = selected.setdefault(name, {})
+            if group is not state[name]:
+                group[attr] = state[name][attr]
+    return selected
+
 
 # Inf/NaN representation options:
 #     javascript names: "Infinity", "-Infinity", "NaN"
@@ -40,11 +40,15 @@ For example::
 
 from __future__ import print_function
 
+import sys
 import datetime
 import time
 from posixpath import basename, join, sep
 import os
 import hashlib
+from io import BytesIO
+from functools import partial
+from inspect import getsource
 
 try:
     import urllib.request as urllib2
@@ -54,6 +58,7 @@ except ImportError:
 import pytz
 
 from .calc import _format_ordered, generate_fingerprint
+from . import precision
 from .cache import get_cache
 from .doi_resolve import get_target
 from .lib.iso8601 import seconds_since_epoch
@@ -127,6 +132,80 @@ def url_get(fileinfo, mtime_check=True):
 
     return ret
 
+def cached_load(fileinfo, loader, entries=None, loader_id=None,
+                loader_version=None, mtime_check=True):
+    """
+    Fetch and parse the file described by *fileinfo*, caching the entries.
+
+    *loader(filename, file_obj)* parses the file, or *loader(filename,
+    file_obj, entries=entries)* if *entries* is not None.
+
+    The parsed entries are stored in the calculation cache, keyed by the
+    file content key used by :func:`url_get` (path and mtime), the loader
+    id and version, the list of entries requested, and the detector
+    precision policy, which loaders may apply as they parse (see
+    :mod:`dataflow.precision`).  Modules which apply
+    corrections after loading can then be recomputed with different
+    parameters without reparsing the raw file.
+
+    *loader_id* defaults to the dotted name of the loader, including any
+    keywords bound with *functools.partial*.  *loader_version* defaults to
+    a hash of the server revision and the source of the module defining the
+    loader, so that the cache is invalidated when the loader or any of the
+    data classes it builds on changes.
+    """
+    path, mtime = fileinfo['path'], fileinfo.get('mtime', None)
+    if loader_id is None:
+        loader_id = _loader_id(loader)
+    if loader_version is None:
+        loader_version = _loader_version(loader)
+    content_key = str(_format_ordered({'path': path, 'mtime': mtime}))
+    entries_key = str(_format_ordered(entries))
+    parts = ["url_load", content_key, loader_id, loader_version, entries_key]
+    policy = precision.fingerprint()
+    if policy:
+        parts.append(policy)
+    fp = generate_fingerprint(parts)
+    cache = get_cache()
+    if cache.exists(fp):
+        print("getting parsed " + path + " from cache!")
+        return cache.retrieve(fp)
+    content = url_get(fileinfo, mtime_check=mtime_check)
+    filename = basename(path)
+    with BytesIO(content) as fd:
+        if entries is None:
+            result = loader(filename, fd)
+        else:
+            result = loader(filename, fd, entries=entries)
+    cache.store(fp, result)
+    return result
+
+def _loader_id(loader):
+    if isinstance(loader, partial):
+        args = str(_format_ordered(list(loader.args)))
+        keywords = str(_format_ordered(loader.keywords))
+        return ":".join((_loader_id(loader.func), args, keywords))
+    name = getattr(loader, '__qualname__', loader.__name__)
+    return loader.__module__ + "." + name
+
+_LOADER_VERSIONS = {}
+def _loader_version(loader):
+    while isinstance(loader, partial):
+        loader = loader.func
+    module = sys.modules[loader.__module__]
+    if module.__name__ not in _LOADER_VERSIONS:
+        from .rev import revision_info
+        try:
+            source = getsource(module)
+        except (IOError, OSError, TypeError):
+            source = module.__name__
+        # The revision covers the shared data classes and helpers used by
+        # the loader; the source hash covers uncommitted loader changes.
+        source = revision_info() + "\n" + source
+        version = hashlib.sha1(source.encode('utf-8')).hexdigest()
+        _LOADER_VERSIONS[module.__name__] = version
+    return _LOADER_VERSIONS[module.__name__]
+
 def find_mtime(path):
     check_datasource()
     try:
@@ -144,3 +223,36 @@ def url_get_list(files=None):
         return []
     result = [entry for fileinfo in files for entry in url_get(fileinfo)]
     return result
+
+def test_cached_load():
+    import tempfile
+    from .cache import set_test_cache
+
+    set_test_cache()
+    saved_sources = DATA_SOURCES[:]
+    DATA_SOURCES[:] = [{"name": "local", "url": "file:///", "start_path": ""}]
+    calls = []
+    def loader(filename, file_obj, entries=None):
+        calls.append(filename)
+        return [(filename, file_obj.read(), entries)]
+
+    with tempfile.NamedTemporaryFile(suffix=".dat", delete=False) as fid:
+        fid.write(b"content")
+    try:
+        fileinfo = {"source": "local", "path": fid.name, "mtime": int(os.path.getmtime(fid.name))}
+        first = cached_load(fileinfo, loader, mtime_check=False)
+        second = cached_load(fileinfo, loader, mtime_check=False)
+        assert first == second == [(basename(fid.name), b"content", None)]
+        assert len(calls) == 1
+        # entries and loader keywords are part of the key
+        cached_load(fileinfo, loader, entries=["entry1"], mtime_check=False)
+        cached_load(fileinfo, partial(loader, entries=None), mtime_check=False)
+        assert len(calls) == 3
+        # entries parsed with another precision policy are not reused
+        precision.use_precision(candor="single")
+        cached_load(fileinfo, loader, mtime_check=False)
+        assert len(calls) == 4
+    finally:
+        precision.use_precision()
+        DATA_SOURCES[:] = saved_sources
+        os.remove(fid.name)
@@ -0,0 +1,342 @@
+"""
+Run long calculations outside of the request handler.
+
+A job is a call to a module level function, identified by a key which
+is unique for the calculation, such as the fingerprint of the target
+node.  Submitting a job that is already pending or running returns the
+existing job rather than starting a new one, so identical requests from
+several clients share one calculation.  Clients then poll the job status,
+optionally waiting for completion, and retrieve the result when it is
+done.
+
+By default jobs run in a local process pool.  Call *jobs.use_jobs(...)*
+during program configuration to set the number of workers, or give
+*broker* arguments to queue the jobs on a redis server instead, with
+the calculations performed by separate worker processes started using::
+
+    python -m dataflow.jobs [config]
+
+Job status and results for the redis broker are stored in redis, so the
+web tier and the workers may be on different machines.  The local pool
+keeps its jobs in the server process, so it can only be used when a single
+server process handles all requests.  Servers run as several processes,
+such as web_gui/start_flask_many.sh or the pre-fork server with more than
+one worker, need the redis broker.
+"""
+from __future__ import print_function
+
+import time
+import traceback
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+
+try:
+    # CRUFT: use cPickle for python 2.7
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+
+#: Polling interval (seconds) when waiting on the redis broker
+POLL_INTERVAL = 0.1
+
+
+class JobError(RuntimeError):
+    """
+    Error raised when retrieving the result of a failed job.
+    """
+    pass
+
+
+def _initialize_worker(config):
+    """
+    Configure the worker process so that it has the same data sources,
+    caches and instruments as the server.
+    """
+    if config is not None:
+        from . import configure
+        config = dict(config)
+        config.pop('jobs', None)
+        configure.apply_config(user_config=config)
+
+
+def _run(fn, args, kwargs):
+    """
+    Run *fn* returning *(status, value)*, where value is the result or
+    the formatted exception.
+    """
+    try:
+        return DONE, fn(*args, **kwargs)
+    except Exception as exc:
+        return ERROR, {'exception': repr(exc),
+                       'traceback': traceback.format_exc()}
+
+
+class LocalJobs(object):
+    """
+    Run jobs in a local process pool.
+
+    *workers* is the number of processes, defaulting to the number of
+    processors.  *config* is the server configuration applied to each
+    worker as it starts.  Results of finished jobs are kept for *ttl*
+    seconds.
+
+    The job table lives in this process, so all requests must be handled
+    by the same server process.  With several server processes, a status
+    request reaching another process reports that the job does not exist,
+    and a job whose server process died is lost.  Use :class:`RedisJobs`
+    for those deployments.
+    """
+    def __init__(self, workers=None, config=None, ttl=600.):
+        self.ttl = ttl
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers, initializer=_initialize_worker,
+            initargs=(config,))
+        self._jobs = {}  # job id => (submit time, future)
+        self._lock = threading.Lock()
+
+    def submit(self, job_id, fn, args=(), kwargs=None):
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id, None)
+            if job is None or self._status(job[1]) == ERROR:
+                future = self._pool.submit(_run, fn, args, kwargs or {})
+                self._jobs[job_id] = (time.time(), future)
+        return self.status(job_id)
+
+    def status(self, job_id, timeout=0.):
+        future = self._future(job_id)
+        if timeout > 0 and not future.done():
+            wait([future], timeout=timeout)
+        status = self._status(future)
+        result = {'job_id': job_id, 'status': status}
+        if status == ERROR:
+            result.update(self._outcome(future)[1])
+        return result
+
+    def result(self, job_id, timeout=None):
+        future = self._future(job_id)
+        wait([future], timeout=timeout)
+        if not future.done():
+            raise RuntimeError("job %r is not finished"%job_id)
+        status, value = self._outcome(future)
+        if status == ERROR:
+            raise JobError(value['exception'] + "\n" + value['traceback'])
+        return value
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def _future(self, job_id):
+        try:
+            return self._jobs[job_id][1]
+        except KeyError:
+            raise KeyError("job %r does not exist"%job_id)
+
+    def _status(self, future):
+        if future.running():
+            return RUNNING
+        elif not future.done():
+            return PENDING
+        return self._outcome(future)[0]
+
+    def _outcome(self, future):
+        # The pool itself may fail, e.g., if a worker dies or the result
+        # cannot be pickled, so check for exceptions as well as failures
+        # reported by _run.
+        exc = future.exception()
+        if exc is not None:
+            return ERROR, {'exception': repr(exc),
+                           'traceback': "".join(traceback.format_exception(
+                               type(exc), exc, exc.__traceback__))}
+        return future.result()
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, (start, future) in self._jobs.items()
+                   if start < cutoff and future.done()]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class RedisJobs(object):
+    """
+    Queue jobs on a redis server for :func:`run_worker` processes.
+
+    *broker* contains the arguments to *redis.Redis*.  Status and results
+    of finished jobs expire after *ttl* seconds.
+    """
+    def __init__(self, broker=None, ttl=600., prefix="reductus:jobs"):
+        import redis  # lazy import so that redis need not be available
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.queue = prefix + ":queue"
+        self._redis = redis.Redis(**(broker or {}))
+
+    def _key(self, job_id, part):
+        return ":".join((self.prefix, job_id, part))
+
+    def submit(self, job_id, fn, args=(), kwargs=None):
+        status_key = self._key(job_id, "status")
+        # Only the first submission creates the job; the job is resubmitted
+        # if the previous attempt failed.
+        created = self._redis.set(status_key, PENDING, nx=True, ex=self.ttl)
+        if not created and self._get_status(job_id) == ERROR:
+            self._redis.set(status_key, PENDING, ex=self.ttl)
+            created = True
+        if created:
+            payload = pickle.dumps((job_id, fn, args, kwargs or {}),
+                                   protocol=PICKLE_PROTOCOL)
+            self._redis.rpush(self.queue, payload)
+        return self.status(job_id)
+
+    def status(self, job_id, timeout=0.):
+        deadline = time.time() + timeout
+        status = self._get_status(job_id)
+        while status in (PENDING, RUNNING) and time.time() < deadline:
+            time.sleep(POLL_INTERVAL)
+            status = self._get_status(job_id)
+        if status is None:
+            raise KeyError("job %r does not exist"%job_id)
+        result = {'job_id': job_id, 'status': status}
+        if status == ERROR:
+            result.update(self._get_result(job_id))
+        return result
+
+    def result(self, job_id, timeout=None):
+        status = self.status(job_id, timeout=timeout or 0.)['status']
+        if status in (PENDING, RUNNING):
+            raise RuntimeError("job %r is not finished"%job_id)
+        value = self._get_result(job_id)
+        if status == ERROR:
+            raise JobError(value['exception'] + "\n" + value['traceback'])
+        return value
+
+    def shutdown(self, wait=True):
+        pass
+
+    def work(self, timeout=0):
+        """
+        Run the next job in the queue, waiting up to *timeout* seconds
+        for one to arrive, or forever if *timeout* is 0.
+
+        Returns the job id, or None if no job arrived.
+        """
+        item = self._redis.blpop(self.queue, timeout=timeout)
+        if item is None:
+            return None
+        job_id, fn, args, kwargs = pickle.loads(item[1])
+        self._redis.set(self._key(job_id, "status"), RUNNING, ex=self.ttl)
+        status, value = _run(fn, args, kwargs)
+        self._redis.set(self._key(job_id, "result"),
+                        pickle.dumps(value, protocol=PICKLE_PROTOCOL),
+                        ex=self.ttl)
+        self._redis.set(self._key(job_id, "status"), status, ex=self.ttl)
+        return job_id
+
+    def _get_status(self, job_id):
+        status = self._redis.get(self._key(job_id, "status"))
+        return status.decode('ascii') if status is not None else None
+
+    def _get_result(self, job_id):
+        return pickle.loads(self._redis.get(self._key(job_id, "result")))
+
+
+class JobManager(object):
+    """
+    Manage the job queue.
+    """
+    def __init__(self):
+        self._jobs = None
+
+    def use_jobs(self, workers=None, broker=None, ttl=600., config=None):
+        """
+        Set up the job queue.
+
+        If *broker* is given, then jobs are queued on the redis server
+        with those connection arguments, otherwise they are run in a local
+        pool of *workers* processes initialized with the server *config*.
+        """
+        if self._jobs is not None:
+            self._jobs.shutdown(wait=False)
+        if broker is not None:
+            self._jobs = RedisJobs(broker=broker, ttl=ttl)
+        else:
+            self._jobs = LocalJobs(workers=workers, config=config, ttl=ttl)
+
+    def get_jobs(self):
+        """
+        Return the job queue, or None if it is not configured.
+        """
+        return self._jobs
+
+
+# Singleton job manager
+JOB_MANAGER = JobManager()
+
+# direct access to singleton methods
+use_jobs = JOB_MANAGER.use_jobs
+get_jobs = JOB_MANAGER.get_jobs
+
+
+def run_worker(config=None):
+    """
+    Process jobs from the redis broker named in the *jobs* section of
+    *config*, which is also applied to this process.
+    """
+    from . import configure
+    if config is None:
+        config = configure.load_config('config')
+    jobs_config = config.get('jobs', {})
+    if jobs_config.get('broker', None) is None:
+        raise ValueError("config has no jobs broker to take work from")
+    _initialize_worker(config)
+    queue = RedisJobs(broker=jobs_config['broker'],
+                      ttl=jobs_config.get('ttl', 600.))
+    while True:
+        job_id = queue.work()
+        print("finished job %s"%job_id)
+
+
+def _slow_sum(*args):
+    time.sleep(0.2)
+    return sum(args)
+
+def _fail():
+    raise ValueError("expected failure")
+
+def test_local_jobs():
+    jobs = LocalJobs(workers=2)
+    try:
+        first = jobs.submit("sum", _slow_sum, (1, 2))
+        # identical submission while running coalesces onto the first job
+        jobs.submit("sum", _slow_sum, (1, 2))
+        assert first['status'] in (PENDING, RUNNING)
+        assert len(jobs._jobs) == 1
+        assert jobs.status("sum", timeout=10.)['status'] == DONE
+        assert jobs.result("sum") == 3
+
+        jobs.submit("fail", _fail)
+        status = jobs.status("fail", timeout=10.)
+        assert status['status'] == ERROR
+        assert "expected failure" in status['exception']
+        try:
+            jobs.result("fail")
+        except JobError:
+            pass
+        else:
+            raise AssertionError("failed job should raise JobError")
+    finally:
+        jobs.shutdown()
+
+
+if __name__ == "__main__":
+    import sys
+    from . import configure
+    run_worker(configure.load_config(sys.argv[1] if len(sys.argv) > 1 else 'config'))
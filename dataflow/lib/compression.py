@@ -0,0 +1,185 @@
+"""
+Content encoding for server responses.
+
+The encoding is negotiated with the client from its Accept-Encoding
+header, preferring zstd, then brotli, then gzip.  zstd and brotli are
+only offered if the *zstandard* and *brotli* packages are installed.
+
+Small responses are sent as is since compression does not pay for
+itself.  Responses with an entity tag (see *web_gui.api.response_etag*)
+may keep the encoded payload in the cache next to the node results, so
+repeated requests neither recompute nor recompress the response.
+"""
+import zlib
+from collections import OrderedDict
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#: Responses smaller than this many bytes are not encoded
+MIN_SIZE = 1024
+#: Cache key prefix for encoded responses
+CACHE_PREFIX = "encoded:"
+
+class _BrotliStream(object):
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=5)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+def _gzip_stream():
+    # wbits=31 selects the gzip container
+    return zlib.compressobj(6, zlib.DEFLATED, 31)
+
+def _zstd_stream():
+    return zstandard.ZstdCompressor(level=3).compressobj()
+
+#: Available encoders in order of preference, each returning an object
+#: with *compress(data)* and *flush()* methods
+ENCODERS = OrderedDict()
+if zstandard is not None:
+    ENCODERS['zstd'] = _zstd_stream
+if brotli is not None:
+    ENCODERS['br'] = _BrotliStream
+ENCODERS['gzip'] = _gzip_stream
+
+
+def negotiate(accept_encoding, encodings=None):
+    """
+    Return the first of *encodings* (default all available) allowed by
+    the *accept_encoding* header with the highest quality, or None if
+    the response should not be encoded.
+    """
+    accepted = {}
+    for item in (accept_encoding or "").split(','):
+        name, _, params = item.partition(';')
+        quality = 1.
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.
+        accepted[name.strip().lower()] = quality
+    if 'x-gzip' in accepted:
+        accepted.setdefault('gzip', accepted['x-gzip'])
+    wildcard = accepted.get('*', 0.)
+    best, best_quality = None, 0.
+    for encoding in (encodings if encodings is not None else ENCODERS):
+        quality = accepted.get(encoding, wildcard)
+        if encoding in ENCODERS and quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def compress(data, encoding):
+    """
+    Return *data* compressed with *encoding*.
+    """
+    stream = ENCODERS[encoding]()
+    return stream.compress(data) + stream.flush()
+
+def compress_stream(chunks, encoding):
+    """
+    Compress the byte strings from the *chunks* iterator with *encoding*,
+    yielding compressed chunks as they become available.
+    """
+    stream = ENCODERS[encoding]()
+    for chunk in chunks:
+        output = stream.compress(chunk)
+        if output:
+            yield output
+    yield stream.flush()
+
+
+class ResponseEncoder(object):
+    """
+    Encode server responses.
+
+    *min_size* is the smallest response to encode, *encodings* lists the
+    allowed encodings in order of preference (default all available), and
+    *cache* is True if encoded responses should be stored in the cache.
+    """
+    def __init__(self, min_size=MIN_SIZE, encodings=None, cache=False):
+        self.min_size = min_size
+        self.encodings = encodings
+        self.cache = cache
+
+    def choose(self, accept_encoding):
+        """
+        Return the encoding to use given the Accept-Encoding header.
+        """
+        return negotiate(accept_encoding, self.encodings)
+
+    def lookup(self, etag, encoding):
+        """
+        Return the cached response for *etag* encoded with *encoding*,
+        or None if it is not available.
+        """
+        if not self.cache or encoding is None:
+            return None
+        from dataflow.cache import get_cache
+        key = _cache_key(etag, encoding)
+        cache = get_cache()
+        return cache.retrieve(key) if cache.exists(key) else None
+
+    def encode(self, data, encoding, etag=None):
+        """
+        Return *(data, encoding)* for the response, with encoding None if
+        the response is sent as is.  If *etag* is given and caching is
+        enabled, then the encoded response is stored for :meth:`lookup`.
+        """
+        if encoding is None or len(data) < self.min_size:
+            return data, None
+        data = compress(data, encoding)
+        if self.cache and etag is not None:
+            from dataflow.cache import get_cache
+            get_cache().store(_cache_key(etag, encoding), data)
+        return data, encoding
+
+    def encode_stream(self, chunks, encoding):
+        """
+        Return an iterator over the encoded *chunks*.  Streams of unknown
+        length are always encoded if the client allows it.
+        """
+        return chunks if encoding is None else compress_stream(chunks, encoding)
+
+def _cache_key(etag, encoding):
+    return CACHE_PREFIX + etag + ":" + encoding
+
+
+def test_compression():
+    import gzip
+    assert negotiate("gzip, deflate") == "gzip"
+    assert negotiate("deflate") is None
+    assert negotiate("gzip;q=0, *;q=0.5", encodings=["gzip"]) is None
+    assert negotiate("*") == list(ENCODERS)[0]
+    assert negotiate("") is None
+    assert negotiate("x-gzip", encodings=["gzip"]) == "gzip"
+
+    data = b"0123456789"*500
+    assert gzip.decompress(compress(data, "gzip")) == data
+    chunks = list(compress_stream([data[:100], b"", data[100:]], "gzip"))
+    assert gzip.decompress(b"".join(chunks)) == data
+
+    encoder = ResponseEncoder(min_size=1000)
+    assert encoder.encode(data[:999], "gzip") == (data[:999], None)
+    assert encoder.encode(data, None) == (data, None)
+    body, encoding = encoder.encode(data, "gzip")
+    assert encoding == "gzip" and gzip.decompress(body) == data
+
+    encoder = ResponseEncoder(cache=True)
+    assert encoder.lookup("test-etag", "gzip") is None
+    body, _ = encoder.encode(data, "gzip", etag="test-etag")
+    assert encoder.lookup("test-etag", "gzip") == body
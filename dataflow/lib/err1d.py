@@ -21,6 +21,18 @@ from __future__ import division  # Get true division
 
 import numpy as np
 
+def _accumulate(reduce, X, dtype=None, out=None, **kw):
+    """
+    Apply the numpy reduction *reduce* to *X*.  Single precision values
+    are accumulated in double precision, with the result returned in the
+    precision of *X*.
+    """
+    if dtype is not None or getattr(X, 'dtype', None) not in (np.float16, np.float32):
+        return reduce(X, dtype=dtype, out=out, **kw)
+    result = reduce(X, dtype=np.float64, out=out, **kw)
+    return result if out is not None else result.astype(X.dtype)
+
+
 def mean(X, varX, biased=True, axis=None, dtype=None, out=(None, None), keepdims=False):
     # type: (np.ndarray, np.ndarray, bool) -> (float, float)
     r"""
@@ -30,12 +42,12 @@ def mean(X, varX, biased=True, axis=None, dtype=None, out=(None, None), keepdims
     estimated variance is scaled by the normalized $\chi^2$.  See the
     wikipedia page for the weighted arithmetic mean for details.
     """
-    total_weight = np.sum(1./varX, axis=axis, dtype=dtype, keepdims=keepdims)
-    M = np.sum(X/varX, axis=axis, dtype=dtype, keepdims=keepdims)/total_weight
+    total_weight = _accumulate(np.sum, 1./varX, axis=axis, dtype=dtype, keepdims=keepdims)
+    M = _accumulate(np.sum, X/varX, axis=axis, dtype=dtype, keepdims=keepdims)/total_weight
     varM = 1./total_weight
     if biased:
         # Scale by normalized chisq if variance calculation is biased
-        chisq = np.sum((X-M)**2/varX, axis=axis, dtype=dtype, keepdims=keepdims)
+        chisq = _accumulate(np.sum, (X-M)**2/varX, axis=axis, dtype=dtype, keepdims=keepdims)
         dof = np.prod(X.shape)/np.prod(chisq.shape) - 1
         varM *= chisq/dof
 
@@ -59,8 +71,8 @@ def sum(X, varX, axis=None, dtype=None, out=(None, None), keepdims=False):
     Follows the numpy sum interface, except a pair of output arrays is required
     if you want to reuse an output.
     """
-    M = np.sum(X, axis=axis, dtype=dtype, out=out[0], keepdims=keepdims)
-    varM = np.sum(varX, axis=axis, dtype=dtype, out=out[1], keepdims=keepdims)
+    M = _accumulate(np.sum, X, axis=axis, dtype=dtype, out=out[0], keepdims=keepdims)
+    varM = _accumulate(np.sum, varX, axis=axis, dtype=dtype, out=out[1], keepdims=keepdims)
     return M, varM
 
 
@@ -72,8 +84,8 @@ def cumsum(X, varX, axis=None, dtype=None, out=(None, None), keepdims=False):
     Follows the numpy cumsum interface, except a pair of output arrays is
     required if you want to reuse an output.
     """
-    M = np.cumsum(X, axis=axis, dtype=dtype, out=out[0], keepdims=keepdims)
-    varM = np.cumsum(varX, axis=axis, dtype=dtype, out=out[1], keepdims=keepdims)
+    M = _accumulate(np.cumsum, X, axis=axis, dtype=dtype, out=out[0], keepdims=keepdims)
+    varM = _accumulate(np.cumsum, varX, axis=axis, dtype=dtype, out=out[1], keepdims=keepdims)
     return M, varM
 
 
@@ -87,10 +99,10 @@ def average(X, varX, W, varW, axis=None):
     """
     # TODO: why is mean weighted by 1/variance instead of 1?
     # Note: code checked vs. monte carlo simulation in explore.gaussian_average
-    Swx = np.sum(X*W, axis=axis)
-    Sw = np.sum(W, axis=axis)
+    Swx = _accumulate(np.sum, X*W, axis=axis)
+    Sw = _accumulate(np.sum, W, axis=axis)
     M = Swx/Sw
-    varM = np.sum((W/Sw)**2*varX + ((X*Sw - Swx)/Sw**2)**2*varW, axis=axis)
+    varM = _accumulate(np.sum, (W/Sw)**2*varX + ((X*Sw - Swx)/Sw**2)**2*varW, axis=axis)
     return M, varM
 
 
@@ -109,30 +121,65 @@ def interp(X, Xp, Fp, varFp, left=None, right=None):
 
     right is (value,variance) to use for points after the range of xp, or
     None for the final value.
+
+    Use :class:`Interpolation` when interpolating many arrays from the
+    same xp onto the same x.
     """
-    idx = np.searchsorted(Xp[1:-1], X, side="right")
-    if len(Xp) > 1:
-        # Support repeated values in Xp, which will lead to 0/0 errors if the
-        # interpolated point is one of the repeated values.
-        p = (Xp[idx+1]-X)/(Xp[idx+1]-Xp[idx])
-        if Fp.ndim > 1: # n-D support requires manual broadcast
-            extra_dims = (np.newaxis,)*(Fp.ndim-1)
-            p = p[(..., *extra_dims)]
-        F = p*Fp[idx] + (1-p)*Fp[idx+1]
-        # simple propagation of error formula for calculation of F, confirmed
-        # by monte carlo simulation.
-        varF = p**2*varFp[idx] + (1-p)**2*varFp[idx+1]
-    else:
-        F, varF = Fp[idx], varFp[idx]
-    #print p,F,varF,idx
-    if left is None:
-        left = Fp[0], varFp[0]
-    if right is None:
-        right = Fp[-1], varFp[-1]
-    F[X < Xp[0]], varF[X < Xp[0]] = left
-    F[X > Xp[-1]], varF[X > Xp[-1]] = right
-
-    return F, varF
+    return Interpolation(X, Xp)(Fp, varFp, left=left, right=right)
+
+
+class Interpolation(object):
+    """
+    Linear interpolation from points *Xp* onto points *X*.
+
+    The interval and weights for each point of *X* are computed once, and
+    the interpolation can then be applied to any number of value and
+    variance arrays defined on *Xp*.  See :func:`interp` for details.
+    """
+    def __init__(self, X, Xp):
+        # type: (np.ndarray, np.ndarray) -> None
+        X, Xp = np.asarray(X), np.asarray(Xp)
+        self.index = np.searchsorted(Xp[1:-1], X, side="right")
+        if len(Xp) > 1:
+            # Support repeated values in Xp, which will lead to 0/0 errors if the
+            # interpolated point is one of the repeated values.
+            p = (Xp[self.index+1]-X)/(Xp[self.index+1]-Xp[self.index])
+            # simple propagation of error formula for calculation of F,
+            # confirmed by monte carlo simulation.
+            self.weights = p, 1-p, p**2, (1-p)**2
+        else:
+            self.weights = None
+        self.before = X < Xp[0]
+        self.after = X > Xp[-1]
+
+    def __call__(self, Fp, varFp, left=None, right=None, axis=0):
+        """
+        Interpolate *Fp, varFp* along *axis*, returning *F, varF*.
+
+        Other axes of *Fp* are carried through, so a stack of spectra can
+        be interpolated in one call using *axis=-1*.  *left* and *right*
+        are as for :func:`interp`.
+        """
+        Fp, varFp = np.asarray(Fp), np.asarray(varFp)
+        axis = axis % Fp.ndim
+        idx = self.index
+        if self.weights is None:
+            F, varF = np.take(Fp, idx, axis=axis), np.take(varFp, idx, axis=axis)
+        else:
+            trailing = (np.newaxis,)*(Fp.ndim-1-axis)
+            p, q, p2, q2 = (w[(..., *trailing)] for w in self.weights)
+            F = p*np.take(Fp, idx, axis=axis) + q*np.take(Fp, idx+1, axis=axis)
+            varF = (p2*np.take(varFp, idx, axis=axis)
+                    + q2*np.take(varFp, idx+1, axis=axis))
+        if left is None:
+            left = np.take(Fp, [0], axis=axis), np.take(varFp, [0], axis=axis)
+        if right is None:
+            right = np.take(Fp, [-1], axis=axis), np.take(varFp, [-1], axis=axis)
+        leading = (slice(None),)*axis
+        F[leading + (self.before,)], varF[leading + (self.before,)] = left
+        F[leading + (self.after,)], varF[leading + (self.after,)] = right
+
+        return F, varF
 
 
 def div(X, varX, Y, varY):
@@ -371,6 +418,17 @@ def test():
     _check(pow, X**N, varX/X**2 * X**(2*N) * N**2)
     _check(pow2, X**Y, X**(2*Y) * ((Y*varX/X)**2 + (np.log(X)*varY)**2))
 
+def test_single_precision():
+    # Single precision sums are accumulated in double precision
+    X = np.full(2**25, 0.1, dtype='f')
+    Z, varZ = sum(X, X, axis=0)
+    assert Z.dtype == np.float32 and abs(Z - 2**25*np.float64(X[0])) < 1e-6*Z
+    Z, varZ = mean(X[:1000], X[:1000], biased=False)
+    assert Z.dtype == np.float32 and abs(Z - 0.1) < 1e-7
+    Z = np.empty((), 'd')
+    sum(X, X, out=(Z, None))
+    assert Z == 2**25*np.float64(X[0])
+
 def test_against_uncertainties_package():
     try:
         from uncertainties import ufloat
@@ -5,6 +5,9 @@ See :class:`dataflow.core.DataType` for details.
 """
 import io
 import json
+import tempfile
+import zipfile
+from itertools import chain
 from functools import wraps
 
 import numpy as np
@@ -157,6 +160,136 @@ def png(datasets, export_method=None, template_data=None, concatenate=False):
     return outputs
 
 
+#: Bytes per chunk when streaming exports
+CHUNK_SIZE = 2**16
+#: Size of streamed files held in memory before spilling to disk
+SPOOL_SIZE = 2**24
+
+def _json_stream(exports, template_data):
+    first = next(exports)
+    compact = first.get("compact", False)
+    if compact:
+        def dumps(value, level):
+            return json_dumps(value)
+        start, separator, end = '{"template_data":%s,"outputs":[', ',', ']}'
+    else:
+        # Reproduce the indent=2 layout of json_writer.  JSON strings cannot
+        # contain raw newlines, so indenting each line is safe.
+        def dumps(value, level):
+            return json_dumps(value, compact=False).replace("\n", "\n" + "  "*level)
+        start = '{\n  "template_data": %s,\n  "outputs": [\n    '
+        separator, end = ',\n    ', '\n  ]\n}'
+    def chunks():
+        yield start % dumps(template_data, 1)
+        for k, export in enumerate(chain([first], exports)):
+            yield (separator if k else "") + dumps(export["value"], 2)
+        yield end
+    return _build_filename(first, ext=".dat"), chunks()
+
+def _text_stream(exports, template_data):
+    header_string = json_dumps(template_data)
+    first = next(exports)
+    def chunks():
+        yield "#{h}\n".format(h=header_string[1:-1])
+        for k, export in enumerate(chain([first], exports)):
+            yield ("\n\n" if k else "") + export["value"]
+    return _build_filename(first, ext=".dat"), chunks()
+
+def _hdf_stream(exports, template_data):
+    import h5py
+
+    header_string = json_dumps(template_data)
+    first = next(exports)
+    filename = _build_filename(first, ext=".hdf5", index=None)
+    # h5py needs a seekable file, so build it in a spooled temporary file
+    fid = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    container = h5py.File(fid, 'w')
+    _set_nexus_attrs(container, filename)
+    container.attrs["template_def"] = header_string
+    for export in chain([first], exports):
+        h5_item = export["value"]
+        group_to_copy = list(h5_item.values())[0]
+        group_name = "%s_%s" % (export["name"], export["entry"])
+        for k, v in group_to_copy.items():
+            if v.attrs.get("NX_class", "") == "NXprocess":
+                v["template_def"] = header_string
+        container.copy(group_to_copy, group_name)
+        h5_item.close()
+    container.close()
+    return filename, _file_chunks(fid)
+
+def _file_chunks(fid):
+    try:
+        fid.seek(0)
+        while True:
+            chunk = fid.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fid.close()
+
+def _zip_stream(filename, files):
+    """
+    Write the *(filename, chunks)* sequence of *files* into a zip archive.
+    """
+    fid = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    with zipfile.ZipFile(fid, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, chunks in files:
+            with archive.open(name, 'w') as member:
+                for chunk in chunks:
+                    member.write(_as_bytes(chunk))
+    return filename.rsplit('.', 1)[0] + ".zip", _file_chunks(fid)
+
+def _as_bytes(chunk):
+    if isinstance(chunk, io.BytesIO):
+        chunk = chunk.getvalue()
+    return chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+STREAM_WRITERS = {
+    json_writer: _json_stream,
+    text: _text_stream,
+    hdf: _hdf_stream,
+}
+
+def stream_export(datasets, exporter, export_method=None, template_data=None,
+                  concatenate=False):
+    """
+    Export *datasets* as a stream of byte chunks, returning *(filename, chunks)*.
+
+    Datasets are exported one at a time as the chunks are consumed, so
+    memory use is bounded by the largest dataset rather than the whole
+    bundle.  Concatenated exports are written as a single file by the
+    stream writer for the exporter.  Otherwise each dataset is exported
+    separately, with the files collected into a zip archive if there is
+    more than one.  The archive is spooled to a temporary file.
+    """
+    if not datasets:
+        raise ValueError("no datasets to export")
+    writer = STREAM_WRITERS.get(exporter, None)
+    if concatenate and writer is not None:
+        exports = (getattr(d, export_method)() for d in datasets)
+        filename, chunks = writer(exports, template_data)
+    else:
+        groups = [datasets] if concatenate else [[d] for d in datasets]
+        def files():
+            for group in groups:
+                outputs = exporter(group, export_method=export_method,
+                                   template_data=template_data,
+                                   concatenate=concatenate)
+                for output in outputs:
+                    yield output["filename"], iter([output["value"]])
+        files = files()
+        first = next(files)
+        if len(groups) == 1:
+            rest = list(files)
+            if not rest:
+                return first[0], (_as_bytes(chunk) for chunk in first[1])
+            files = iter(rest)
+        filename, chunks = _zip_stream(first[0], chain([first], files))
+    return filename, (_as_bytes(chunk) for chunk in chunks)
+
+
 def exports_json(name="json"):
     """
     Decorator for json output file.
@@ -212,3 +345,47 @@ def exports_PNG(name="PNG"):
         f.export_name = name
         return f
     return inner_function
+
+
+def test_stream_export():
+    class Data(object):
+        def __init__(self, entry):
+            self.entry = entry
+        def to_text(self):
+            return {"name": "data", "entry": self.entry, "file_suffix": ".txt",
+                    "value": "x y\n1 %s\n" % self.entry}
+        def to_json(self):
+            return {"name": "data", "entry": self.entry, "value": {"y": np.arange(2)}}
+
+    datasets = [Data("a"), Data("b")]
+    template_data = {"template": "t"}
+
+    # concatenated text matches the in-memory export
+    filename, chunks = stream_export(datasets, text, "to_text", template_data, True)
+    [expected] = text(datasets, "to_text", template_data, True)
+    assert filename == expected["filename"] == "data_a.txt"
+    assert b"".join(chunks) == expected["value"].encode('utf-8')
+
+    filename, chunks = stream_export(datasets, json_writer, "to_json", template_data, True)
+    assert json.loads(b"".join(chunks).decode('utf-8')) == {
+        "template_data": template_data, "outputs": [{"y": [0, 1]}, {"y": [0, 1]}]}
+
+    # json layout matches the in-memory export, compact or not
+    class CompactData(Data):
+        def to_json(self):
+            return dict(Data.to_json(self), compact=True)
+    for data in (datasets, [CompactData("a"), CompactData("b")]):
+        filename, chunks = stream_export(data, json_writer, "to_json", template_data, True)
+        [expected] = json_writer(data, "to_json", template_data, True)
+        assert b"".join(chunks) == expected["value"].encode('utf-8')
+
+    # separate files are sent as a zip archive
+    filename, chunks = stream_export(datasets, text, "to_text", template_data, False)
+    assert filename == "data_a.zip"
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.namelist() == ["data_a.txt", "data_b.txt"]
+        assert archive.read("data_b.txt").decode('utf-8').endswith("1 b\n")
+
+    # a single dataset is sent as is
+    filename, chunks = stream_export(datasets[:1], text, "to_text", template_data, False)
+    assert filename == "data_a.txt" and b"".join(chunks).endswith(b"1 a\n")
@@ -1,3 +1,13 @@
+"""
+Read-only access to NeXus-zip (hzf) files with an h5py-like interface.
+
+The member tree is indexed once from the zip central directory when the
+file is opened, and attributes, groups and fields are cached as they are
+accessed, so walking a file with thousands of members does not rescan the
+zip directory or reparse the *.attrs* JSON.  Field values are decoded on
+first access.  Use :meth:`File.prefetch` to decompress a set of members in
+parallel before reading them.
+"""
 from __future__ import print_function
 
 import sys
@@ -36,8 +46,7 @@ class Node(object):
             self.path = posixpath.join(parent_node.path, path)
 
     def makeAttrs(self):
-        attr_data = self.root.open(posixpath.join(self.path, self._attrs_filename), "r").read()
-        return json.loads(bytes_to_str(attr_data))
+        return self.root.read_attrs(posixpath.join(self.path, self._attrs_filename))
 
     @property
     def parent(self):
@@ -59,6 +68,9 @@ class Node(object):
         return [x for x in self.root.listdir(self.path)
                 if not x.endswith('.attrs') and not x.endswith('.link')]
 
+    def __iter__(self):
+        return iter(self.keys())
+
     def values(self):
         keys = self.keys()
         return [self[k] for k in keys]
@@ -82,16 +94,22 @@ class Node(object):
             full_path = posixpath.join(self.path, path)
 
         #os_path = posixpath.join(self.os_path, full_path.lstrip("/"))
+        full_path = posixpath.normpath(full_path)
+        nodes = self.root._nodes
+        if full_path in nodes:
+            return nodes[full_path]
         if self.root.exists(full_path):
             if self.root.isdir(full_path):
                 # it's a group
-                return Group(self, full_path)
+                node = Group(self, full_path)
             elif self.root.exists(full_path + ".link"):
                 # it's a link
                 return makeSoftLink(self, full_path)
             else:
                 # it's a field
-                return FieldFile(self, full_path)
+                node = FieldFile(self, full_path)
+            nodes[full_path] = node
+            return node
         else:
             # the item doesn't exist
             raise KeyError(path)
@@ -113,14 +131,44 @@ class Node(object):
 class File(Node):
     def __init__(self, filename, file_obj=None):
         self.readonly = True
+        self._nodes = {}
+        self._attrs = {}
+        self._prefetched = {}
         Node.__init__(self, parent_node=None, path="/")
         if file_obj is None:
             file_obj = builtin_open(filename, mode='rb')
         self.zipfile = zipfile.ZipFile(file_obj)
+        self._build_index()
         self.attrs = self.makeAttrs()
         self.filename = filename
         self.mode = "r"
 
+    def _build_index(self):
+        """
+        Index the members of the zip file by directory.
+
+        Directories are implied by the paths of their members even if the
+        zip file does not contain an explicit entry for the directory.
+        """
+        self._members = {}
+        self._children = {"": []}
+        for info in self.zipfile.infolist():
+            name = info.filename.rstrip("/")
+            if info.filename.endswith("/"):
+                self._add_dir(name)
+            else:
+                self._members[name] = info
+                parent = posixpath.dirname(name)
+                self._add_dir(parent)
+                self._children[parent].append(posixpath.basename(name))
+
+    def _add_dir(self, path):
+        if path not in self._children:
+            self._children[path] = []
+            parent = posixpath.dirname(path)
+            self._add_dir(parent)
+            self._children[parent].append(posixpath.basename(path))
+
     def flush(self):
         # might make this do writezip someday.
         pass
@@ -128,32 +176,57 @@ class File(Node):
     def isdir(self, path):
         """ abstraction for looking up paths:
         should work for unpacked directories and packed zip archives """
-        path = path.lstrip("/")
-        if path == "":
-            return True # root path
-        else:
-            filenames = self.root.zipfile.namelist()
-            return (path.rstrip("/") + "/") in filenames
+        return path.strip("/") in self._children
 
     def listdir(self, path):
         """ abstraction for looking up paths:
         should work for unpacked directories and packed zip archives """
-        path = path.strip("/")
-        return [posixpath.basename(fn.rstrip("/"))
-                for fn in self.zipfile.namelist()
-                if posixpath.dirname(fn.rstrip("/")) == path]
+        return list(self._children.get(path.strip("/"), []))
 
     def exists(self, path):
         path = path.strip("/")
-        filenames = self.root.zipfile.namelist()
-        return path in filenames or self.isdir(path)
+        return path in self._members or path in self._children
 
     def read(self, path):
-        return self.open(path, "r").read()
+        path = path.strip("/")
+        if path in self._prefetched:
+            return self._prefetched.pop(path)
+        return self.zipfile.read(self._members[path])
+
+    def read_attrs(self, path):
+        path = path.strip("/")
+        if path not in self._attrs:
+            self._attrs[path] = json.loads(bytes_to_str(self.read(path)))
+        return self._attrs[path]
+
+    def prefetch(self, paths=None, max_workers=None):
+        """
+        Decompress members in parallel so that later reads are immediate.
+
+        *paths* is a list of field paths, or None for every field in the
+        file.  The attributes for each field are prefetched as well.
+        Decompression releases the GIL, so independent members are read
+        on a thread pool of up to *max_workers* threads.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if paths is None:
+            names = [name for name in self._members
+                     if name not in self._prefetched]
+        else:
+            names = []
+            for path in paths:
+                path = path.strip("/")
+                for name in (path, path + FieldFile._attrs_suffix):
+                    if name in self._members and name not in self._prefetched:
+                        names.append(name)
+        infos = [self._members[name] for name in names]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            contents = list(executor.map(self.zipfile.read, infos))
+        self._prefetched.update(zip(names, contents))
 
     def getsize(self, path):
-        path = path.lstrip("/")
-        return self.zipfile.getinfo(path).file_size
+        return self._members[path.strip("/")].file_size
 
     def open(self, path, mode):
         path = path.lstrip("/")
@@ -164,6 +237,8 @@ class File(Node):
 
     def close(self):
         # there seems to be only one read-only mode
+        self._nodes.clear()
+        self._prefetched.clear()
         self.zipfile.close()
 
 
@@ -199,8 +274,7 @@ class FieldFile(object):
             # relative path:
             path = posixpath.join(node.path, path)
         self.path = path
-        attr_data = self.root.open(self.path + self._attrs_suffix, "r").read()
-        self.attrs = json.loads(bytes_to_str(attr_data))
+        self.attrs = self.root.read_attrs(self.path + self._attrs_suffix)
         self._value = None
 
 
@@ -237,36 +311,32 @@ class FieldFile(object):
         if self._value is None:
             attrs = self.attrs
             target = self.path
-            try:
-                infile = self.root.open(target, 'rb')
-                dtype_str = str(attrs['format'])
-                # CRUFT: <l4, <d8 are not sensible dtypes
-                if dtype_str == '<l4': dtype_str = '<i4'
-                if dtype_str == '<l8': dtype_str = '<i8'
-                if dtype_str == '<d8': dtype_str = '<f8'
-                if IS_PY3: dtype_str = dtype_str.replace('S', 'U')
-                dtype = numpy.dtype(dtype_str)
-                if attrs.get('binary', False) == True:
-                    s = infile.read()
-                    d = numpy.frombuffer(s, dtype=dtype).copy()
-                elif self.root.getsize(target) == 1:
-                    # empty entry: only contains \n
-                    # this is only possible with empty string being written.
-                    d = numpy.array([''], dtype=dtype)
-                elif dtype.kind == 'S':
-                    data = [[v for v in line[:-1].split(b'\t')]
-                            for line in infile]
-                    d = numpy.squeeze(numpy.array(data))
-                    d = _unescape_str(d)
-                elif dtype.kind == 'U':
-                    data = [[v.decode('utf-8') for v in line[:-1].split(b'\t')]
-                            for line in infile]
-                    d = numpy.squeeze(numpy.array(data))
-                    d = _unescape_str(d)
-                else:
-                    d = numpy.loadtxt(infile, dtype=dtype, delimiter='\t')
-            finally:
-                infile.close()
+            dtype_str = str(attrs['format'])
+            # CRUFT: <l4, <d8 are not sensible dtypes
+            if dtype_str == '<l4': dtype_str = '<i4'
+            if dtype_str == '<l8': dtype_str = '<i8'
+            if dtype_str == '<d8': dtype_str = '<f8'
+            if IS_PY3: dtype_str = dtype_str.replace('S', 'U')
+            dtype = numpy.dtype(dtype_str)
+            content = self.root.read(target)
+            if attrs.get('binary', False) == True:
+                d = numpy.frombuffer(content, dtype=dtype).copy()
+            elif len(content) == 1:
+                # empty entry: only contains \n
+                # this is only possible with empty string being written.
+                d = numpy.array([''], dtype=dtype)
+            elif dtype.kind == 'S':
+                data = [[v for v in line.split(b'\t')]
+                        for line in content.splitlines()]
+                d = numpy.squeeze(numpy.array(data))
+                d = _unescape_str(d)
+            elif dtype.kind == 'U':
+                data = [[v.decode('utf-8') for v in line.split(b'\t')]
+                        for line in content.splitlines()]
+                d = numpy.squeeze(numpy.array(data))
+                d = _unescape_str(d)
+            else:
+                d = numpy.loadtxt(content.splitlines(), dtype=dtype, delimiter='\t')
             if 'shape' in attrs:
                 try:
                     d = d.reshape(attrs['shape'])
@@ -292,13 +362,56 @@ def _unescape_str(data):
 
 def makeSoftLink(parent, path):
     orig_attrs_path = path.lstrip("/") + ".link"
-    attr_data = parent.root.open(orig_attrs_path, 'r').read()
-    linkinfo = json.loads(bytes_to_str(attr_data))
+    linkinfo = parent.root.read_attrs(orig_attrs_path)
     target = linkinfo['target']
     target_obj = parent.root[target]
     target_obj.orig_path = path
     return target_obj
 
+def test_hzf():
+    import io
+
+    def attrs(**kw):
+        return json.dumps(kw)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(".attrs", attrs(NX_class="NXroot"))
+        # no explicit directory entry for entry/ or entry/data/
+        zf.writestr("entry/.attrs", attrs(NX_class="NXentry"))
+        zf.writestr("entry/data/.attrs", attrs(NX_class="NXdata"))
+        counts = numpy.arange(6, dtype='<f8')
+        zf.writestr("entry/data/counts", counts.tobytes())
+        zf.writestr("entry/data/counts.attrs", attrs(
+            format="<f8", binary=True, shape=[2, 3], units="counts"))
+        zf.writestr("entry/data/index", b"1\t2\n3\t4\n")
+        zf.writestr("entry/data/index.attrs", attrs(format="<i4", shape=[2, 2]))
+        zf.writestr("entry/data/name", b"a\\tb\tc\n")
+        zf.writestr("entry/data/name.attrs", attrs(format="|S4"))
+        zf.writestr("entry/data/empty", b"\n")
+        zf.writestr("entry/data/empty.attrs", attrs(format="|S1"))
+        zf.writestr("entry/alias", b"")
+        zf.writestr("entry/alias.link", json.dumps({"target": "/entry/data/counts"}))
+
+    for prefetch in (False, True):
+        f = File("test.nxs.ngx", buffer)
+        if prefetch:
+            f.prefetch()
+        assert f.keys() == ["entry"]
+        entry = f["entry"]
+        assert entry.attrs["NX_class"] == "NXentry"
+        assert entry is f["/entry"]
+        assert sorted(entry.keys()) == ["alias", "data"]
+        assert sorted(entry["data"]) == ["counts", "empty", "index", "name"]
+        assert "data/counts" in entry and "data/missing" not in entry
+        assert (entry["data/counts"][()] == counts.reshape(2, 3)).all()
+        assert entry["data/counts"].attrs["units"] == "counts"
+        assert (entry["data/index"].value == [[1, 2], [3, 4]]).all()
+        assert list(entry["data/name"].value) == ["a\tb", "c"]
+        assert list(entry["data/empty"].value) == [""]
+        assert (entry["alias"].value == counts.reshape(2, 3)).all()
+        assert entry.get("missing", None) is None
+        f.close()
+
 #compatibility with h5nexus:
 group = Group
 field = FieldFile
@@ -0,0 +1,83 @@
+"""
+Msgpack encoding for responses containing numpy arrays.
+
+By default arrays are sent as lists, which is what the msgpack and json
+clients expect.  Clients which accept :data:`BINARY_ARRAYS_MIMETYPE`
+instead receive each numeric array as a msgpack extension of type
+:data:`NDARRAY_EXT` containing the packed list *[dtype, shape, bytes]*,
+where *dtype* is the numpy type string such as "<f8", *shape* is the
+array shape and *bytes* holds the little-endian values in C order.  This
+avoids creating a python object for every element of large 2-D detector
+images.
+"""
+import numpy as np
+import msgpack
+
+#: Response content type for msgpack with binary arrays
+BINARY_ARRAYS_MIMETYPE = "application/x-msgpack-ndarray"
+
+#: Msgpack extension type code for numpy arrays
+NDARRAY_EXT = 16
+
+# Array kinds which can be sent as binary: bool, int, unsigned and float
+_BINARY_KINDS = "biuf"
+
+def _default_list(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError("can not serialize %r object"%type(obj).__name__)
+
+def _default_binary(obj):
+    if isinstance(obj, np.ndarray) and obj.dtype.kind in _BINARY_KINDS:
+        if obj.dtype.kind == 'b':
+            obj = obj.astype('u1')
+        dtype = obj.dtype.newbyteorder('<')
+        data = np.ascontiguousarray(obj, dtype=dtype)
+        payload = msgpack.packb([dtype.str, list(data.shape), data.data],
+                                use_bin_type=True)
+        return msgpack.ExtType(NDARRAY_EXT, payload)
+    return _default_list(obj)
+
+def packb(obj, binary_arrays=False):
+    """
+    Pack *obj* into msgpack bytes, sending numpy arrays as lists or, if
+    *binary_arrays* is True, as :data:`NDARRAY_EXT` extension types.
+    """
+    default = _default_binary if binary_arrays else _default_list
+    return msgpack.packb(obj, use_bin_type=True, default=default)
+
+def _ext_hook(code, payload):
+    if code == NDARRAY_EXT:
+        dtype, shape, data = msgpack.unpackb(payload, raw=False)
+        return np.frombuffer(data, dtype=dtype).reshape(shape)
+    return msgpack.ExtType(code, payload)
+
+def unpackb(packed):
+    """
+    Unpack msgpack bytes, converting array extensions back to numpy arrays.
+    """
+    return msgpack.unpackb(packed, raw=False, ext_hook=_ext_hook)
+
+
+def test_packb():
+    obj = {
+        'z': [np.arange(12, dtype='float32').reshape(3, 4)],
+        'mask': np.array([True, False]),
+        'index': np.arange(3, dtype='>i8'),
+        'label': np.array(['a', 'b']),
+        'n': np.int64(3),
+        'x': [1.5, "a"],
+    }
+    as_lists = unpackb(packb(obj))
+    assert as_lists['z'] == [obj['z'][0].tolist()]
+    assert as_lists['label'] == ['a', 'b'] and as_lists['n'] == 3
+
+    binary = unpackb(packb(obj, binary_arrays=True))
+    assert binary['z'][0].dtype == np.dtype('<f4')
+    assert (binary['z'][0] == obj['z'][0]).all()
+    assert binary['mask'].tolist() == [1, 0]
+    assert binary['index'].dtype.str == '<i8'
+    assert binary['index'].tolist() == [0, 1, 2]
+    assert binary['label'] == ['a', 'b'] and binary['x'] == [1.5, "a"]
@@ -0,0 +1,166 @@
+"""
+Multi-resolution pyramids for level of detail plotting of 2-D data.
+
+:func:`build_pyramid` reduces an image *z[y, x]* by factors of two in
+each direction, keeping the minimum, maximum and mean of each block so
+that peaks are not lost when the plot is zoomed out.  :func:`select_tile`
+returns the part of the pyramid covering a viewport at the coarsest
+level which still gives the requested resolution, so the client need
+only transfer the pixels it can display.
+"""
+import numpy as np
+
+def build_pyramid(z, extent):
+    """
+    Build the level of detail pyramid for image *z[y, x]* covering
+    *extent = (xmin, xmax, ymin, ymax)*.
+
+    Returns a dictionary with the *extent*, the *shape* of the full image
+    and *levels*, a list of *{min, max, mean}* images, with level *k*
+    holding the statistics for blocks of *2^k x 2^k* pixels.  Blocks at
+    the edges may be partially filled.  NaN values are ignored.
+    """
+    z = np.asarray(z, dtype='float')
+    level = {'min': z, 'max': z, 'mean': z, 'count': np.isfinite(z).astype('i')}
+    levels = [level]
+    while level['mean'].shape != (1, 1):
+        level = _reduce(level)
+        levels.append(level)
+    for level in levels:
+        del level['count']
+    return {'extent': tuple(extent), 'shape': z.shape, 'levels': levels}
+
+def _reduce(level):
+    """
+    Combine 2x2 blocks of the level, padding odd dimensions with NaN.
+    """
+    ny, nx = level['mean'].shape
+    py, px = (ny%2 if ny > 1 else 0), (nx%2 if nx > 1 else 0)
+    ky, kx = (2 if ny > 1 else 1), (2 if nx > 1 else 1)
+    def blocks(v, fill):
+        v = np.pad(v, ((0, py), (0, px)), mode='constant', constant_values=fill)
+        return v.reshape(v.shape[0]//ky, ky, v.shape[1]//kx, kx)
+    count = blocks(level['count'], 0).sum(axis=(1, 3))
+    total = blocks(np.where(level['count'] > 0,
+                            level['mean']*level['count'], 0.), 0.)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total.sum(axis=(1, 3))/count
+    return {
+        # fmin/fmax ignore NaN padding without warnings
+        'min': np.fmin.reduce(np.fmin.reduce(blocks(level['min'], np.nan), axis=3), axis=1),
+        'max': np.fmax.reduce(np.fmax.reduce(blocks(level['max'], np.nan), axis=3), axis=1),
+        'mean': mean,
+        'count': count,
+    }
+
+def select_tile(pyramid, viewport=None, resolution=(512, 512)):
+    """
+    Return the part of *pyramid* covering *viewport = (xmin, xmax, ymin, ymax)*,
+    or the entire image if viewport is None, using the coarsest level that
+    has at least *resolution = (nx, ny)* pixels across the viewport.
+
+    Returns a 2-D plottable with *z* containing the block means, and
+    *z_min* and *z_max* containing the block extrema.  Like the full
+    resolution plottables, the values are flattened with y varying fastest.
+    """
+    xmin, xmax, ymin, ymax = pyramid['extent']
+    ny, nx = pyramid['shape']
+    dx, dy = (xmax - xmin)/nx, (ymax - ymin)/ny
+    if viewport is None:
+        viewport = pyramid['extent']
+    vxmin, vxmax, vymin, vymax = viewport
+    c0, c1 = _index_range(vxmin, vxmax, xmin, dx, nx)
+    r0, r1 = _index_range(vymin, vymax, ymin, dy, ny)
+
+    # Coarsest level with at least the requested resolution.
+    rx, ry = resolution
+    scale = min((c1 - c0)/float(max(rx, 1)), (r1 - r0)/float(max(ry, 1)))
+    k = int(np.floor(np.log2(scale))) if scale >= 1 else 0
+    k = min(k, len(pyramid['levels'])-1)
+    xstep, ystep = _level_step(nx, k), _level_step(ny, k)
+    i0, i1 = c0//xstep, -(-c1//xstep)
+    j0, j1 = r0//ystep, -(-r1//ystep)
+
+    level = pyramid['levels'][k]
+    index = (slice(j0, j1), slice(i0, i1))
+    mean, low, high = level['mean'][index], level['min'][index], level['max'][index]
+    dims = {
+        "xmin": xmin + i0*xstep*dx, "xmax": xmin + i1*xstep*dx, "xdim": i1 - i0,
+        "ymin": ymin + j0*ystep*dy, "ymax": ymin + j1*ystep*dy, "ydim": j1 - j0,
+        "zmin": np.nanmin(low) if np.isfinite(low).any() else 0.,
+        "zmax": np.nanmax(high) if np.isfinite(high).any() else 1.,
+    }
+    return {
+        'type': '2d',
+        'level': k,
+        'dims': dims,
+        'z': [mean.ravel('F')],
+        'z_min': [low.ravel('F')],
+        'z_max': [high.ravel('F')],
+    }
+
+def _level_step(n, k):
+    """
+    Pixels of an axis of length *n* in each block of pyramid level *k*.
+    An axis stops being reduced once it is a single block, which takes
+    ceil(log2(n)) levels.
+    """
+    return 2**min(k, (n-1).bit_length())
+
+def _index_range(low, high, start, step, n):
+    """
+    Pixels *[first, last)* overlapping *[low, high]* for pixels of width
+    *step* starting at *start*, with at least one pixel returned.
+    """
+    if step == 0.:
+        return 0, n
+    first = int(np.clip(np.floor((low - start)/step), 0, n-1))
+    last = int(np.clip(np.ceil((high - start)/step), first+1, n))
+    return first, last
+
+
+def test_pyramid():
+    z = np.arange(35, dtype='float').reshape(5, 7)
+    z[0, 0] = np.nan
+    pyramid = build_pyramid(z, (0., 7., 0., 5.))
+    levels = pyramid['levels']
+    assert [level['mean'].shape for level in levels] == [(5, 7), (3, 4), (2, 2), (1, 1)]
+    assert levels[1]['min'][0, 0] == 1. and levels[1]['max'][0, 0] == 8.
+    assert levels[1]['mean'][0, 0] == (1. + 7 + 8)/3
+    assert levels[1]['mean'][2, 3] == 34.
+    assert levels[-1]['min'][0, 0] == 1. and levels[-1]['max'][0, 0] == 34.
+    assert np.isclose(levels[-1]['mean'][0, 0], np.nanmean(z))
+
+    # full view at full resolution returns the original image, y fastest
+    tile = select_tile(pyramid, resolution=(7, 5))
+    assert tile['level'] == 0
+    assert np.array_equal(tile['z'][0], z.ravel('F'), equal_nan=True)
+
+    # low resolution request uses a coarser level
+    tile = select_tile(pyramid, resolution=(2, 2))
+    assert tile['level'] == 1
+    assert (tile['dims']['xdim'], tile['dims']['ydim']) == (4, 3)
+    assert tile['dims']['xmax'] == 8. and tile['dims']['ymax'] == 6.
+
+    # zoom in to a viewport
+    tile = select_tile(pyramid, viewport=(2.5, 4.5, 1., 3.), resolution=(2, 2))
+    assert tile['level'] == 0
+    dims = tile['dims']
+    assert (dims['xmin'], dims['xmax'], dims['ymin'], dims['ymax']) == (2., 5., 1., 3.)
+    assert np.array_equal(tile['z'][0], z[1:3, 2:5].ravel('F'))
+
+    # single column images only reduce along y
+    pyramid = build_pyramid(np.ones((4, 1)), (0., 1., 0., 4.))
+    assert [level['mean'].shape for level in pyramid['levels']] == [(4, 1), (2, 1), (1, 1)]
+    tile = select_tile(pyramid, resolution=(1, 2))
+    assert tile['level'] == 0 and tile['dims']['xmax'] == 1.
+
+    # the block size along each axis follows that axis's own reductions
+    pyramid = build_pyramid(np.ones((3, 40)), (0., 40., 0., 3.))
+    for k, level in enumerate(pyramid['levels']):
+        ny, nx = level['mean'].shape
+        assert -(-40//_level_step(40, k)) == nx and -(-3//_level_step(3, k)) == ny
+    tile = select_tile(pyramid, resolution=(10, 1))
+    dims = tile['dims']
+    assert tile['level'] == 1 and (dims['xdim'], dims['ydim']) == (20, 2)
+    assert dims['xmax'] == 40. and dims['ymax'] == 4.
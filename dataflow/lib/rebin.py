@@ -1,5 +1,10 @@
 """
 1-D and 2-D rebinning code.
+
+Rebinning uses compiled kernels if numba is installed, writing directly
+into the output arrays without the full size temporaries needed by the
+numpy implementation.  Set *USE_COMPILED = False* to force the numpy
+implementation.
 """
 import numpy as np
 
@@ -8,8 +13,16 @@ try:
 except ImportError:
     pass
 
-def rebin(x, I, xo, dtype=np.float64):
-    # type: (Sequence, Sequence, Sequence, Union[str, type]) -> np.ndarray
+try:
+    import numba
+except ImportError:
+    numba = None
+
+#: True if rebinning should use the compiled kernels
+USE_COMPILED = numba is not None
+
+def rebin(x, I, xo, dtype=np.float64, out=None):
+    # type: (Sequence, Sequence, Sequence, Union[str, type], Optional[np.ndarray]) -> np.ndarray
     """
     Rebin a vector.
 
@@ -26,6 +39,8 @@ def rebin(x, I, xo, dtype=np.float64):
     Note that total intensity is not preserved for integer rebinning.
     The algorithm uses truncation so total intensity will be down on
     average by half the total number of bins.
+
+    If *out* is given, the result is written into it and returned.
     """
     # Coerce to arrays and check shape
     I = np.asarray(I)
@@ -33,7 +48,14 @@ def rebin(x, I, xo, dtype=np.float64):
     if len(x.shape) != 1 or len(xo.shape) != 1 or len(x)-1 != len(I):
         raise TypeError("input array incorrect shape %s"%I.shape)
 
+    if USE_COMPILED and np.dtype(dtype).kind == 'f':
+        out = _output(out, (len(xo)-1,), dtype)
+        _rebin_compiled(_rebin_1d_kernel, (x,), I, None, (xo,), out, None)
+        return out
     ix = _rebin_counts(x, I, xo, dtype=dtype)
+    if out is not None:
+        out[...] = ix
+        return out
     return ix
 
 
@@ -63,8 +85,8 @@ def _rebin_counts(x, I, xo, dtype):
     return ix[::-1] if reverse_xo else ix
 
 
-def rebin2d(x, y, I, xo, yo, dtype=np.float64):
-    # type: (Sequence, Sequence, Sequence, Sequence, Sequence, Union[str, type]) -> np.ndarray
+def rebin2d(x, y, I, xo, yo, dtype=np.float64, out=None):
+    # type: (Sequence, Sequence, Sequence, Sequence, Sequence, Union[str, type], Optional[np.ndarray]) -> np.ndarray
     """
     Rebin a matrix.
 
@@ -96,6 +118,8 @@ def rebin2d(x, y, I, xo, yo, dtype=np.float64):
     Note that total intensity is not preserved for integer rebinning.
     The algorithm uses truncation so total intensity will be down on
     average by half the total number of bins.
+
+    If *out* is given, the result is written into it and returned.
     """
     # Coerce inputs to arrays
     I = np.asarray(I)
@@ -104,10 +128,242 @@ def rebin2d(x, y, I, xo, yo, dtype=np.float64):
     if shape_in != I.shape or any(len(v.shape) != 1 for v in (x, y, xo, yo)):
         raise TypeError("input array incorrect shape %s"%str(I.shape))
 
+    if USE_COMPILED and np.dtype(dtype).kind == 'f':
+        out = _output(out, (len(xo)-1, len(yo)-1), dtype)
+        _rebin_compiled(_rebin_2d_kernel, (x, y), I, None, (xo, yo), out, None)
+        return out
     Io = _rebin_counts_2D(x, y, I, xo, yo, dtype=dtype)
+    if out is not None:
+        out[...] = Io
+        return out
     return Io
 
 
+def rebin_with_variance(x, I, varI, xo, out=None, out_var=None):
+    # type: (Sequence, Sequence, Sequence, Sequence, Optional[np.ndarray], Optional[np.ndarray]) -> (np.ndarray, np.ndarray)
+    """
+    Rebin a vector and its variance.
+
+    *x* are the existing bin edges and *xo* are the new bin edges.
+
+    *I*, *varI* are the existing counts and variance.  These may be stacks
+    of vectors, with bins along the last axis, which are rebinned together.
+
+    Each new bin receives the fraction *f* of the counts in each old bin
+    that it overlaps, and *f^2* of the variance.  Returns the rebinned
+    counts and variance, stored in *out* and *out_var* if they are given.
+    """
+    return _rebin_with_variance((x,), I, varI, (xo,), out, out_var)
+
+
+def rebin2d_with_variance(x, y, I, varI, xo, yo, out=None, out_var=None):
+    # type: (Sequence, Sequence, Sequence, Sequence, Sequence, Sequence, Optional[np.ndarray], Optional[np.ndarray]) -> (np.ndarray, np.ndarray)
+    """
+    Rebin a matrix and its variance.
+
+    *x*, *y* are the existing bin edges and *xo*, *yo* are the new bin edges.
+
+    *I*, *varI* are the existing counts and variance.  These may be stacks
+    of matrices, with bins along the last two axes, which are rebinned
+    together.
+
+    Each new bin receives the fraction *f* of the counts in each old bin
+    that it overlaps, and *f^2* of the variance.  Returns the rebinned
+    counts and variance, stored in *out* and *out_var* if they are given.
+    """
+    return _rebin_with_variance((x, y), I, varI, (xo, yo), out, out_var)
+
+
+def rebin_uncertainty(x, U, xo):
+    """
+    Rebin the :class:`dataflow.lib.uncertainty.Uncertainty` vector *U*
+    from bin edges *x* to *xo*, propagating the variance as for
+    :func:`rebin_with_variance`.  *U* may be a stack of vectors with bins
+    along the last axis.
+    """
+    from .uncertainty import Uncertainty
+    return Uncertainty(*rebin_with_variance(x, U.x, U.variance, xo))
+
+
+def rebin2d_uncertainty(x, y, U, xo, yo):
+    """
+    Rebin the :class:`dataflow.lib.uncertainty.Uncertainty` matrix *U*
+    from bin edges *x*, *y* to *xo*, *yo*, propagating the variance as for
+    :func:`rebin2d_with_variance`.  *U* may be a stack of matrices with
+    bins along the last two axes.
+    """
+    from .uncertainty import Uncertainty
+    return Uncertainty(*rebin2d_with_variance(x, y, U.x, U.variance, xo, yo))
+
+
+def _rebin_with_variance(edges, I, varI, edges_out, out, out_var):
+    I, varI = np.asarray(I, 'd'), np.asarray(varI, 'd')
+    edges = [np.asarray(v, dtype='d') for v in edges]
+    edges_out = [np.asarray(v, dtype='d') for v in edges_out]
+    naxes = len(edges)
+    shape_in = tuple(len(v)-1 for v in edges)
+    if (I.shape[I.ndim-naxes:] != shape_in or I.shape != varI.shape
+            or any(len(v.shape) != 1 for v in edges + edges_out)):
+        raise TypeError("input array incorrect shape %s"%str(I.shape))
+
+    shape = I.shape[:I.ndim-naxes] + tuple(len(v)-1 for v in edges_out)
+    out, out_var = _output(out, shape, 'd'), _output(out_var, shape, 'd')
+    if USE_COMPILED:
+        kernel = _rebin_1d_kernel if naxes == 1 else _rebin_2d_kernel
+        _rebin_compiled(kernel, edges, I, varI, edges_out, out, out_var)
+    else:
+        _rebin_pieces(edges, I, varI, edges_out, out, out_var)
+    return out, out_var
+
+
+def _output(out, shape, dtype):
+    if out is None:
+        return np.zeros(shape, dtype=dtype)
+    if out.shape != shape:
+        raise TypeError("output array incorrect shape %s"%str(out.shape))
+    out[...] = 0
+    return out
+
+def _ascending(edges, values):
+    """
+    Reverse the *edges* and the corresponding trailing axes of *values*
+    where the edges are descending.  Slices are cheap---they don't make
+    copies.
+    """
+    edges = list(edges)
+    for axis, v in enumerate(edges):
+        if v[0] > v[-1]:
+            edges[axis] = v[::-1]
+            index = (Ellipsis, slice(None, None, -1)) + (slice(None),)*(len(edges)-1-axis)
+            values = [(a[index] if a is not None else None) for a in values]
+    return edges, values
+
+def _stack(a, naxes):
+    """
+    View *a* as a stack of arrays with *naxes* dimensions.
+    """
+    return a.reshape((-1,) + a.shape[a.ndim-naxes:])
+
+def _rebin_compiled(kernel, edges, I, varI, edges_out, out, out_var):
+    naxes = len(edges)
+    edges, (I, varI) = _ascending(edges, (I, varI))
+    edges_out, (out, out_var) = _ascending(edges_out, (out, out_var))
+    # The kernels work on stacks of arrays, and skip the variance if it
+    # is given as empty arrays.
+    I = _stack(I, naxes)
+    if varI is None:
+        varI = result_var = np.empty((0,)*(naxes+1), dtype='d')
+    else:
+        varI, result_var = _stack(varI, naxes), _stack(out_var, naxes)
+    result = _stack(out, naxes)
+    kernel(*(tuple(edges) + (I,) + tuple(edges_out) + (result, varI, result_var)))
+    # Reshaping a strided output may have made a copy.
+    for target, value in ((out, result), (out_var, result_var)):
+        if target is not None and not np.may_share_memory(target, value):
+            target[...] = value.reshape(target.shape)
+
+
+# Compiled rebinning kernels.  The edges must be ascending and the outputs
+# zeroed.  The values are stacks of arrays, with the stack on the first
+# axis.  Variance is skipped if varI is empty.
+def _overlaps(x, xo, source, target, fraction):
+    """
+    Traverse both sets of bin edges, recording the portion of each old
+    bin which overlaps each new bin.  Returns the number of overlaps.
+    """
+    nx, nxo = len(x)-1, len(xo)-1
+    i = j = n = 0
+    while i < nx and j < nxo:
+        lo, hi = max(x[i], xo[j]), min(x[i+1], xo[j+1])
+        if hi > lo:
+            source[n], target[n] = i, j
+            fraction[n] = (hi - lo)/(x[i+1] - x[i])
+            n += 1
+        if x[i+1] < xo[j+1]:
+            i += 1
+        else:
+            j += 1
+    return n
+
+def _rebin_1d_kernel(x, I, xo, out, varI, out_var):
+    size = len(x) + len(xo)
+    source, target = np.empty(size, np.int64), np.empty(size, np.int64)
+    fraction = np.empty(size, np.float64)
+    n = _overlaps(x, xo, source, target, fraction)
+    with_var = varI.shape[0] > 0
+    for k in range(I.shape[0]):
+        for p in range(n):
+            f = fraction[p]
+            out[k, target[p]] += f*I[k, source[p]]
+            if with_var:
+                out_var[k, target[p]] += f*f*varI[k, source[p]]
+
+def _rebin_2d_kernel(x, y, I, xo, yo, out, varI, out_var):
+    size = len(x) + len(xo)
+    sx, tx = np.empty(size, np.int64), np.empty(size, np.int64)
+    fx = np.empty(size, np.float64)
+    nx = _overlaps(x, xo, sx, tx, fx)
+    size = len(y) + len(yo)
+    sy, ty = np.empty(size, np.int64), np.empty(size, np.int64)
+    fy = np.empty(size, np.float64)
+    ny = _overlaps(y, yo, sy, ty, fy)
+    with_var = varI.shape[0] > 0
+    for k in range(I.shape[0]):
+        for p in range(nx):
+            for q in range(ny):
+                f = fx[p]*fy[q]
+                out[k, tx[p], ty[q]] += f*I[k, sx[p], sy[q]]
+                if with_var:
+                    out_var[k, tx[p], ty[q]] += f*f*varI[k, sx[p], sy[q]]
+
+if USE_COMPILED:
+    # Later kernels call the compiled versions of the earlier ones.
+    _overlaps = numba.njit(cache=True)(_overlaps)
+    _rebin_1d_kernel = numba.njit(cache=True)(_rebin_1d_kernel)
+    _rebin_2d_kernel = numba.njit(cache=True)(_rebin_2d_kernel)
+
+
+def _pieces(x, xo):
+    """
+    Vectorized version of :func:`_overlaps`, returning *source*, *target*
+    and *fraction* arrays ordered by target bin.
+    """
+    lo, hi = max(x[0], xo[0]), min(x[-1], xo[-1])
+    edges = np.unique(np.concatenate((x, xo)))
+    edges = edges[(edges >= lo) & (edges <= hi)]
+    # No edge falls strictly within the overlap of an old and a new bin,
+    # so each interval between edges is the overlap of one pair of bins.
+    mid = 0.5*(edges[:-1] + edges[1:])
+    source = np.searchsorted(x, mid) - 1
+    target = np.searchsorted(xo, mid) - 1
+    fraction = np.diff(edges)/(x[source+1] - x[source])
+    return source, target, fraction
+
+def _rebin_axis(I, pieces, n, axis, power=1):
+    """
+    Rebin *I* along *axis* into *n* bins using the overlapping *pieces*,
+    with the overlap fractions raised to *power*.
+    """
+    source, target, fraction = pieces
+    I = np.moveaxis(I, axis, 0)
+    result = np.zeros((n,) + I.shape[1:], dtype='d')
+    if len(source):
+        weight = (fraction**power).reshape((-1,) + (1,)*(I.ndim-1))
+        starts = np.flatnonzero(np.diff(target, prepend=-1))
+        result[target[starts]] = np.add.reduceat(I[source]*weight, starts, axis=0)
+    return np.moveaxis(result, 0, axis)
+
+def _rebin_pieces(edges, I, varI, edges_out, out, out_var):
+    edges, (I, varI) = _ascending(edges, (I, varI))
+    edges_out, (out, out_var) = _ascending(edges_out, (out, out_var))
+    first = I.ndim - len(edges)
+    for axis, (x, xo) in enumerate(zip(edges, edges_out)):
+        pieces = _pieces(x, xo)
+        I = _rebin_axis(I, pieces, len(xo)-1, first+axis)
+        varI = _rebin_axis(varI, pieces, len(xo)-1, first+axis, power=2)
+    out[...], out_var[...] = I, varI
+
+
 def _rebin_counts_2D(x, y, I, xo, yo, dtype):
     # type: (np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray) -> None
 
@@ -293,9 +549,84 @@ def _test2d():
     _uniform_test([3, 2], [1, 2])
 
 
+def _test_kernels():
+    # Compare the kernels (python loops if numba is not available) and the
+    # variance rebinning to the numpy implementation.
+    rng = np.random.RandomState(7)
+    x = np.cumsum(rng.uniform(0.5, 1.5, 9))
+    y = np.cumsum(rng.uniform(0.5, 1.5, 7))
+    xo, yo = np.linspace(x[0]-1, x[-1]+2, 5), np.linspace(y[-1]-0.3, y[1], 11)
+    I = rng.uniform(0, 10, (8, 6))
+    varI = rng.uniform(0, 2, I.shape)
+    for edges, edges_out, kernel, target in (
+            ((x,), (xo,), _rebin_1d_kernel, rebin(x, I[:, 0], xo)),
+            ((x[::-1],), (xo,), _rebin_1d_kernel, rebin(x, I[:, 0], xo)),
+            ((x, y), (xo, yo), _rebin_2d_kernel, rebin2d(x, y, I, xo, yo)),
+        ):
+        v = I[:, 0] if len(edges) == 1 else I
+        dv = varI[:, 0] if len(edges) == 1 else varI
+        if edges[0][0] > edges[0][-1]:
+            v, dv = v[::-1], dv[::-1]
+        shape = tuple(len(e)-1 for e in edges_out)
+        out, out_var = np.zeros(shape), np.zeros(shape)
+        _rebin_compiled(kernel, edges, v, dv, edges_out, out, out_var)
+        assert np.allclose(out, target, rtol=1e-14)
+        pieces, pieces_var = np.zeros(shape), np.zeros(shape)
+        _rebin_pieces(edges, v, dv, edges_out, pieces, pieces_var)
+        assert np.allclose(pieces, target, rtol=1e-14)
+        assert np.allclose(pieces_var, out_var, rtol=1e-14)
+
+    # variance takes the square of the overlap fraction
+    Io, varIo = rebin_with_variance([0, 2, 4], [4, 8], [4, 8], [1, 3])
+    assert np.allclose(Io, [6]) and np.allclose(varIo, [4*0.25 + 8*0.25])
+    out = np.empty((2, 1))
+    Io, varIo = rebin2d_with_variance(
+        [0, 2, 4], [0, 1], [[4], [8]], [[4], [8]], [0, 1, 3], [0, 1], out=out)
+    assert Io is out and np.allclose(Io, [[2], [6]])
+    assert np.allclose(varIo, [[1], [4*0.25 + 8*0.25]])
+
+
+def _test_stacks():
+    # Stacks of spectra match rebinning each spectrum on its own, for both
+    # the compiled and the numpy implementations.
+    global USE_COMPILED
+    from .uncertainty import Uncertainty
+    rng = np.random.RandomState(11)
+    x = np.cumsum(rng.uniform(0.5, 1.5, 9))
+    y = np.cumsum(rng.uniform(0.5, 1.5, 7))
+    xo, yo = np.linspace(x[-1]+2, x[0]-1, 5), np.linspace(y[0]-0.3, y[-2], 11)
+    I = rng.uniform(0, 10, (2, 3, 8, 6))
+    varI = rng.uniform(0, 2, I.shape)
+    saved = USE_COMPILED
+    try:
+        for USE_COMPILED in sorted(set((False, saved))):
+            U = rebin_uncertainty(x, Uncertainty(I[..., 0], varI[..., 0]), xo)
+            assert U.x.shape == (2, 3, 4)
+            U2 = rebin2d_uncertainty(x, y, Uncertainty(I, varI), xo, yo)
+            assert U2.x.shape == (2, 3, 4, 10)
+            for k in np.ndindex(2, 3):
+                Io, varIo = rebin_with_variance(x, I[k][:, 0], varI[k][:, 0], xo)
+                assert np.allclose(U.x[k], Io, rtol=1e-14)
+                assert np.allclose(U.variance[k], varIo, rtol=1e-14)
+                Io, varIo = rebin2d_with_variance(x, y, I[k], varI[k], xo, yo)
+                assert np.allclose(U2.x[k], Io, rtol=1e-14)
+                assert np.allclose(U2.variance[k], varIo, rtol=1e-14)
+            # strided outputs are filled in place
+            out = np.empty((3, 10, 4)).transpose(0, 2, 1)
+            out_var = np.empty_like(out)
+            Io, varIo = rebin2d_with_variance(
+                x, y, I[0], varI[0], xo, yo, out=out, out_var=out_var)
+            assert Io is out and np.allclose(out, U2.x[0], rtol=1e-14)
+            assert np.allclose(out_var, U2.variance[0], rtol=1e-14)
+    finally:
+        USE_COMPILED = saved
+
+
 def test():
     _test1d()
     _test2d()
+    _test_kernels()
+    _test_stacks()
 
 
 if __name__ == "__main__":
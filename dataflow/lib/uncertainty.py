@@ -14,10 +14,16 @@ To save memory for huge arrays, the original data is used if it is a
 floating point type. In place operations (a*=b, etc.) create at most one
 extra copy for each operation. The out-of-place operation c=a*b by contrast
 uses four intermediate vectors, so shouldn't be used for huge arrays.
+
+For chains of operations on huge arrays use :func:`lazy` to build an
+expression which is evaluated in blocks, so the only full size arrays
+created are the value and variance of the result::
+
+    c = ((lazy(a) - b) / d * e).evaluate()
 """
 from __future__ import division
 
-__all__ = ['Uncertainty']
+__all__ = ['Uncertainty', 'Expression', 'Interpolation', 'lazy']
 
 from copy import copy
 
@@ -227,26 +233,36 @@ class Uncertainty(object):
     def __add__(self, other):
         if isinstance(other, Uncertainty):
             return _U(*err1d.add(self.x, self.variance, other.x, other.variance))
+        elif isinstance(other, Expression):
+            return NotImplemented
         else:
             return _U(self.x+other, self.variance+0.)  # Force copy
     def __sub__(self, other):
         if isinstance(other, Uncertainty):
             return _U(*err1d.sub(self.x, self.variance, other.x, other.variance))
+        elif isinstance(other, Expression):
+            return NotImplemented
         else:
             return _U(self.x-other, self.variance+0.)  # Force copy
     def __mul__(self, other):
         if isinstance(other, Uncertainty):
             return _U(*err1d.mul(self.x, self.variance, other.x, other.variance))
+        elif isinstance(other, Expression):
+            return NotImplemented
         else:
             return _U(self.x*other, self.variance*other**2)
     def __truediv__(self, other):
         if isinstance(other, Uncertainty):
             return _U(*err1d.div(self.x, self.variance, other.x, other.variance))
+        elif isinstance(other, Expression):
+            return NotImplemented
         else:
             return _U(self.x/other, self.variance/other**2)
     def __pow__(self, other):
         if isinstance(other, Uncertainty):
             return _U(*err1d.pow2(self.x, self.variance, other.x, other.variance))
+        elif isinstance(other, Expression):
+            return NotImplemented
         else:
             return _U(*err1d.pow(self.x, self.variance, other))
 
@@ -260,7 +276,7 @@ class Uncertainty(object):
     def __rtruediv__(self, other):
         return _U(other/self.x, self.variance*other**2/self.x**4)
     def __rpow__(self, other):
-        return exp(np.log(other)*self)
+        return (np.log(other)*self).exp()
 
     # In-place operations: may not be of mixed type
     # Note that the inplace operations are only inplace for numpy vectors.
@@ -483,6 +499,200 @@ def average(x, axis=None, weights=None):
     return x.average(axis=axis, weights=weights)
 
 
+#: Number of elements in each block when evaluating an expression
+BLOCK_SIZE = 2**16
+
+def lazy(value):
+    """
+    Start a lazy expression with *value*, which may be an uncertainty
+    object, an array or a scalar.  Arithmetic with the result builds an
+    :class:`Expression`, which is computed by :meth:`Expression.evaluate`.
+    """
+    return value if isinstance(value, Expression) else Expression(None, value)
+
+class Expression(object):
+    """
+    Unevaluated arithmetic on uncertainty objects.
+
+    The expression is evaluated in blocks of *BLOCK_SIZE* elements along
+    the first axis, with the same error propagation as the corresponding
+    :class:`Uncertainty` operations, so intermediate results are small
+    enough to stay in the processor cache.  Repeated use of a value in the
+    expression is treated as independent, as it is for :class:`Uncertainty`.
+
+    Supports the arithmetic operators and the functions exp, log, sin,
+    cos, tan, arcsin, arccos and arctan, with operands which are
+    uncertainty objects, arrays, scalars or other expressions.
+    """
+    __slots__ = ('op', 'args')
+    __array_priority__ = 30.   # force array*expression to use our __rmul__
+
+    def __init__(self, op, *args):
+        self.op = op
+        self.args = args
+
+    def evaluate(self, out=None):
+        """
+        Compute the expression, returning an uncertainty object.
+
+        If *out* is given then the result is stored in its value and
+        variance arrays.
+        """
+        leaves = [_leaf_value(v) for v in self._leaves()]
+        shape = np.broadcast(*leaves).shape
+        dtype = np.result_type(*(leaves + [1.]))
+        if out is None:
+            if not shape:
+                return _U(*_zero_variance(self._evaluate(shape, Ellipsis)))
+            out = _U(np.empty(shape, dtype), np.empty(shape, dtype))
+        elif out.shape != shape:
+            raise TypeError("output shape %s does not match expression shape %s"
+                            % (out.shape, shape))
+        if not shape:
+            out.x[...], out.variance[...] = _zero_variance(
+                self._evaluate(shape, Ellipsis))
+            return out
+        rows = max(1, BLOCK_SIZE//max(1, int(np.prod(shape[1:]))))
+        for start in range(0, shape[0], rows):
+            index = slice(start, start+rows)
+            X, varX = self._evaluate(shape, index)
+            out.x[index] = X
+            out.variance[index] = varX if varX is not None else 0.
+        return out
+
+    def _leaves(self):
+        if self.op is None:
+            yield self.args[0]
+        else:
+            for arg in self.args:
+                if isinstance(arg, Expression):
+                    for leaf in arg._leaves():
+                        yield leaf
+
+    def _evaluate(self, shape, index):
+        # Returns value and variance for the block, with variance None
+        # for values without uncertainty.
+        if self.op is None:
+            value = self.args[0]
+            if isinstance(value, Uncertainty):
+                return (_block(value.x, shape, index),
+                        _block(value.variance, shape, index))
+            return _block(value, shape, index), None
+        args = [arg._evaluate(shape, index) for arg in self.args]
+        return _OPERATIONS[self.op](*args)
+
+    def _binary(self, op, other):
+        return Expression(op, self, lazy(other))
+    def _reverse(self, op, other):
+        return Expression(op, lazy(other), self)
+
+    def __add__(self, other): return self._binary('add', other)
+    def __sub__(self, other): return self._binary('sub', other)
+    def __mul__(self, other): return self._binary('mul', other)
+    def __truediv__(self, other): return self._binary('div', other)
+    def __pow__(self, other): return self._binary('pow', other)
+    def __radd__(self, other): return self._reverse('add', other)
+    def __rsub__(self, other): return self._reverse('sub', other)
+    def __rmul__(self, other): return self._reverse('mul', other)
+    def __rtruediv__(self, other): return self._reverse('div', other)
+    def __rpow__(self, other): return self._reverse('pow', other)
+    __div__, __rdiv__ = __truediv__, __rtruediv__
+    def __neg__(self): return Expression('neg', self)
+    def __pos__(self): return self
+
+    def exp(self): return Expression('exp', self)
+    def log(self): return Expression('log', self)
+    def sin(self): return Expression('sin', self)
+    def cos(self): return Expression('cos', self)
+    def tan(self): return Expression('tan', self)
+    def arcsin(self): return Expression('arcsin', self)
+    def arccos(self): return Expression('arccos', self)
+    def arctan(self): return Expression('arctan', self)
+
+    def __repr__(self):
+        if self.op is None:
+            return "lazy(%r)" % (self.args[0],)
+        return "%s(%s)" % (self.op, ", ".join(repr(v) for v in self.args))
+
+def _leaf_value(value):
+    return value.x if isinstance(value, Uncertainty) else value
+
+def _block(value, shape, index):
+    if np.ndim(value) == 0:
+        return value
+    return np.broadcast_to(value, shape)[index]
+
+def _zero_variance(result):
+    X, varX = result
+    return X, (varX if varX is not None else np.zeros_like(X))
+
+# Operations on (value, variance) pairs for expression blocks.  Variance is
+# None for values without uncertainty; these follow the mixed type
+# operations of the Uncertainty class.
+def _add(a, b):
+    (X, varX), (Y, varY) = a, b
+    if varX is None or varY is None:
+        return X + Y, (varX if varY is None else varY)
+    return err1d.add(X, varX, Y, varY)
+
+def _sub(a, b):
+    (X, varX), (Y, varY) = a, b
+    if varX is None or varY is None:
+        return X - Y, (varX if varY is None else varY)
+    return err1d.sub(X, varX, Y, varY)
+
+def _mul(a, b):
+    (X, varX), (Y, varY) = a, b
+    if varX is None and varY is None:
+        return X*Y, None
+    elif varY is None:
+        return X*Y, varX*Y**2
+    elif varX is None:
+        return X*Y, varY*X**2
+    return err1d.mul(X, varX, Y, varY)
+
+def _div(a, b):
+    (X, varX), (Y, varY) = a, b
+    if varX is None and varY is None:
+        return X/Y, None
+    elif varY is None:
+        return X/Y, varX/Y**2
+    elif varX is None:
+        return X/Y, varY*X**2/Y**4
+    return err1d.div(X, varX, Y, varY)
+
+def _pow(a, b):
+    (X, varX), (Y, varY) = a, b
+    if varX is None and varY is None:
+        return X**Y, None
+    elif varY is None:
+        return err1d.pow(X, varX, Y)
+    elif varX is None:
+        Z = X**Y
+        return Z, varY*(np.log(X)*Z)**2
+    return err1d.pow2(X, varX, Y, varY)
+
+def _neg(a):
+    X, varX = a
+    return -X, varX
+
+def _unary(name):
+    def operation(a):
+        X, varX = a
+        if varX is None:
+            return getattr(np, name)(X), None
+        return getattr(err1d, name)(X, varX)
+    return operation
+
+_OPERATIONS = {
+    'add': _add, 'sub': _sub, 'mul': _mul, 'div': _div, 'pow': _pow,
+    'neg': _neg,
+}
+for _name in ('exp', 'log', 'sin', 'cos', 'tan', 'arcsin', 'arccos', 'arctan'):
+    _OPERATIONS[_name] = _unary(_name)
+del _name
+
+
 def interp(x, xp, fp, left=None, right=None):
     """
     Linear interpolation of x into points (xk, yk +/- dyk).
@@ -494,18 +704,32 @@ def interp(x, xp, fp, left=None, right=None):
 
     right is the uncertainty value to return for points after the range of xp,
     or None for the final value, fp[-1].
-    """
-    if left is None: left = fp[0]
-    if right is None: right = fp[-1]
-    left = (left.x, left.variance)
-    right = (right.x, right.variance)
 
+    Use :class:`Interpolation` when interpolating many arrays from the
+    same xp onto the same x.
+    """
     if isinstance(x, np.ndarray) and x.ndim > 0:
-        F, varF = err1d.interp(x, xp, fp.x, fp.variance, left, right)
+        return Interpolation(x, xp)(fp, left, right)
     else:
-        F, varF = err1d.interp([x], xp, fp.x, fp.variance, left, right)
-        F, varF = F[0], varF[0]
-    return _U(F, varF)
+        z = Interpolation([x], xp)(fp, left, right)
+        return _U(z.x[0], z.variance[0])
+
+
+class Interpolation(err1d.Interpolation):
+    """
+    Linear interpolation of uncertainties from points *xp* onto points *x*.
+
+    The interval and weights for each point of *x* are computed once, and
+    the interpolation can then be applied to any number of uncertainty
+    arrays defined on *xp* with *plan(fp, left=None, right=None, axis=0)*.
+    See :func:`interp` and :class:`err1d.Interpolation` for details.
+    """
+    def __call__(self, fp, left=None, right=None, axis=0):
+        if left is not None: left = (left.x, left.variance)
+        if right is not None: right = (right.x, right.variance)
+        F, varF = err1d.Interpolation.__call__(
+            self, fp.x, fp.variance, left=left, right=right, axis=axis)
+        return _U(F, varF)
 
 
 def smooth(x, xp, fp, degree=2, span=5):
@@ -513,7 +737,7 @@ def smooth(x, xp, fp, degree=2, span=5):
     Windowed least squares smoothing.
     """
     if span > 2:
-        y, dy = wsolve.smooth(x, xp, fp, fp.dx, degree=degree, span=span)
+        y, dy = wsolve.smooth(x, xp, fp.x, fp.dx, degree=degree, span=span)
         return _U(y, dy**2)
     else:
         # TODO: smooth with extrapolate, but interp will not.
@@ -641,6 +865,51 @@ def test():
     z = interp([2.5, 3., 3.5], xp, fp)
     assert np.linalg.norm(z.x - [2, 3, 2]) < 2e-15
     assert np.linalg.norm(z.variance - [0.05, 0.04, 0.05]) < 2e-15
+    # one plan applied to a stack of spectra
+    x = np.array([1., 2.5, 3.5, 5.])
+    plan = Interpolation(x, xp)
+    stack = Uncertainty(np.array([fp.x, 2*fp.x]), np.array([fp.variance, 4*fp.variance]))
+    z = plan(stack, left=Uncertainty(0., 0.), axis=-1)
+    for k in range(2):
+        zk = interp(x, xp, stack[k], left=Uncertainty(0., 0.))
+        assert (z[k].x == zk.x).all() and (z[k].variance == zk.variance).all()
+    z = plan(Uncertainty(stack.x.T, stack.variance.T))
+    assert (z.x.T[1] == interp(x, xp, stack[1]).x).all()
+
+def test_expression():
+    rng = np.random.RandomState(5)
+    shape = (70, 30)
+    a, b, c, d = (Uncertainty(rng.uniform(1, 2, shape), rng.uniform(0, 0.1, shape))
+                  for _ in range(4))
+    e = rng.uniform(1, 2, shape[1])
+    f = Uncertainty(2.5, 0.3)
+
+    def _check(expr, target):
+        global BLOCK_SIZE
+        for block_size in (2**16, 100, 7):
+            BLOCK_SIZE, saved = block_size, BLOCK_SIZE
+            try:
+                z = expr.evaluate()
+            finally:
+                BLOCK_SIZE = saved
+            assert np.shape(z.x) == np.shape(target.x)
+            assert np.allclose(z.x, target.x, rtol=1e-14, atol=0)
+            assert np.allclose(z.variance, target.variance, rtol=1e-12, atol=0)
+
+    _check((lazy(a) - b) / c * d, (a - b) / c * d)
+    _check(a + lazy(b)*e - 3, a + b*e - 3)
+    _check(2./lazy(a) + e/b - f, 2./a + e/b - f)
+    _check(-(lazy(a)**2).exp() + (b*c).log(), -(a**2).exp() + (b*c).log())
+    _check(lazy(a)**f + 2.**lazy(b) + lazy(c)**1.5, a**f + 2.**b + c**1.5)
+    _check(lazy(f)*3 + f, f*3 + f)
+
+    # results can be stored in existing arrays
+    out = Uncertainty(np.empty(shape), np.empty(shape))
+    z = (lazy(a)*e - c).evaluate(out=out)
+    assert z is out and np.allclose(out.x, (a*e - c).x, rtol=1e-14)
+    # float32 data stays float32
+    z = (lazy(Uncertainty(a.x.astype('f'), a.variance.astype('f')))*2.).evaluate()
+    assert z.dtype == np.float32
 
 if __name__ == "__main__":
     test()
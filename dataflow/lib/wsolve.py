@@ -48,7 +48,8 @@ information about the variance in the data, and the weight vector
 serves only to provide relative weighting between the points.
 """
 
-__all__ = ['wsolve', 'wpolyfit', 'LinearModel', 'PolynomialModel', 'smooth']
+__all__ = ['wsolve', 'wpolyfit', 'wpolyfit_batch', 'LinearModel',
+           'PolynomialModel', 'PolynomialModelBatch', 'smooth']
 
 try:
     #from typing import Optional, Union, Sequence
@@ -278,6 +279,43 @@ def wsolve(A, y, dy=1.0, rcond=1e-12):
     return LinearModel(x=x, DoF=DoF, SVinv=SVinv, rnorm=rnorm)
 
 
+def _wsolve_batch(A, y, dy, mask=None):
+    # type: (np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]) -> (np.ndarray, np.ndarray, np.ndarray)
+    r"""
+    Solve the stack of weighted linear systems $A_k x_k = y_k \pm \delta y_k$.
+
+    *A* is k x n x m, and *y*, *dy* are k x n.  If *mask* (k x n) is given,
+    then only the points where mask is True are used in each system.
+
+    Returns the solutions *x* (k x m), *SVinv* (k x m x m) and the residual
+    norms *rnorm* (k) as computed by :func:`wsolve` for each system, using
+    a single batched singular value decomposition.
+    """
+    A, y, dy = np.asarray(A), np.asarray(y), np.asarray(dy)
+    A, y = A/dy[..., None], y/dy
+    if mask is not None:
+        # Zero rows do not change the SVD of the remaining rows.
+        A, y = np.where(mask[..., None], A, 0.), np.where(mask, y, 0.)
+    u, s, vh = np.linalg.svd(A, full_matrices=False)
+    SVinv = np.swapaxes(vh.conj(), -1, -2) / s[..., None, :]
+    Uy = np.einsum('kji,kj->ki', u.conj(), y)
+    x = np.einsum('kij,kj->ki', SVinv, Uy)
+    rnorm = np.linalg.norm(y - np.einsum('kij,kj->ki', A, x), axis=-1)
+    return x, SVinv, rnorm
+
+def _interval_batch(X, x, SVinv, rnorm, DoF, alpha, pred):
+    """
+    Batched version of :meth:`LinearModel._interval`, evaluating the rows
+    *X[..., :]* with solutions *x[..., :]*, *SVinv[..., :, :]*, *rnorm[...]*
+    and *DoF[...]*, with the leading dimensions broadcast together.
+    """
+    from scipy.stats import t  # lazy import in case scipy not present
+    y = np.sum(X*x, axis=-1)
+    s = t.ppf(1-alpha/2, DoF) * rnorm/np.sqrt(DoF)
+    T = np.einsum('...j,...jk->...k', X, SVinv)
+    dy = s * np.sqrt(pred + np.sum(T**2, axis=-1))
+    return y, dy
+
 def _poly_matrix(x, degree, origin=False):
     # type: (Sequence[float], int, bool) -> np.ndarray
     """
@@ -404,6 +442,171 @@ def wpolyfit(x, y, dy=1.0, degree=None, origin=False):
     return PolynomialModel(s, origin=origin, data=(x, y, dy))
 
 
+class PolynomialModelBatch(object):
+    r"""
+    Model evaluator for a set of best fit polynomials $p_k(x) = y_k +/- \delta y_k$,
+    as returned by :func:`wpolyfit_batch`.
+
+    Use *p(x)* to evaluate each polynomial $p_k$ at all points in the
+    vector *x*, returning an array with one row for each polynomial, or
+    give *x* as an array with one row of points for each polynomial.
+    Use *p[k]* for the :class:`PolynomialModel` of an individual fit.
+    """
+    def __init__(self, x, SVinv, rnorm, DoF, origin=False):
+        #: True if polynomials go through the origin
+        self.origin = origin
+        #: polynomial coefficients, one row per fit
+        self.coeff = x
+        if origin:
+            self.coeff = np.hstack((x, np.zeros((x.shape[0], 1))))
+        #: polynomial degree
+        self.degree = self.coeff.shape[1] - 1
+        #: number of degrees of freedom in each solution
+        self.DoF = DoF
+        #: 2-norm of the residuals $||y-Ax||_2$ for each fit
+        self.rnorm = rnorm
+        self._x = x
+        self._SVinv = SVinv
+
+    def __len__(self):
+        return self.coeff.shape[0]
+
+    def __getitem__(self, k):
+        s = LinearModel(x=self._x[k][:, None], DoF=self.DoF[k],
+                        SVinv=self._SVinv[k], rnorm=self.rnorm[k])
+        return PolynomialModel(s, origin=self.origin)
+
+    @property
+    def _scale(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.DoF > 0, self.rnorm**2/self.DoF, 1.)
+
+    @property
+    def cov(self):
+        """
+        covariance matrix for each fit
+
+        Note that the ones column will be absent if *origin* is True.
+        """
+        return self._scale[:, None, None] * np.einsum('kij,klj->kil', self._SVinv, self._SVinv)
+
+    @property
+    def var(self):
+        """solution variance for each fit"""
+        var = self._scale[:, None] * np.sum(self._SVinv**2, axis=2)
+        return np.hstack((var, np.zeros((len(self), 1)))) if self.origin else var
+
+    @property
+    def std(self):
+        """solution standard deviation for each fit"""
+        return np.sqrt(self.var)
+
+    @property
+    def p(self):
+        """p-value probability of rejection for each fit"""
+        from scipy.stats import chi2  # lazy import in case scipy not present
+        return chi2.sf(self.rnorm ** 2, self.DoF)
+
+    def _matrix(self, x, origin):
+        x = np.asarray(x, 'd')
+        A = _poly_matrix(x.ravel(), self.degree, origin)
+        return A.reshape(x.shape + A.shape[-1:])
+
+    def __call__(self, x):
+        """
+        Evaluate the polynomials at x.
+        """
+        A = self._matrix(x, False)
+        if A.ndim == 2:
+            return np.dot(self.coeff, A.T)
+        return np.einsum('kj,knj->kn', self.coeff, A)
+
+    def _interval(self, x, alpha, pred):
+        A = self._matrix(x, self.origin)
+        if A.ndim == 2:
+            A = A[None, :, :]
+        # underdetermined fits are NaN
+        with np.errstate(invalid='ignore'):
+            return _interval_batch(
+                A, self._x[:, None, :], self._SVinv[:, None, :, :],
+                self.rnorm[:, None], self.DoF[:, None], alpha, pred)
+
+    def ci(self, x, sigma=1):
+        """
+        Evaluate the polynomials and the confidence intervals at x.
+
+        sigma=1 corresponds to a 1-sigma confidence interval
+        """
+        from scipy.special import erfc  # lazy import in case scipy not present
+        return self._interval(x, erfc(sigma / np.sqrt(2)), 0)
+
+    def pi(self, x, p=0.05):
+        """
+        Evaluate the polynomials and the prediction intervals at x.
+
+        p = 1-alpha = 0.05 corresponds to 95% prediction interval
+        """
+        return self._interval(x, p, 1)
+
+    def rand(self, size=None):
+        """
+        Draw random samples from each solution population, returning an
+        array of shape *(fits, size, degree+1)*, or *(fits, degree+1)*
+        if size is None.
+        """
+        # With cov = C V inv(S) inv(S) V', x + sqrt(C) V inv(S) z for
+        # z ~ N(0, I) is distributed as N(x, cov).
+        n = 1 if size is None else int(np.prod(size))
+        m = self._x.shape[1]
+        z = np.random.standard_normal((len(self), n, m))
+        with np.errstate(invalid='ignore'):
+            values = (self._x[:, None, :]
+                      + np.sqrt(self._scale)[:, None, None]
+                      * np.einsum('kij,knj->kni', self._SVinv, z))
+        if self.origin:
+            values = np.concatenate((values, np.zeros(values.shape[:-1] + (1,))), -1)
+        if size is None:
+            return values[:, 0, :]
+        return values.reshape((len(self),) + tuple(np.atleast_1d(size)) + (values.shape[-1],))
+
+
+def wpolyfit_batch(x, Y, dY=1.0, degree=None, origin=False, mask=None):
+    # type: (np.ndarray, np.ndarray, Union[np.ndarray, float], Optional[int], bool, Optional[np.ndarray]) -> PolynomialModelBatch
+    r"""
+    Fit polynomials of degree $n$ to each row of *Y*, minimizing
+    $\sum(p_k(x_{ki}) - Y_{ki})^2/\delta Y_{ki}^2$ for each row *k*.
+
+    *x* is a vector of points shared by all rows or an array the same
+    shape as *Y*.  *dY* is a scalar or an array the same shape as *Y*.
+
+    *mask* is an optional boolean array the same shape as *Y* selecting
+    the points to use in each fit, so fits may use different numbers of
+    points.  Fits with too few points return NaN.
+
+    if origin is True, the fits should go through the origin.
+
+    Returns :class:`PolynomialModelBatch`.
+    """
+    assert degree is not None, "Missing degree argument to wpolyfit_batch"
+
+    Y = np.asarray(Y, 'd')
+    x = np.broadcast_to(np.asarray(x, 'd'), Y.shape)
+    dY = np.broadcast_to(np.asarray(dY, 'd'), Y.shape)
+    A = _poly_matrix(x.ravel(), degree, origin).reshape(Y.shape + (-1,))
+    if mask is None:
+        npoints = np.full(Y.shape[0], Y.shape[1])
+    else:
+        mask = np.asarray(mask, bool)
+        npoints = np.sum(mask, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        coeff, SVinv, rnorm = _wsolve_batch(A, Y, dY, mask=mask)
+    # Mark underdetermined fits
+    bad = npoints < A.shape[-1]
+    coeff[bad], SVinv[bad], rnorm[bad] = np.nan, np.nan, np.nan
+    return PolynomialModelBatch(
+        coeff, SVinv, rnorm, npoints - A.shape[-1], origin=origin)
+
+
 def wpolyplot(poly, with_pi=False, with_ci=True):
     # type: (PolynomialModel, bool, bool) -> None
     import pylab
@@ -444,8 +647,8 @@ def smooth(x, xp, yp, dyp=None, degree=2, span=5):
     all data points within *[x-dx, x+dx]* as the input to the polynomial.
     This capability is not yet implemented.
     """
-    if dyp is None:
-        dyp = np.ones(len(yp))
+    x, xp, yp = np.asarray(x, 'd'), np.asarray(xp, 'd'), np.asarray(yp, 'd')
+    dyp = np.ones(len(yp)) if dyp is None else np.asarray(dyp, 'd')
 
     if len(xp) <= span:
         n = len(xp)
@@ -455,7 +658,6 @@ def smooth(x, xp, yp, dyp=None, degree=2, span=5):
         y, dy = poly.ci(x)
 
     else:
-        y, dy = np.empty(x.shape), np.empty(x.shape)
         if span%2 == 0:
             # Even span is an odd number of intervals, so set boundaries
             # at the x points.
@@ -465,20 +667,20 @@ def smooth(x, xp, yp, dyp=None, degree=2, span=5):
             # at the midpoints between x.
             index = np.searchsorted(0.5*(xp[:-span]+xp[span:]), x)
 
-        # Save a little when densely interpolating by caching poly
-        # Since indices returned by searchsorted are always non-negative,
-        # initializing last to -1 guarantees that the first time through the
-        # loop last != start, and a new polynomial will be fit.
-        last = -1
-        for i, start in enumerate(index):
-            if last != start:
-                # Note that the centers are offset by -span//2 because the
-                # search started that far into the xp array.
-                s = slice(start, start+span)
-                poly = wpolyfit(xp[s], yp[s], dyp[s], degree=degree)
-            #if i%10 == 0:
-            #    from ..wsolve import wpolyplot;wpolyplot(poly)
-            y[i], dy[i] = [v[0] for v in poly.ci([y[i]])]
+        # Fit each distinct window once, solving all windows together.
+        # Note that the centers are offset by -span//2 because the
+        # search started that far into the xp array.
+        starts, window = np.unique(index, return_inverse=True)
+        s = starts[:, None] + np.arange(span)
+        A = _poly_matrix(xp[s].ravel(), degree).reshape(len(starts), span, degree+1)
+        coeff, SVinv, rnorm = _wsolve_batch(A, yp[s], dyp[s])
+
+        # 1-sigma confidence interval for each x from its window
+        from scipy.special import erfc  # lazy import in case scipy not present
+        y, dy = _interval_batch(
+            _poly_matrix(x.ravel(), degree), coeff[window], SVinv[window],
+            rnorm[window], span - (degree+1), erfc(1/np.sqrt(2)), 0)
+        y, dy = y.reshape(x.shape), dy.reshape(x.shape)
 
     return y, dy
 
@@ -539,6 +741,57 @@ def test():
     assert pierr < 1e-14, "||pi-Tpi||=%g" % pierr
     assert py == poly(px), "direct call to poly function fails"
 
+def test_smooth():
+    """
+    Check that the batched smoother matches fitting each window separately.
+    """
+    rng = np.random.RandomState(3)
+    xp = np.sort(rng.uniform(0, 10, 50))
+    yp = np.sin(xp) + rng.normal(0, 0.1, xp.shape)
+    dyp = rng.uniform(0.05, 0.2, xp.shape)
+    x = np.linspace(-1, 11, 37)
+    for degree, span in ((2, 5), (1, 4)):
+        y, dy = smooth(x, xp, yp, dyp, degree=degree, span=span)
+        if span%2 == 0:
+            index = np.searchsorted(xp[span//2:-span//2], x)
+        else:
+            index = np.searchsorted(0.5*(xp[:-span]+xp[span:]), x)
+        for k, start in enumerate(index):
+            s = slice(start, start+span)
+            poly = wpolyfit(xp[s], yp[s], dyp[s], degree=degree)
+            py, pdy = poly.ci([x[k]])
+            assert abs(y[k] - py[0]) < 1e-12*abs(py[0]) + 1e-14
+            assert abs(dy[k] - pdy[0]) < 1e-12*pdy[0]
+
+def test_wpolyfit_batch():
+    """
+    Check that batched fits match individual fits.
+    """
+    rng = np.random.RandomState(5)
+    x = np.arange(12.)
+    Y = rng.normal(2, 1, (4, 12)) + 0.5*x
+    dY = rng.uniform(0.5, 1.5, Y.shape)
+    mask = rng.rand(4, 12) > 0.25
+    mask[3] = False
+    mask[3, :1] = True
+    px = np.array([0.5, 3., 11.])
+    for origin in (False, True):
+        fits = wpolyfit_batch(x, Y, dY, degree=2, mask=mask, origin=origin)
+        y, dy = fits.ci(px)
+        _, pdy = fits.pi(px)
+        for k in range(3):
+            poly = wpolyfit(x[mask[k]], Y[k, mask[k]], dY[k, mask[k]], degree=2, origin=origin)
+            assert np.allclose(fits.coeff[k], poly.coeff, rtol=1e-12)
+            assert np.allclose(fits.std[k], poly.std, rtol=1e-12)
+            assert np.allclose(fits(px)[k], poly(px), rtol=1e-12)
+            assert np.allclose(y[k], poly.ci(px)[0], rtol=1e-12)
+            assert np.allclose(dy[k], poly.ci(px)[1], rtol=1e-12)
+            assert np.allclose(pdy[k], poly.pi(px)[1], rtol=1e-12)
+        # too few points for the last fit
+        assert np.isnan(y[3]).all()
+        assert fits.rand(5).shape == (4, 5, 3)
+
+
 if __name__ == "__main__":
 #    test()
 #    demo()
@@ -0,0 +1,80 @@
+"""
+Floating point precision for detector data.
+
+Detector values and variances are stored in double precision by default.
+Single precision is ample for the counts of large area detectors such as
+CANDOR and VSANS, and halves the memory and cache size of the 3-D arrays.
+Sums over single precision arrays in :mod:`dataflow.lib.err1d` are still
+accumulated in double precision.
+
+The policy maps loader names to "single" or "double".  It is set with
+:func:`use_precision` during program configuration, usually from the
+"precision" entry in the server configuration::
+
+    "precision": {"candor": "single", "vsans": "single"}
+
+Loaders call :func:`detector_array` to convert the values they read.
+Since the policy changes the results of a calculation, it is included
+in the node fingerprints by :func:`fingerprint`.
+"""
+import numpy as np
+
+#: Precision names available to the policy
+DTYPES = {
+    "single": np.dtype(np.float32),
+    "double": np.dtype(np.float64),
+}
+
+_POLICY = {}
+
+def use_precision(**policy):
+    """
+    Set the precision used by each loader, as *loader="single"|"double"*.
+    Loaders which are not listed use double precision.
+    """
+    for name, precision in policy.items():
+        if precision not in DTYPES:
+            raise ValueError("precision for %r should be one of %s"
+                             % (name, "|".join(sorted(DTYPES))))
+    _POLICY.clear()
+    _POLICY.update(policy)
+
+def detector_dtype(name):
+    """
+    Return the floating point type for detector values from loader *name*.
+    """
+    return DTYPES[_POLICY.get(name, "double")]
+
+def detector_array(name, value):
+    """
+    Convert the detector *value* from loader *name* to a floating point
+    array with the configured precision.
+    """
+    return np.asarray(value, dtype=detector_dtype(name))
+
+def fingerprint():
+    """
+    Return a string representing the precision policy for the calculation
+    fingerprints, or the empty string for the default policy.
+    """
+    return ",".join("%s=%s" % (name, _POLICY[name]) for name in sorted(_POLICY)
+                    if _POLICY[name] != "double")
+
+
+def test_precision():
+    try:
+        use_precision(candor="single", vsans="double")
+        assert detector_dtype("candor") == np.float32
+        assert detector_dtype("vsans") == np.float64
+        assert detector_dtype("sans") == np.float64
+        assert detector_array("candor", [1, 2]).dtype == np.float32
+        assert fingerprint() == "candor=single"
+        try:
+            use_precision(candor="half")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("expected ValueError for unknown precision")
+    finally:
+        use_precision()
+    assert fingerprint() == ""
@@ -931,6 +931,9 @@ def add_to_grid(dataset, grid, counts_multiplier=1.0):
             data_slice[dim] = slice(None, None, -1)
         data_edges.append(edges)
 
+    grid_slice, data_slice = tuple(grid_slice), tuple(data_slice)
+    # rebin each column into the same buffer rather than allocating per column
+    new_array = empty((len(bin_edges[0]) - 1, len(bin_edges[1]) - 1))
     new_info = dataset.infoCopy()
     for i, col in enumerate(new_info[2]['cols']):
         #if col['name'] in cols_to_add:
@@ -940,8 +943,11 @@ def add_to_grid(dataset, grid, counts_multiplier=1.0):
             multiplier = 1.0  # add monitor counts and time always
         array_to_rebin = dataset[:, :, col['name']].view(ndarray)
         #print(data_edges, bin_edges)
-        new_array = reb.rebin2d(data_edges[0], data_edges[1], array_to_rebin[data_slice], bin_edges[0], bin_edges[1])
-        grid[:, :, col['name']] += (multiplier * new_array[grid_slice])
+        reb.rebin2d(data_edges[0], data_edges[1], array_to_rebin[data_slice],
+                    bin_edges[0], bin_edges[1], out=new_array)
+        if multiplier != 1.0:
+            new_array *= multiplier
+        grid[:, :, col['name']] += new_array[grid_slice]
 
     return grid
 
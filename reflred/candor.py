@@ -4,12 +4,14 @@ from warnings import warn
 import numpy as np
 
 from dataflow.lib.exporters import exports_json
+from dataflow.precision import detector_dtype
 
-from .refldata import ReflData, Intent
+from .refldata import ReflData, Intent, plot_limits
 from .nexusref import load_nexus_entries, nexus_common, get_pol
 from .nexusref import data_as, str_data
 from .nexusref import TRAJECTORY_INTENTS
 from .resolution import FWHM2sigma
+from .util import poisson_average_groups
 
 def load_metadata(filename, file_obj=None):
     """
@@ -76,7 +78,7 @@ class Candor(ReflData):
 
         # Counts
         # Load counts early so we can tell whether channels are axis 1 or 2
-        counts = data_as(das, 'areaDetector/counts', '', dtype='d')
+        counts = data_as(das, 'areaDetector/counts', '', dtype=detector_dtype('candor'))
         if counts is None or counts.size == 0:
             raise ValueError("Candor file '{self.path}' has no area detector data.".format(self=self))
 
@@ -323,22 +325,27 @@ class Candor(ReflData):
             y, ylabel = np.arange(1, len(self.v)+1), "point"
         return (x, xlabel), (y, ylabel)
 
+    def get_image(self):
+        """
+        Return the image *z[y, x]* with the detector banks side by side
+        and its extent *(xmin, xmax, ymin, ymax)* for level of detail plotting.
+        """
+        data = self.v
+        ny, nx, nbanks = data.shape  # nangles, nwavelengths, nbanks
+        (x, _), (y, _) = self.get_axes()
+        x, nx = np.hstack((x, x + (x.max()-x.min()))), 2*nx
+        image = data.transpose(0, 2, 1).reshape(ny, nx*nbanks//2)
+        return image, plot_limits(x, nx) + plot_limits(y, ny)
+
     def get_plottable(self):
         name = getattr(self, "name", "default_name")
         entry = getattr(self, "entry", "default_entry")
-        def limits(vec, n):
-            low, high = vec.min(), vec.max()
-            delta = (high - low) / max(n-1, 1)
-            # TODO: move range cleanup to plotter
-            if delta == 0.:
-                delta = vec[0]/10.
-            return low - delta/2, high+delta/2
         data = self.v
         ny, nx, _ = data.shape  # nangles, nwavelengths, nbanks
         (x, xlabel), (y, ylabel) = self.get_axes()
         x, nx = np.hstack((x, x + (x.max()-x.min()))), 2*nx
-        xmin, xmax = limits(x, nx)
-        ymin, ymax = limits(y, ny)
+        xmin, xmax = plot_limits(x, nx)
+        ymin, ymax = plot_limits(y, ny)
         # TODO: self.detector.mask
         zmin, zmax = data.min(), data.max()
         # TODO: move range cleanup to plotter
@@ -357,7 +364,7 @@ class Candor(ReflData):
         # One z per detector bank
         #z = [data[..., k].ravel('F').tolist() for k in range(data.shape[-1])]
         # One z with banks back-to-back
-        z = [data.ravel('F').tolist()]
+        z = [data.ravel('F')]
         #print("data", data.shape, dims, len(z))
         plottable = {
             'type': '2d_multi',
@@ -469,37 +476,20 @@ def _rebin_bank(data, bank, q_edges):
     norm = data.normbase
     y, dy, q, dq = (val[:, :, bank].flatten()
                     for val in (data.v, data.dv, data.Qz, data.dQ))
-    nbins = len(q_edges) - 1
+    # searchsorted gives bins 0 to len(q_edges); the outer two bins on each
+    # side are beyond the extended edges or in the catch-all bins.
+    nbins = len(q_edges) + 1
     bin_index = np.searchsorted(q_edges, q)
 
     # Some bins may not have any points contributing, such as those before
     # and after, or those in the middle if the q-step is too fine.
     empty_q = (np.bincount(bin_index, minlength=nbins) == 0)
-    # The following is cribbed from util.poisson_average, replacing
-    # np.sum with np.bincount.
-    # TODO: update poisson average so it handles grouping
-    if norm == "none":
-        bar_y = np.bincount(bin_index, weights=y, minlength=nbins)
-        bar_dy = np.bincount(bin_index, weights=dy**2, minlength=nbins)
-    else:
+    if norm != "none":
         # Counts must be positive for poisson averaging...
         y = y.copy()
         y[y < 0] = 0.
-        dy = dy + (dy == 0) # protect against zero uncertainty
-        monitors = y*(y+1)/dy**2 if norm == "monitor" else y/dy**2 # if "time"
-        monitors[y == 0] = 1./dy[y == 0] # protect against zero counts
-        counts = y*monitors
-        combined_monitors = np.bincount(bin_index, weights=monitors, minlength=nbins)
-        combined_counts = np.bincount(bin_index, weights=counts, minlength=nbins)
-        combined_monitors += empty_q  # protect against division by zero
-        bar_y = combined_counts/combined_monitors
-        if norm == "time":
-            bar_dy = bar_y * np.sqrt(1./combined_monitors)
-        else:
-            bar_dy = 1./combined_monitors * np.sqrt(1. + 1./combined_monitors)
-            idx = (bar_y != 0)
-            bar_dy[idx] = bar_y[idx] * np.sqrt(1./combined_counts[idx]
-                                            + 1./combined_monitors[idx])
+    bar_y, bar_dy = poisson_average_groups(
+        y, dy, bin_index, norm=norm, ngroups=nbins)
 
     # Find Q center and resolution, weighting by intensity
     # TODO: use intensity weighting when finding q centers?
@@ -521,7 +511,7 @@ def _rebin_bank(data, bank, q_edges):
     # Need to drop catch-all bins before and after q edges.
     # Also need to drop q bins which don't contain any values.
     keep = ~empty_q
-    keep[0] = keep[-1] = False
+    keep[:2] = keep[-2:] = False
     return bar_q[keep], bar_dq[keep], bar_y[keep], bar_dy[keep]
 
 def edges(c, extended=False):
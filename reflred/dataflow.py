@@ -1,4 +1,5 @@
 from dataflow import core as df
+from dataflow import catalog
 from dataflow.automod import make_modules, make_template, auto_module, get_modules
 from dataflow.calc import process_template
 from dataflow.data import Plottable
@@ -15,6 +16,10 @@ from .footprint import FootprintData
 from .backgroundfield import BackgroundFieldData
 
 INSTRUMENT = "ncnr.refl"
+NEXUS_SUFFIXES = [
+    ".nxz.cgd", ".nxz.ngd", ".nxz.ng7", ".nxz.pbr",
+    ".nxs.cgd", ".nxs.ngd", ".nxs.ng7", ".nxs.pbr",
+]
 
 class FluxData(object):
     def __init__(self, fluxes, total_flux):
@@ -138,6 +143,11 @@ def define_instrument():
 
     # Register instrument
     df.register_instrument(refl1d)
+
+    # Summarize NeXus entries when indexing data directories
+    from . import nexusref
+    for suffix in NEXUS_SUFFIXES:
+        catalog.register_extractor(suffix, nexusref.catalog_entries)
     return refl1d
 
 
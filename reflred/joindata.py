@@ -10,7 +10,7 @@ import numpy as np
 
 from dataflow.lib import unit
 from .refldata import Intent, ReflData, Environment
-from .util import poisson_average, extend
+from .util import poisson_average_groups, group_sum, extend
 from .resolution import divergence, dTdL2dQ, TiTdL2Qxz
 
 try:
@@ -489,11 +489,78 @@ def _group_by_dim(index_sets, data, width):
     group triggered every time a point with tight resolution is encountered,
     splitting up a series of points with loose resolution that would otherwise
     be joined.
-    """
-    refinement = []
-    for subgroup in index_sets:
-        refinement.extend(_split_subgroup(subgroup, data, width))
-    return refinement
+
+    Working through the points of a subgroup in order of data, a point
+    starts a new group if it is beyond the width of any point in the
+    current group, or if the first point of the group is not within its
+    width.  The end of the group starting at each point is found for all
+    points at once: the first point beyond the width of a later point is
+    found by bisection, and a reverse cumulative minimum gives the first
+    point beyond the width of any point in the group.  Group starts are
+    then the chain of group ends from the first point in each subgroup,
+    which is followed by doubling the step size, so all subgroups are
+    split using a handful of array operations.
+    """
+    index_sets = [subgroup for subgroup in index_sets if len(subgroup)]
+    if not index_sets:
+        return []
+    sizes = [len(subgroup) for subgroup in index_sets]
+    indices = np.hstack([np.asarray(subgroup, dtype=int) for subgroup in index_sets])
+    subgroup = np.repeat(np.arange(len(index_sets)), sizes)
+    data, width = data[indices], width[indices]
+    n = len(indices)
+
+    # Points with missing data sort to the end of the subgroup and join the
+    # last group.  Missing widths never split a group, and a group starting
+    # at a point with missing width is not limited by the widths of the
+    # points which follow (the group end stays NaN in the point by point
+    # algorithm).
+    missing = np.isnan(data)
+    low, high = data - width, data + width
+    open_ended = np.isnan(high)
+    low[np.isnan(low)] = -np.inf
+    high[open_ended] = np.inf
+    data = np.where(missing, np.inf, data)
+
+    # Rank the values so that they are ordered by subgroup then by value.
+    values = np.hstack((data, low, high))
+    labels = np.hstack((subgroup, subgroup, subgroup))
+    order = np.lexsort((values, labels))
+    # Compare neighbours directly since differences of infinities are NaN.
+    labels, values = labels[order], values[order]
+    distinct = np.ones(3*n, dtype=bool)
+    distinct[1:] = (labels[1:] != labels[:-1]) | (values[1:] != values[:-1])
+    rank = np.empty(3*n, dtype=int)
+    rank[order] = np.cumsum(distinct)
+    order = np.argsort(rank[:n], kind='stable')
+    data, low, high = rank[order], rank[n:2*n][order], rank[2*n:][order]
+
+    # Find where the group starting at each point must end.  Values in later
+    # subgroups rank above all values in earlier subgroups, so groups never
+    # extend beyond the end of the subgroup.
+    beyond_width = np.searchsorted(data, high, side='right')
+    beyond_group = np.minimum.accumulate(beyond_width[::-1])[::-1]
+    beyond_start = np.searchsorted(np.maximum.accumulate(low), data, side='right')
+    step = np.where(open_ended[order], beyond_start,
+                    np.minimum(beyond_group, beyond_start))
+    step = np.hstack((step, n))
+
+    # Follow the group ends from the first point, doubling the step size
+    # each time so that the chain is traversed in log n passes.
+    start = np.zeros(n+1, dtype=bool)
+    start[0] = True
+    while True:
+        start[step[start]] = True
+        if step[0] == n:
+            break
+        step = step[step]
+    start = start[:n]
+    first = np.ones(n, dtype=bool)
+    first[1:] = np.diff(subgroup) != 0
+    start = (start & ~missing[order]) | first
+
+    return [group.tolist()
+            for group in np.split(indices[order], np.flatnonzero(start)[1:])]
 
 
 def _split_subgroup(indices, data, width):
@@ -501,42 +568,10 @@ def _split_subgroup(indices, data, width):
     """
     Split an index group according to data, returning a list of subgroups.
     """
-
     # If there is only one point then there is nothing to split
     if len(indices) <= 1:
         return [indices]
-
-    # Grab the data/width subset according to indices
-    data = data[indices]
-    width = width[indices]
-    order = np.argsort(data)  # type: Sequence[int]
-
-    # Initialize the returned group list and the current group; set start
-    # and end points so that a new group is triggered on the first point
-    groups = []  # type: List[IndexSet]
-    current_group = []  # type: IndexSet
-    start_point = end_point = -np.inf
-    for k in order:
-        # Check if next point falls out of bounds, either because it is
-        # beyond the range of existing points (data[k] > end_point), or
-        # because the first point is outside of the range the next
-        # point (data[k]-width[k] > start_point).
-        if data[k] > end_point or data[k] - width[k] > start_point:
-            # next point is outside the range; close the current group and
-            # start a new one.  The first time through the loop the current
-            # group will be empty but still a new group will be triggered.
-            if current_group:
-                groups.append(current_group)
-            current_group = [indices[k]]
-            start_point = data[k]
-            end_point = data[k] + width[k]
-        else:
-            # next point is in the range; add it to the current group and
-            # limit the end point of the group to its range
-            current_group.append(indices[k])
-            end_point = min(end_point, data[k]+width[k])
-    groups.append(current_group)
-    return groups
+    return _group_by_dim([indices], data, width)
 
 
 def merge_points(index_sets, columns, normbase):
@@ -545,11 +580,25 @@ def merge_points(index_sets, columns, normbase):
     Join points together according to groups.
 
     Points are weighted according to normbase, which could be 'monitor'
-    or 'time'.
+    or 'time'.  Groups whose weights sum to zero use equal weights.
+
+    All groups are merged at once by labelling each point with its group
+    and summing within groups, so columns may be multidimensional, such
+    as detector frames.  Single point groups are copied unchanged.
 
     Note: we do not yet increase divergence when points with slightly
     different incident angles are mixed.
     """
+    # Label the points in each group.
+    ngroups = len(index_sets)
+    sizes = np.array([len(group) for group in index_sets], dtype=int)
+    points = (np.hstack([np.asarray(group, dtype=int) for group in index_sets])
+              if ngroups else np.zeros(0, dtype=int))
+    labels = np.repeat(np.arange(ngroups), sizes)
+    total = group_sum(labels, ngroups)
+    single = (sizes == 1)
+    single_point = points[(np.cumsum(sizes) - sizes)[single]]
+
     # Weight each point by monitor/time/counts
     if normbase == "none":
         # if weighting by counts then use the counts across the entire
@@ -557,39 +606,33 @@ def merge_points(index_sets, columns, normbase):
         # weighting but using the measured data, assuming the same conditions
         # give the same count rate.
         counts = columns['v']
-        ndim = counts[0].ndim
-        if ndim == 1:
-            weight = counts
-        else:
-            axis = tuple(range(1, ndim))
-            weight = [np.sum(v, axis=axis) for v in counts]
+        weight = np.sum(counts, axis=tuple(range(1, counts.ndim)))
     else:
         weight = columns[normbase]
-
-    # build a structure to hold the results
-    results = dict((k, []) for k in columns.keys())
-
-    #for k,v in columns.items(): print k, len(v), v
-    for group in index_sets:
-        if len(group) == 1:
-            index = group[0]
-            for key, value in columns.items():
-                results[key].append(value[index])
+    weight = weight[points]
+    total_weight = total(weight)
+    unweighted = (total_weight == 0)
+    if unweighted.any():
+        weight = np.where(unweighted[labels], 1., weight)
+        total_weight = total(weight)
+
+    # Poisson average the values in all groups at once
+    results = {}
+    results['v'], results['dv'] = poisson_average_groups(
+        columns['v'][points], columns['dv'][points], labels,
+        norm=normbase, ngroups=ngroups)
+    for key, value in columns.items():
+        if key in ('v', 'dv'):
+            continue
+        value = value[points]
+        if key in ('time', 'monitor'):
+            results[key] = total(value)
         else:
-            v, dv = poisson_average(
-                columns['v'][group], columns['dv'][group], norm=normbase)
-            results['v'].append(v)
-            results['dv'].append(dv)
-            results['time'].append(np.sum(columns['time'][group]))
-            results['monitor'].append(np.sum(columns['monitor'][group]))
             # TODO: dQ should increase when points are mixed (see MERGE below)
-            w = weight[group]
-            for key, value in columns.items():
-                if key not in ['v', 'dv', 'time', 'monitor']:
-                    results[key].append(np.average(value[group], weights=w, axis=0))
-
-    # Turn lists into arrays
-    results = dict((k, np.array(v)) for k, v in results.items())
+            results[key] = (total(value*extend(weight, value))
+                            / extend(total_weight, value))
+    for key, value in columns.items():
+        results[key][single] = value[single_point]
     return results
 
 # MERGE variance
@@ -619,6 +662,42 @@ def sort_columns(columns, keys):
     return dict((k, v[index]) for k, v in columns.items())
 
 
+def test_merge_points():
+    from .util import poisson_average
+    v = np.array([[1., 2.], [3., 4.], [5., 6.], [7., 8.]])
+    columns = dict(
+        v=v, dv=np.sqrt(v), Ti=np.array([1., 2., 3., 4.]),
+        monitor=np.array([1., 3., 2., 2.]), time=np.array([1., 1., 1., 1.]),
+    )
+    merged = merge_points([[2], [0, 1, 3]], columns, 'monitor')
+    assert (merged['monitor'] == [2, 6]).all() and (merged['time'] == [1, 3]).all()
+    # single points are copied, others are weighted by monitor
+    assert merged['Ti'][0] == 3 and abs(merged['Ti'][1] - (1 + 6 + 8)/6) < 1e-14
+    assert (merged['v'][0] == v[2]).all()
+    bar_v, bar_dv = poisson_average(v[[0, 1, 3]], np.sqrt(v[[0, 1, 3]]))
+    assert np.allclose(merged['v'][1], bar_v) and np.allclose(merged['dv'][1], bar_dv)
+
+
+def test_group_by_dim():
+    data = np.array([1., 1.05, 1.1, 2., 2.02, 5., np.nan, 0., 0.05, 3., 3.1, 3.2])
+    width = np.array([0.1, 0.1, 0.1, 0.01, 0.1, 0.1, 0.1, 0.1, 0.1, 0.5, 0.01, 0.5])
+    # missing values are valid input and should not raise invalid warnings
+    with np.errstate(invalid='raise'):
+        groups = _group_by_dim([[2, 1, 0, 3, 4, 5, 6], [], [11, 10, 9, 8, 7]], data, width)
+    # missing data joins the last group; a point with tight resolution
+    # isolates itself from its loose neighbours
+    assert groups == [[0, 1, 2], [3], [4], [5, 6], [7, 8], [9], [10], [11]]
+    assert _split_subgroup([4], data, width) == [[4]]
+    # a group starting at a point with missing width is only limited by
+    # the widths of later points reaching back to the start
+    data, width = np.array([0., 0.1, 0.3]), np.array([0.2, 0.2, 0.3])
+    assert _group_by_dim([[0, 1, 2]], data, width) == [[0, 1], [2]]
+    width[0] = np.nan
+    with np.errstate(invalid='raise'):
+        assert _group_by_dim([[0, 1, 2]], data, width) == [[0, 1, 2]]
+    assert _group_by_dim([], data, width) == []
+
+
 def demo():
     import sys
     import matplotlib.pyplot as plt
@@ -1,36 +1,30 @@
 from os.path import basename
-from io import BytesIO
 
-from dataflow.fetch import url_get
+from dataflow.fetch import cached_load
 
 
-def load_from_string(filename, data, entries=None, loader=None):
-    """
-    Load a nexus file from a string, e.g., as returned from url.read().
+def url_load(fileinfo, check_timestamps=True, loader=None):
     """
-    with BytesIO(data) as fd:
-        entries = loader(filename, fd, entries=entries)
-    return entries
+    Load the entries in the file described by *fileinfo*.
 
-def url_load(fileinfo, check_timestamps=True, loader=None):
+    Parsed entries are cached by :func:`dataflow.fetch.cached_load`, so
+    changing the corrections applied by a load module does not reparse
+    the file.
+    """
     path, entries = fileinfo['path'], fileinfo.get('entries', None)
     filename = basename(path)
-    content = url_get(fileinfo, mtime_check=check_timestamps)
-    if loader is not None:
-        return load_from_string(filename, content, entries=entries,
-                                loader=loader)
-    elif filename.endswith('.raw') or filename.endswith('.ras'):
-        from . import xrawref
-        return load_from_string(filename, content, entries=entries,
-                                loader=xrawref.load_entries)
-    elif filename.endswith('.nxs.cdr'):
-        from . import candor
-        return load_from_string(filename, content, entries=entries,
-                                loader=candor.load_entries)
-    else:
-        from . import nexusref
-        return load_from_string(filename, content, entries=entries,
-                                loader=nexusref.load_entries)
+    if loader is None:
+        if filename.endswith('.raw') or filename.endswith('.ras'):
+            from . import xrawref
+            loader = xrawref.load_entries
+        elif filename.endswith('.nxs.cdr'):
+            from . import candor
+            loader = candor.load_entries
+        else:
+            from . import nexusref
+            loader = nexusref.load_entries
+    return cached_load(fileinfo, loader, entries=entries,
+                       mtime_check=check_timestamps)
 
 def url_load_list(files=None, check_timestamps=True, loader=None):
     if files is None:
@@ -96,6 +96,42 @@ def load_entries(filename, file_obj=None, entries=None):
                               meta_only=False, entry_loader=NCNRNeXusRefl)
 
 
+def catalog_entries(filename, file_obj=None):
+    """
+    Summarize the entries in a NeXus file for the file catalog.
+
+    Only the handful of fields needed to identify each entry are read, so
+    this is much cheaper than :func:`load_metadata`.
+    """
+    handle = h5_open.h5_open_zip(filename, file_obj)
+    summaries = []
+    for name, entry in handle.items():
+        if _s(entry.attrs.get('NX_class', None)) != 'NXentry':
+            continue
+        das = entry['DAS_logs']
+        sample = str_data(entry, 'sample/name', default=None)
+        if sample is None:
+            sample = str_data(das, 'sample/name')
+        raw_intent = str_data(das, 'trajectoryData/_scanType')
+        scan = data_as(das, 'q/z', '')
+        if scan is None:
+            scan = data_as(das, 'trajectoryData/_q', '')
+        scan = np.asarray(scan, dtype='d') if scan is not None else np.empty(0)
+        summaries.append({
+            'entry': name,
+            'instrument': str_data(entry, 'instrument/name'),
+            'sample': sample,
+            'intent': TRAJECTORY_INTENTS.get(raw_intent, None),
+            'polarization': (get_pol(das, 'frontPolarization')
+                             + get_pol(das, 'backPolarization')),
+            'scan_min': float(np.min(scan)) if scan.size else None,
+            'scan_max': float(np.max(scan)) if scan.size else None,
+        })
+    if file_obj is None:
+        handle.close()
+    return summaries
+
+
 def load_nexus_entries(filename, file_obj=None, entries=None,
                        meta_only=False, entry_loader=None):
     """
@@ -229,8 +229,8 @@ def apply_integration(
 
     *mc_samples* are the number of Monte Carlo samples to use when estimating
     background value and uncertainty under the signal.  Use 0 for an estimate
-    directly from the uncertainty in the fitting parameters
-    (**mc_samples==0 is broken** as of this writing).  Set *seed* to a fixed
+    directly from the uncertainty in the fitting parameters, ignoring the
+    correlations between the parameters.  Set *seed* to a fixed
     value for reproducible results.
 
     *slices* is a list of coordinates at which to display cross sections of
@@ -278,8 +278,7 @@ def _build_1d(head, intensity):
 
 def integrate(data, spec, left, right, pixel_range,
               degree, mc_samples, slices):
-    from dataflow.lib import err1d
-    from dataflow.lib.wsolve import wpolyfit
+    from dataflow.lib.wsolve import wpolyfit_batch
 
     nframes, npixels = data.v.shape
 
@@ -351,72 +350,64 @@ def integrate(data, spec, left, right, pixel_range,
         series.append(label)
         lines.append(line)
 
-    # Cycle through detector frames gathering signal and background for each.
-    results = []
-    for k in range(nframes):
-        # Get data for frame.
-        y, dy = data.v[k], data.dv[k]
-        spec_idx = (pixel >= p2[k]) & (pixel <= p3[k])
-        full_idx = (pixel >= p1[k]) & (pixel <= p4[k])
-        back_idx = full_idx & ~spec_idx
-        spec_x, spec_y, spec_dy = pixel[spec_idx], y[spec_idx], dy[spec_idx]
-        back_x, back_y, back_dy = pixel[back_idx], y[back_idx], dy[back_idx]
-
-        if not len(spec_x) or not len(back_x):
-            results.append((np.nan, np.nan, np.nan, np.nan, np.zeros_like(y)))
+    # Signal and background regions for all frames.
+    y, dy = data.v, data.dv
+    spec_idx = (pixel >= p2[:, None]) & (pixel <= p3[:, None])
+    full_idx = (pixel >= p1[:, None]) & (pixel <= p4[:, None])
+    back_idx = full_idx & ~spec_idx
+    valid = spec_idx.any(axis=1) & back_idx.any(axis=1)
+
+    # Integrate frame data.
+    # TODO: Could do sub-pixel interpolation at the boundary?
+    Is, dIs = poisson_sum(np.where(spec_idx, y, 0.), np.where(spec_idx, dy, 0.),
+                          axis=1)
+
+    # Fit the background of every frame at once.
+    fits = wpolyfit_batch(pixel, y, dy, degree=degree, mask=back_idx)
+    back = fits(pixel)
+    # Uh, oh! Correlated errors on poly coefficients! How do we integrate?
+    if mc_samples > 0: # using monte-carlo sampling
+        # Generate a random set of polynomials from each fit
+        coeffs = fits.rand(size=mc_samples)
+        # Integrating p(x) over the signal pixels is the dot product of the
+        # coefficients with the summed powers of x over those pixels.
+        powers = np.dot(spec_idx, pixel[:, None]**np.arange(degree, -1, -1))
+        integral = np.einsum('ksj,kj->ks', coeffs, powers)
+        # Find mean and variance of the integrated values
+        Ib, dIb = np.mean(integral, axis=1), np.std(integral, axis=1)
+    else: # using simple sum ignoring correlation in uncertainties
+        _, back_dy = fits.ci(pixel)
+        Ib = np.sum(np.where(spec_idx, back, 0.), axis=1)
+        dIb = np.sqrt(np.sum(np.where(spec_idx, back_dy**2, 0.), axis=1))
+
+    # TODO: consider fitting gaussian to peak or finding FWHM of spec-back
+    #signal = spec_y - fit(spec_x)
+    #halfmax = signal.max() / 2
+    #top_half = spec_x[signal > halfmax]
+    #FWHM = top_half[-1] - top_half[0]
+    #sigma = FWHM/(2*sqrt(2*log(2)))
+
+    # add slices if the index is in the set of selected indices
+    for k in sorted(index):
+        if not valid[k]:
             continue
+        valstr = str(yaxis[k])
+        addline('data:'+valstr, pixel, y[k], dy[k])
+        addline('spec:'+valstr, pixel[spec_idx[k]], back[k, spec_idx[k]])
+        addline('back:'+valstr, pixel[back_idx[k]], back[k, back_idx[k]])
 
-        # Integrate frame data.
-        # TODO: Could do sub-pixel interpolation at the boundary?
-        Is, dIs = poisson_sum(spec_y, spec_dy)
-        fit = wpolyfit(back_x, back_y, back_dy, degree=degree)
-        # Uh, oh! Correlated errors on poly coefficients! How do we integrate?
-        if mc_samples > 0: # using monte-carlo sampling
-            # Generate a random set of polynomials from the fit
-            coeffs = fit.rand(size=mc_samples)
-            # Use Horner's method to evaluate all p_k over all x points
-            px = np.zeros((len(spec_x), mc_samples))
-            for c in coeffs.T:
-                px *= spec_x[:, None]
-                px += c[None, :]
-            # Integrate p(x) over x
-            integral = np.sum(px, axis=0)
-            #print("integral", px.shape, mc_samples, coeffs.shape, integral.shape)
-            # Find mean and variance of the integrated values
-            Ib, dIb = np.mean(integral), np.std(integral)
-        else: # using simple sum ignoring correlation in uncertainties
-            est_y = fit(spec_x)
-            est_dy = fit.ci(spec_x)
-            Ib, dIb = err1d.sum(est_y, est_dy)
-
-        # TODO: consider fitting gaussian to peak or finding FWHM of spec-back
-        #signal = spec_y - fit(spec_x)
-        #halfmax = signal.max() / 2
-        #top_half = spec_x[signal > halfmax]
-        #FWHM = top_half[-1] - top_half[0]
-        #sigma = FWHM/(2*sqrt(2*log(2)))
-
-        # add slices if the index is in the set of selected indices
-        if k in index:
-            valstr = str(yaxis[k])
-            addline('data:'+valstr, pixel, y, dy)
-            addline('spec:'+valstr, spec_x, fit(spec_x))
-            addline('back:'+valstr, back_x, fit(back_x))
-
-        # Show background residuals
-        residual = y - fit(pixel)
-        residual[~full_idx] = np.nan #0.
-        #residual[spec_idx] += signal_jump
-
-        results.append((Is, dIs, Ib, dIb, residual))
-
-    Is, dIs, Ib, dIb, residual = (np.asarray(v) for v in zip(*results))
+    # Show background residuals
+    residual = np.where(full_idx, y - back, np.nan)
+
+    # Frames without signal or background cannot be integrated.
+    Is, dIs, Ib, dIb = (np.where(valid, v, np.nan) for v in (Is, dIs, Ib, dIb))
+    residual[~valid] = 0.
 
     return (Is, dIs), (Ib, dIb), residual, plottable
 
-def poisson_sum(v, dv):
+def poisson_sum(v, dv, axis=None):
     """
-    Sum data with poisson uncertainties.
+    Sum data with poisson uncertainties, optionally along *axis*.
 
     This happens to be the same as the sum of gaussian distributed
     uncertainties, with V = sum(v) and dV = sqrt(sum(dv^2)), preserving
@@ -457,7 +448,43 @@ def poisson_sum(v, dv):
     the data since the weighted residual will be infinite when you have
     zero uncertainty on a measurement.
     """
-    return np.sum(v), np.sqrt(np.sum(dv**2))
+    return np.sum(v, axis=axis), np.sqrt(np.sum(dv**2, axis=axis))
+
+
+def test_integrate():
+    from types import SimpleNamespace as Namespace
+
+    # Three frames on a linear background with a peak in the middle; the
+    # last frame has a negative specular width so it cannot be integrated.
+    npixels, center = 40, 20
+    pixel = np.arange(1, npixels+1) - center
+    background = 10. + 0.5*pixel
+    y = np.tile(background + 100.*(abs(pixel) <= 2), (3, 1))
+    y[1] *= 2
+    data = Namespace(
+        v=y, dv=np.sqrt(y), name="psd", entry="entry",
+        slit1=Namespace(x=np.array([4., 4., -1.])),
+        slit4=Namespace(x=np.array([1., 1., 1.])),
+        detector=Namespace(center=[center]),
+        get_axes=lambda: ((pixel, None), (np.arange(3.), None)),
+    )
+    spec_idx = abs(pixel) <= 4
+    for mc_samples in (0, 50):
+        (Is, dIs), (Ib, dIb), residual, plot = integrate(
+            data, spec=(1, 0), left=(1, 2), right=(1, 2), pixel_range=(1, npixels),
+            degree=1, mc_samples=mc_samples, slices=[1.5])
+        assert np.allclose(Is[:2], y[:2, spec_idx].sum(axis=1))
+        assert np.allclose(dIs[:2], np.sqrt(y[:2, spec_idx].sum(axis=1)))
+        # the background is linear so the fit is exact
+        assert np.allclose(Ib[:2], np.array([1, 2])*background[spec_idx].sum())
+        assert np.allclose(dIb[:2], 0., atol=1e-6)
+        assert np.isnan([Is[2], dIs[2], Ib[2], dIb[2]]).all()
+        full_idx = abs(pixel) <= 10
+        assert np.allclose(residual[:2, full_idx], y[:2, full_idx] - np.array([[1], [2]])*background[full_idx])
+        assert np.isnan(residual[:2, ~full_idx]).all() and (residual[2] == 0).all()
+        # slice at y=1.5 shows frame 1: data, spec and back lines
+        assert plot["options"]["series"] == ["data:1.0", "spec:1.0", "back:1.0"]
+        assert len(plot["data"][1]) == spec_idx.sum()
 
 
 if __name__ == "__main__":
@@ -171,6 +171,7 @@ import numpy as np
 from uncertainties.unumpy import uarray as U, matrix as UM, nominal_values, std_devs
 from uncertainties import ufloat
 
+from dataflow.lib import err1d
 from dataflow.lib.errutil import interp
 
 from . import util
@@ -243,14 +244,22 @@ def _apply_correction(data, dtheta, Hinv, use_pm, use_mp):
     # Interpolate data so that it aligns with ++.  If smoothing is
     # desired, apply the interpolated smoothing before calling polcor,
     # in which case the interpolation does nothing.
+    # Cross sections measured at the same Qz points share the interpolation
+    # plans to and from the ++ grid, and are interpolated as a stack.
     assert parts[0] == '++'
-    x = data['++'].Qz
-    y = [U(data['++'].v, data['++'].dv)]
-    for p in parts[1:]:
-        px = data[p].Qz
-        py = U(data[p].v, data[p].dv)
-        y.append(interp(x, px, py, left=np.NaN, right=np.NaN))
-    Y = np.vstack(y)
+    Qz = data['++'].Qz
+    grids = _group_by_grid(data, parts)
+    v, var = np.empty((len(parts), len(Qz))), np.empty((len(parts), len(Qz)))
+    for rows, px in grids:
+        pv = np.array([data[parts[k]].v for k in rows])
+        pvar = np.array([data[parts[k]].dv for k in rows])**2
+        if rows[0] == 0:
+            # ++ is already on the ++ grid
+            v[rows], var[rows] = pv, pvar
+        else:
+            to_pp = err1d.Interpolation(Qz, px)
+            v[rows], var[rows] = to_pp(pv, pvar, left=_MISSING, right=_MISSING, axis=-1)
+    Y = U(v, np.sqrt(var))
 
     # Look up correction matrix for each point using the ++ cross section
     correction_index = util.nearest(data['++'].angular_resolution, dtheta)
@@ -263,14 +272,35 @@ def _apply_correction(data, dtheta, Hinv, use_pm, use_mp):
 
     # Put the corrected intensities back into the datasets
     # interpolate back to the original Qz in that dataset:
+    for rows, px in grids:
+        from_pp = err1d.Interpolation(px, Qz)
+        v, var = from_pp(X[rows], dX[rows]**2, left=_MISSING, right=_MISSING, axis=-1)
+        for k, row in enumerate(rows):
+            xs = parts[row]
+            data[xs].v, data[xs].dv = v[k], np.sqrt(var[k])
+            data[xs].vlabel = 'counts per incident count'
+            data[xs].vunits = None
+
+
+# Value and variance for points outside the range of the measured cross section
+_MISSING = (np.NaN, 0.)
+
+def _group_by_grid(data, parts):
+    """
+    Group the cross sections *parts* by their Qz points.
+
+    Returns a list of *(rows, Qz)* with the indices into *parts* of the
+    cross sections measured at the points *Qz*.
+    """
+    grids = []
     for k, xs in enumerate(parts):
-        x = data[xs].Qz
-        px = data['++'].Qz
-        py = U(X[k, :], dX[k, :])
-        y = interp(x, px, py, left=np.NaN, right=np.NaN)
-        data[xs].v, data[xs].dv = nominal_values(y), std_devs(y)
-        data[xs].vlabel = 'counts per incident count'
-        data[xs].vunits = None
+        for rows, Qz in grids:
+            if np.array_equal(Qz, data[xs].Qz):
+                rows.append(k)
+                break
+        else:
+            grids.append(([k], data[xs].Qz))
+    return grids
 
 
 def _correction_matrix(beta, fp, rp, x, y, use_pm, use_mp):
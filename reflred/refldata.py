@@ -1054,10 +1054,34 @@ class ReflData(Group):
                   for s, _ in ReflData._groups]
         return "\n".join(base+others)
 
-    def todict(self, maxsize=np.inf):
-        state = _toDict(self, maxsize=maxsize)
-        groups = {s: _toDict(getattr(self, s), maxsize=maxsize)
-                  for s, _ in ReflData._groups}
+    def todict(self, maxsize=np.inf, fields=None):
+        """
+        Return the dataset as a dictionary of python values.
+
+        If *fields* is given, only the listed attributes are converted, with
+        "group" selecting all of a group such as "sample" and "group.attribute"
+        selecting one attribute, such as "sample.angle_x".  Unknown fields
+        are ignored.  The result cannot be restored with :meth:`fromdict`.
+        """
+        if fields is None:
+            state = _toDict(self, maxsize=maxsize)
+            groups = {s: _toDict(getattr(self, s), maxsize=maxsize)
+                      for s, _ in ReflData._groups}
+        else:
+            names = set()
+            group_names = dict(ReflData._groups)
+            group_fields = {}
+            for field in fields:
+                name, _, attr = field.partition('.')
+                if name not in group_names:
+                    names.add(name)
+                elif not attr:
+                    group_fields[name] = None
+                elif group_fields.get(name, ()) is not None:
+                    group_fields.setdefault(name, set()).add(attr)
+            state = _toDict(self, maxsize=maxsize, fields=names)
+            groups = {s: _toDict(getattr(self, s), maxsize=maxsize, fields=attrs)
+                      for s, attrs in group_fields.items()}
         state.update(groups)
         return state
 
@@ -1196,7 +1220,7 @@ class ReflData(Group):
             self.scan_value[self.scan_label.index(p)] if v.get('is_scan', False)
             else get_item_from_path(self, p)
             for p, v in columns.items()]
-        data_arrays = [np.resize(d, self.points).tolist() for d in data_arrays]
+        data_arrays = [np.resize(d, self.points) for d in data_arrays]
         datas = {c: {"values": d} for c, d in zip(columns.keys(), data_arrays)}
         # add errorbars:
         for k in columns.keys():
@@ -1204,7 +1228,7 @@ class ReflData(Group):
                 #print('errorbars found for column %s' % (k,))
                 errorbars = get_item_from_path(self, columns[k]['errorbars'])
                 if errorbars is not None:
-                    datas[k]["errorbars"] = errorbars.tolist()
+                    datas[k]["errorbars"] = errorbars
                 else:
                     print("===> missing errorbars {eb} for {k}".format(eb=columns[k]['errorbars'], k=k))
         name = getattr(self, "name", "default_name")
@@ -1256,22 +1280,24 @@ class PSDData(ReflData):
             y, ylabel = np.arange(1, ny+1), "point"
         return (x, xlabel), (y, ylabel)
 
+    def get_image(self):
+        """
+        Return the image *z[y, x]* and its extent *(xmin, xmax, ymin, ymax)*
+        for level of detail plotting.
+        """
+        ny, nx = self.v.shape
+        (x, _), (y, _) = self.get_axes()
+        return self.v, plot_limits(x, nx) + plot_limits(y, ny)
+
     def get_plottable(self):
         name = getattr(self, "name", "default_name")
         entry = getattr(self, "entry", "default_entry")
-        def limits(v, n):
-            low, high = v.min(), v.max()
-            delta = (high - low) / max(n-1, 1)
-            # TODO: move range cleanup to plotter
-            if delta == 0.:
-                delta = v[0]/10.
-            return low - delta/2, high+delta/2
         data = self.v
         ny, nx = data.shape
         (x, xlabel), (y, ylabel) = self.get_axes()
         #print("data shape", nx, ny)
-        xmin, xmax = limits(x, nx)
-        ymin, ymax = limits(y, ny)
+        xmin, xmax = plot_limits(x, nx)
+        ymin, ymax = plot_limits(y, ny)
         # TODO: self.detector.mask
         zmin, zmax = data.min(), data.max()
         # TODO: move range cleanup to plotter
@@ -1287,7 +1313,7 @@ class PSDData(ReflData):
             "ymin": ymin, "ymax": ymax, "ydim": ny,
             "zmin": zmin, "zmax": zmax,
         }
-        z = data.T.ravel('C').tolist()
+        z = data.T.ravel('C')
         plottable = {
             #'type': '2d_multi',
             #'dims': {'zmin': zmin, 'zmax': zmax},
@@ -1354,9 +1380,22 @@ def _str(object, indent=4):
     prefix = " "*indent
     return prefix+("\n"+prefix).join(props)
 
-def _toDict(obj, maxsize=np.inf):
+def plot_limits(v, n):
+    """
+    Return the plot range for *n* pixels centered on the values *v*.
+    """
+    low, high = v.min(), v.max()
+    delta = (high - low) / max(n-1, 1)
+    # TODO: move range cleanup to plotter
+    if delta == 0.:
+        delta = v[0]/10.
+    return low - delta/2, high+delta/2
+
+def _toDict(obj, maxsize=np.inf, fields=None):
     properties = list(getattr(obj, '_fields', ()))
     properties += list(getattr(obj, '_props', ()))
+    if fields is not None:
+        properties = [a for a in properties if a in fields]
     props = {a: _toDictItem(getattr(obj, a), maxsize=maxsize)
              for a in properties}
     return props
@@ -1399,3 +1438,24 @@ def _set(object, kw):
         # this will fail with an attribute error for incorrect keys
         getattr(object, k)
         setattr(object, k, v)
+
+
+def test_todict_fields():
+    from dataflow.core import Bundle, DataType
+    data = ReflData(name="d")
+    data.v, data.dv = np.array([1., 2.]), np.array([.1, .2])
+    data.sample.angle_x = np.array([0.5, 0.6])
+    # only the selected fields are converted, so derived values such as
+    # x need not be computable
+    state = data.todict(fields=["v", "dv", "name", "sample.angle_x", "nonexistent"])
+    assert set(state) == {"v", "dv", "name", "sample"}
+    assert state["sample"] == {"angle_x": [0.5, 0.6]}
+    assert state["v"] == [1., 2.] and state["name"] == "d"
+    state = data.todict(fields=["sample.angle_x", "sample"])
+    assert state["sample"] == _toDict(data.sample)
+
+    bundle = Bundle(DataType("ncnr.refl.refldata", ReflData), [data]*5)
+    state = bundle.todict(start=1, stop=3, fields=["v"])
+    assert (state["offset"], state["total"]) == (1, 5)
+    assert state["values"] == [{"v": [1., 2.]}]*2
+    assert "offset" not in bundle.todict(fields=["v"])
@@ -93,6 +93,9 @@ def apply_norm(data, base='auto'):
     # Broadcast for nD detector arrays
     if C.ndim > 1:
         M, varM = extend(M, C), extend(varM, C)
+        # Keep single precision detector values in single precision
+        if C.dtype == np.float32:
+            M, varM = np.asarray(M, C.dtype), np.asarray(varM, C.dtype)
     #print "norm",C,varC,M,varM
     value, variance = err1d.div(C, varC+(varC == 0), M, varM)
     data.v = value
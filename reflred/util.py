@@ -302,8 +302,30 @@ def poisson_average(y, dy, norm='monitor'):
     is better for error propagation.  Monitor weighted averaging
     works well for everything except data with many zero counts.
     """
+    y, dy = np.asarray(y), np.asarray(dy)
+    groups = np.zeros(len(y), dtype=int)
+    bar_y, bar_dy = poisson_average_groups(y, dy, groups, norm=norm, ngroups=1)
+    return bar_y[0], bar_dy[0]
+
+
+def poisson_average_groups(y, dy, groups, norm='monitor', ngroups=None):
+    r"""
+    Return the Poisson average of a rate vector *y +/- dy* within groups.
+
+    *groups* is the group number from 0 to *ngroups-1* for each point along
+    the first axis of *y*, with *ngroups* defaulting to one more than the
+    largest group number.  The averages for all groups are computed at once,
+    returning *bar_y, bar_dy* with *ngroups* rows.  Groups without points
+    have a rate of zero.
+
+    See :func:`poisson_average` for details.
+    """
     if norm not in ("monitor", "time", "none"):
         raise ValueError("expected norm to be time, monitor or none")
+    groups = np.asarray(groups, dtype=int)
+    if ngroups is None:
+        ngroups = groups.max()+1 if len(groups) else 0
+    total = group_sum(groups, ngroups)
 
     # Check whether we are combining rates or counts.  If it is counts,
     # then simply sum them, and sum the uncertainty in quadrature. This
@@ -313,8 +335,8 @@ def poisson_average(y, dy, norm='monitor'):
     # the individual counts giving zero, so long as variance on zero counts
     # is set to zero rather than one.
     if norm == "none":
-        bar_y = np.sum(y, axis=0)
-        bar_dy = np.sqrt(np.sum(dy**2, axis=0))
+        bar_y = total(y)
+        bar_dy = np.sqrt(total(dy**2))
         return bar_y, bar_dy
 
     dy = dy + (dy == 0)  # Protect against zero counts in division
@@ -325,24 +347,18 @@ def poisson_average(y, dy, norm='monitor'):
     counts = y*monitors
 
     # Compute average rate
-    combined_monitors = np.sum(monitors, axis=0)
-    combined_counts = np.sum(counts, axis=0)
+    combined_monitors = total(monitors)
+    combined_counts = total(counts)
+    # Protect against division by zero for empty groups
+    combined_monitors[np.bincount(groups, minlength=ngroups) == 0] = 1.
     bar_y = combined_counts/combined_monitors
     if norm == "time":
         bar_dy = bar_y * np.sqrt(1./combined_monitors)
-    elif np.isscalar(bar_y):
-        if bar_y == 0:
-            # When bar_y is zero then 1/N is undefined and so sqrt(1/N + 1/M) fails.
-            # Instead use |dy| = 1/M*sqrt((dN)^2 + 1/M) with dN = 1.
-            bar_dy = 1./combined_monitors * np.sqrt(1. + 1./combined_monitors)
-        else:
-            # When bar_y is not zero then use |dy| = N/M * sqrt(1/N + 1/M)
-            bar_dy = bar_y * np.sqrt(1./combined_counts + 1./combined_monitors)
     else:
-        # Following the scalar case above, first build bar_dy assuming
-        # that y is zero since it works for all y, then fill in the values
-        # for y not zero. Can't do this the other way since the expression
-        # for y not zero will raise errors when y is zero.
+        # When bar_y is zero then 1/N is undefined and so sqrt(1/N + 1/M)
+        # fails.  Instead use |dy| = 1/M*sqrt((dN)^2 + 1/M) with dN = 1.
+        # First build bar_dy assuming that y is zero since it works for all
+        # y, then fill in |dy| = N/M * sqrt(1/N + 1/M) for y not zero.
         bar_dy = 1./combined_monitors * np.sqrt(1. + 1./combined_monitors)
         idx = (bar_y != 0)
         bar_dy[idx] = bar_y[idx] * np.sqrt(1./combined_counts[idx]
@@ -354,6 +370,57 @@ def poisson_average(y, dy, norm='monitor'):
     return bar_y, bar_dy
 
 
+def group_sum(groups, ngroups):
+    """
+    Return a function which sums arrays along the first axis within groups.
+
+    *groups* is the group number from 0 to *ngroups-1* for each point.
+    Vectors are summed with bincount.  Multidimensional arrays are sorted
+    by group and summed with reduceat, computing the sort order once for
+    all arrays summed by the function.  Sums are accumulated in double
+    precision.
+    """
+    groups = np.asarray(groups, dtype=int)
+    sorted_groups = []
+    def total(values):
+        values = np.asarray(values)
+        if values.ndim == 1:
+            return np.bincount(groups, weights=values, minlength=ngroups)
+        if not sorted_groups:
+            order = np.argsort(groups, kind='stable')
+            starts = np.flatnonzero(np.diff(groups[order], prepend=-1))
+            sorted_groups.extend((order, starts, groups[order][starts]))
+        order, starts, present = sorted_groups
+        result = np.zeros((ngroups,) + values.shape[1:])
+        if len(starts):
+            result[present] = np.add.reduceat(
+                values[order], starts, axis=0, dtype=np.float64)
+        return result
+    return total
+
+
+def test_poisson_average_groups():
+    # Counts N over monitors M for two groups, one of them with zero counts
+    N, M = np.array([7., 13., 0., 0., 5.]), np.array([2e3, 4e3, 2e3, 3e3, 1e3])
+    y, dy = N/M, np.sqrt(N + (N == 0))/M
+    groups = [0, 0, 1, 1, 3]
+    for norm in ("monitor", "time"):
+        bar_y, bar_dy = poisson_average_groups(y, dy, groups, norm=norm)
+        assert bar_y.shape == (4,) and bar_y[2] == 0
+        for k in (0, 1, 3):
+            ave_y, ave_dy = poisson_average(y[np.equal(groups, k)],
+                                            dy[np.equal(groups, k)], norm=norm)
+            assert abs(bar_y[k] - ave_y) <= 1e-14*abs(ave_y)
+            assert abs(bar_dy[k] - ave_dy) <= 1e-14*ave_dy
+    # time normalized counts are averaged exactly
+    assert abs(bar_y[0] - 20/6e3) < 1e-14
+    # frames are averaged pixel by pixel
+    Y, dY = np.array([y, 2*y, 3*y]).T, np.array([dy, 2*dy, 3*dy]).T
+    bar_Y, bar_dY = poisson_average_groups(Y, dY, groups, norm="none")
+    assert np.allclose(bar_Y[:, 1], 2*np.bincount(groups, weights=y))
+    assert np.allclose(bar_dY[:, 2], 3*np.sqrt(np.bincount(groups, weights=dy**2)))
+
+
 def gaussian_average(y, dy, w, dw=0):
     bar_y, bar_y_var = err1d.average(y, dy**2, w, dw**2)
     return bar_y, np.sqrt(bar_y_var)
@@ -119,6 +119,9 @@ def readSANSNexuz(input_file, file_obj=None, metadata_lookup=metadata_lookup):
     """
     datasets = []
     file = h5_open_zip(input_file, file_obj)
+    if hasattr(file, 'prefetch'):
+        # NeXus-zip file: all members are read, so decompress them in parallel
+        file.prefetch()
     for entryname, entry in file.items():        
         multiplicity = 1
         for i in range(multiplicity):
@@ -6,6 +6,8 @@ import numpy
 import math
 import os
 
+from .sansformat import R4_VAX2IEEE_array, I2_decompress, SENSITIVITY_OFFSETS
+
 IS_PY3 = (sys.version_info > (3,0))
 
 if IS_PY3:
@@ -37,8 +39,7 @@ def readMask(inputfile):
     else:
         data = open(inputfile, 'rb').read()
 
-    dataformatstring = '<16384B'
-    output = numpy.array(struct.unpack(dataformatstring, data[4:16388]), dtype="float")
+    output = numpy.frombuffer(data, dtype='u1', count=16384, offset=4).astype("float")
     output = numpy.flipud(output.reshape(128,128))
     return output
 
@@ -50,34 +51,8 @@ def readNCNRSensitivity(inputfile):
         data = open(inputfile, 'rb').read()
     
     #skip the fake header and just read the data
-    #data is 32bit VAX floats
-    dataformatstring = '<65600s'
-    (rawdatastring,) = struct.unpack(dataformatstring,data[516:])
-    
-    detdata = numpy.empty(16384)
-    
-    a = 0
-    offset = 0
-    for ii in range(16):
-        for jj in range(511):
-            detdata[a] = R4toFloat(rawdatastring[offset:offset+4])
-            a += 1
-            offset += 4
-        
-        offset += 2
-        
-        for kk in range(510):
-	        detdata[a] = R4toFloat(rawdatastring[offset:offset+4])
-	        a += 1
-	        offset += 4
-        
-        offset += 2
-    
-    for ii in range(48):
-        detdata[a] = R4toFloat(rawdatastring[offset:offset+4])
-        a += 1
-        offset += 4
-    
+    #data is 32bit VAX floats, with 2 byte record markers
+    detdata = R4_VAX2IEEE_array(data, offsets=516+SENSITIVITY_OFFSETS)
     detdata.resize(128,128)
     
     return detdata.T
@@ -212,22 +187,14 @@ def readNCNRData(inputfile, file_obj=None):
 
     
     #Process reals into metadata
-    for k,v in reals.items():
-        #print k,type(v)
-        metadata[k] = R4toFloat(v)
-    
-    dataformatstring = '<16401h'
-    rawdata = numpy.array(struct.unpack(dataformatstring,data[514:]))
+    keys = list(reals.keys())
+    values = R4_VAX2IEEE_array(b"".join(reals[k] for k in keys))
+    metadata.update(zip(keys, values.tolist()))
     
-    detdata = numpy.empty(16384)
+    rawdata = numpy.frombuffer(data, dtype='<i2', count=16401, offset=514)
     
-    ii=0
-    skip=0
-    while(ii < 16384):
-        if(((ii+skip) %1022)==0):
-            skip+=1
-        detdata[ii] = I2Decompress(rawdata[ii+skip])
-        ii+=1
+    #drop the record markers and decompress the I*2 values
+    detdata = I2_decompress(rawdata).astype('float')
     
     detdata.resize(128,128)
     
@@ -250,9 +217,11 @@ def I2Decompress(val):
 
 def arrayI2Decompress(datarray):
     """Apply the I2 to I4 decompression routine to a whole array"""
-    for element in datarray.flat:
-        element = I2Decompress(element)
-    
+    datarray = numpy.array(datarray, dtype='float')
+    ipw = 10000
+    idx = datarray <= -ipw
+    npw = numpy.floor(-datarray[idx]/ipw)
+    datarray[idx] = (-datarray[idx] % ipw)*10**npw
     return datarray
 
 
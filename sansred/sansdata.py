@@ -127,6 +127,26 @@ class SansData(object):
     #def __repr__(self):
         #return self.__str__()
 
+    def _plot_extent(self):
+        if self.qx is None or self.qy is None:
+            xmin = 0.0
+            xmax = 128
+            ymin = 0.0
+            ymax = 128
+        else:
+            xmin = self.qx_min if self.qx_min is not None else self.qx.min()
+            xmax = self.qx_max if self.qx_max is not None else self.qx.max()
+            ymin = self.qy_min if self.qy_min is not None else self.qy.min()
+            ymax = self.qy_max if self.qy_max is not None else self.qy.max()
+        return xmin, xmax, ymin, ymax
+
+    def get_image(self):
+        """
+        Return the image *z[y, x]* and its extent *(xmin, xmax, ymin, ymax)*
+        for level of detail plotting.
+        """
+        return self.data.x.astype("float").T, self._plot_extent()
+
     def get_plottable(self):
         data = self.data.x.astype("float")
         xdim = data.shape[0]
@@ -142,20 +162,11 @@ class SansData(object):
                 zmax = data[mask].max()
             else:
                 zmax = data.max()
-        if self.qx is None or self.qy is None:
-            xmin = 0.0
-            xmax = 128
-            ymin = 0.0
-            ymax = 128
-        else:
-            xmin = self.qx_min if self.qx_min is not None else self.qx.min()
-            xmax = self.qx_max if self.qx_max is not None else self.qx.max()
-            ymin = self.qy_min if self.qy_min is not None else self.qy.min()
-            ymax = self.qy_max if self.qy_max is not None else self.qy.max()
+        xmin, xmax, ymin, ymax = self._plot_extent()
         plottable_data = {
             'entry': self.metadata['entry'],
             'type': '2d',
-            'z':  [data.flatten().tolist()],
+            'z':  [data.flatten()],
             'title': _s(self.metadata['run.filename'])+': ' + _s(self.metadata['sample.labl']),
             #'metadata': self.metadata,
             'options': {
@@ -277,12 +288,12 @@ class SansIQData(object):
             ('I*Q^2', {'label': 'I * Q^2', 'units': '1/cm * 1/Ang**2'}),
         ])
         datas = OrderedDict([
-            ("Q", {"values": self.Q.tolist(), "errorbars": self.dQ.tolist()}),
-            ("I", {"values": self.I.tolist(), "errorbars": self.dI.tolist()}),
-            ("meanQ", {"values": self.meanQ.tolist(), "errorbars": self.dQ.tolist()}),
-            ("Q^4", {"values": (self.meanQ**4).tolist()}),
-            ("I*Q^4", {"values": (self.I * self.meanQ**4).tolist()}),
-            ("I*Q^2", {"values": (self.I * self.meanQ**2).tolist()}),
+            ("Q", {"values": self.Q, "errorbars": self.dQ}),
+            ("I", {"values": self.I, "errorbars": self.dI}),
+            ("meanQ", {"values": self.meanQ, "errorbars": self.dQ}),
+            ("Q^4", {"values": self.meanQ**4}),
+            ("I*Q^4", {"values": self.I * self.meanQ**4}),
+            ("I*Q^2", {"values": self.I * self.meanQ**2}),
         ])
         
         name = self.metadata.get("name", "default_name")
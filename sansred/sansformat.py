@@ -295,38 +295,25 @@ def readNCNRSensitivity(inputfile):
 
     #skip the fake header and just read the data
     #data is 32bit VAX floats
-    dataformatstring = '<65600s'
-    #print len(data[516:])
-    (rawdatastring,) = struct.unpack_from(dataformatstring, data, offset=516)
-
-    detdata = np.empty(16384)
-
-    a = 0
-    offset = 0
-    for _i in range(16):
-        for _j in range(511):
-            #if jj == 0: print rawdatastring[offset:offset+4]
-            detdata[a] = R4_VAX2IEEE(rawdatastring[offset:offset+4])
-            a += 1
-            offset += 4
+    detdata = R4_VAX2IEEE_array(data, offsets=516+SENSITIVITY_OFFSETS)
+    detdata.resize((128, 128))
 
-        offset += 2
+    return detdata
 
-        for _k in range(510):
-            detdata[a] = R4_VAX2IEEE(rawdatastring[offset:offset+4])
-            a += 1
-            offset += 4
 
-        offset += 2
+def _sensitivity_offsets():
+    # type: () -> np.ndarray
+    """
+    Byte offsets of the VAX REAL*4 values in the sensitivity data block.
 
-    for _i in range(48):
-        detdata[a] = R4_VAX2IEEE(rawdatastring[offset:offset+4])
-        a += 1
-        offset += 4
+    The data is stored as 16 records of 511 values, a 2 byte marker,
+    510 values and another 2 byte marker, followed by 48 values.
+    """
+    record = np.hstack((4*np.arange(511), 2046 + 4*np.arange(510)))
+    offsets = (4088*np.arange(16)[:, None] + record[None, :]).flatten()
+    return np.hstack((offsets, 16*4088 + 4*np.arange(48)))
 
-    detdata.resize((128, 128))
-
-    return detdata
+SENSITIVITY_OFFSETS = _sensitivity_offsets()
 
 
 def readNCNRMask(inputfile):
@@ -339,7 +326,7 @@ def readNCNRMask(inputfile):
     f.close()
 
     # four bytes before and 508 bytes after should be 0
-    mask = np.array(struct.unpack_from('<16384B', data, offset=4)) # 4:16384+4
+    mask = np.frombuffer(data, dtype='u1', count=16384, offset=4).astype(int) # 4:16384+4
     mask.resize((128, 128))
 
     return mask
@@ -365,8 +352,8 @@ def readNCNRData(inputfile):
                         struct.unpack_from(INFO.header_struct, data, offset=2)))
 
     #Process reals into metadata
-    for k in INFO.reals:
-        metadata[k] = R4_VAX2IEEE(metadata[k])
+    reals = R4_VAX2IEEE_array(b"".join(metadata[k] for k in INFO.reals))
+    metadata.update(zip(INFO.reals, reals.tolist()))
 
     #Remove spaces around string fields
     for k in INFO.strings:
@@ -376,7 +363,7 @@ def readNCNRData(inputfile):
                                              INFO.types['run.datetime'])
 
     #print "data len", len(data[514:])
-    rawdata = np.array(struct.unpack_from(INFO.data_struct, data, offset=514))
+    rawdata = np.frombuffer(data, dtype='<i2', count=16401, offset=514)
 
     detdata = decompress(rawdata)
 
@@ -452,21 +439,30 @@ def decompress(data):
          - (mantissa + 10000*10**power)
     where the mantissa is 4 digits and power is 1, 2 or 3.
     """
+    data = I2_decompress(data)
+    assert len(data) == 16384
+
+    # Recast as 128x128 array
+    data = data.reshape((128, 128), order='F')
+    return data
+
+def I2_decompress(data):
+    # type: (np.ndarray) -> np.ndarray
+    """
+    Drop the record markers at 0, 1022, 2*1022, ... from the raw I*2 data
+    and expand the semi-logarithmic values to integers.
 
+    See :func:`decompress` for the storage format.
+    """
     # Drop values at 0, 1022, 2*1022, ...
     idx = np.arange(len(data), dtype='i')%1022 != 0
-    #print "not idx", data[~idx]
-    data = data[idx]
-    assert len(data) == 16384
+    data = np.asarray(data[idx], dtype='int64')
 
     # Logarithmic decompression
     base = 10000
     idx = data <= -base
-    power = np.floor(-data[idx]/base)
-    data[idx] = np.asarray((-data[idx]%base)*10**power, data.dtype)
-
-    # Recast as 128x128 array
-    data = data.reshape((128, 128), order='F')
+    power = -data[idx]//base
+    data[idx] = (-data[idx]%base)*10**power
     return data
 
 def compress(data):
@@ -516,6 +512,29 @@ def R4_VAX2IEEE(vax):
         value = -value
     return value
 
+def R4_VAX2IEEE_array(buffer, offsets=None):
+    # type: (bytes, Optional[np.ndarray]) -> np.ndarray
+    """
+    Convert a buffer of VAX REAL*4 values into a floating point array.
+
+    If *offsets* is given, convert the 4 byte values starting at each of
+    the byte offsets, otherwise convert the entire buffer.
+    """
+    if offsets is None:
+        raw = np.frombuffer(buffer, dtype='<u4')
+    else:
+        octets = np.frombuffer(buffer, dtype='u1')
+        index = np.asarray(offsets)[:, None] + np.arange(4)[None, :]
+        raw = np.ascontiguousarray(octets[index]).view('<u4').flatten()
+    raw = raw.astype('int64')
+    sign = (raw >> 15) & 0x1
+    exp = (raw >> 7) & 0xff
+    mant = ((raw & 0x7f) << 16) | ((raw >> 16) & 0xffff)
+    value = np.ldexp(0.5 + mant / float(0x1000000), exp - 128)
+    value[sign == 1] *= -1
+    value[raw == 0] = 0.
+    return value
+
 def R4_IEEE2VAX(fpValue, varName):
     # type: (float, str) -> bytes
     """
@@ -564,6 +583,33 @@ else:
         # type: (int) -> bytes
         return bytes((v&0xff, (v>>8)&0xff, (v>>16)&0xff, (v>>24)&0xff))
 
+def test_vax_decode():
+    # type: () -> None
+    from .sans_vaxformat import I2Decompress, R4toFloat
+
+    # Vectorized REAL*4 conversion matches the scalar conversions
+    values = np.hstack((0., np.logspace(-6, 6, 25), -np.logspace(-6, 6, 25)))
+    buffer = b"".join(R4_IEEE2VAX(v, "test") for v in values)
+    scalar = [R4_VAX2IEEE(buffer[k:k+4]) for k in range(0, len(buffer), 4)]
+    vaxfloat = [R4toFloat(buffer[k:k+4]) for k in range(0, len(buffer), 4)]
+    vector = R4_VAX2IEEE_array(buffer)
+    assert (vector == scalar).all()
+    assert (vector.astype('float32') == vaxfloat).all()
+    assert np.allclose(vector, values, rtol=1e-7)
+
+    # Offsets skip the record markers in the sensitivity data block
+    assert len(SENSITIVITY_OFFSETS) == 16384
+    assert SENSITIVITY_OFFSETS[-1] + 4 == 65600
+    assert (np.diff(SENSITIVITY_OFFSETS)[[510, 1020, 1021]] == [6, 6, 4]).all()
+    offsets = np.array([8, 0, 16])
+    assert (R4_VAX2IEEE_array(buffer, offsets=offsets) == vector[[2, 0, 4]]).all()
+
+    # Vectorized I*2 decompression matches the scalar decompression
+    counts = np.hstack((np.arange(16000), 10**np.linspace(4.6, 6.4, 384)))
+    rawdata = compress(counts.astype('int32'))
+    expected = [I2Decompress(v) for k, v in enumerate(rawdata) if k%1022 != 0]
+    assert (I2_decompress(rawdata) == expected).all()
+
 
 # ==== demo ====
 def plot(filename):
@@ -14,7 +14,7 @@ from collections import OrderedDict
 
 import numpy as np
 
-from dataflow.lib.uncertainty import Uncertainty
+from dataflow.lib.uncertainty import Uncertainty, lazy
 from dataflow.lib import uncertainty
 
 from .sansdata import RawSANSData, SansData, Sans1dData, SansIQData, Parameters, _s
@@ -127,7 +127,7 @@ def LoadRawSANS(filelist=None, check_timestamps=True):
 
     2018-04-23 Brian Maranville
     """
-    from dataflow.fetch import url_get
+    from dataflow.fetch import url_get, cached_load
     from .loader import readSANSNexuz
     if filelist is None:
         filelist = []
@@ -135,8 +135,8 @@ def LoadRawSANS(filelist=None, check_timestamps=True):
     for fileinfo in filelist:
         path, mtime, entries = fileinfo['path'], fileinfo.get('mtime', None), fileinfo.get('entries', None)
         name = basename(path)
-        fid = BytesIO(url_get(fileinfo, mtime_check=check_timestamps))
         if name.upper().endswith(".DIV"):
+            fid = BytesIO(url_get(fileinfo, mtime_check=check_timestamps))
             sens_raw = readNCNRSensitivity(fid)
             detectors = [{"detector": {"data": {"value": Uncertainty(sens_raw, sens_raw * 0.0001)}}}]
             metadata = OrderedDict([
@@ -153,7 +153,8 @@ def LoadRawSANS(filelist=None, check_timestamps=True):
             sens = RawSANSData(metadata=metadata, detectors=detectors)
             entries = [sens]
         else:
-            entries = readSANSNexuz(name, fid)
+            entries = cached_load(fileinfo, readSANSNexuz,
+                                  mtime_check=check_timestamps)
         
         data.extend(entries)
 
@@ -1555,9 +1556,8 @@ def absolute_scaling(empty, sample, Tsam, div, instrument="NG7", integration_box
 
     #-------------------------------------------------------------------------------------#
 
-    # Correct empty beam by the sensitivity
-    data = empty.data/div.data
-    # Then take the sum in XY box, including stat. error
+    # Take the sum in XY box of the empty beam corrected by the sensitivity,
+    # including stat. error
     if auto_box:
         height, x, y, width_x, width_y = moments(empty.data.x)
         center_x = x + 0.5
@@ -1571,7 +1571,8 @@ def absolute_scaling(empty, sample, Tsam, div, instrument="NG7", integration_box
     else:
         xmin, xmax, ymin, ymax = map(int, integration_box)
 
-    detCnt = np.sum(data[xmin:xmax+1, ymin:ymax+1])
+    box = (slice(xmin, xmax+1), slice(ymin, ymax+1))
+    detCnt = np.sum(empty.data[box] / div.data[box])
     print("DETCNT: ", detCnt)
     print('attentrans: ', attenTrans)
     print('monCnt: ', monCnt)
@@ -1736,7 +1737,7 @@ def makeDIV(data1, data2, patchbox=(55, 74, 53, 72)):
 
     DIV = patchData(data1, data2, xmin=xmin, xmax=xmax, ymin=ymin, ymax=ymax)
 
-    DIV.data = DIV.data / np.sum(DIV.data) * DIV.data.x.size
+    DIV.data = (lazy(DIV.data) / np.sum(DIV.data) * DIV.data.x.size).evaluate()
 
     return DIV
 
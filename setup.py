@@ -51,6 +51,7 @@ dist = setup(
         ],
     extras_require={
         'masked_curve_fit': ['numdifftools'],
+        'compiled': ['numba'],
         },
     tests_require=['pytest'],
     )
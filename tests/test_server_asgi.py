@@ -0,0 +1,50 @@
+"""
+Tests for the ASGI reduction server, driving the application directly
+with http scopes rather than starting a server.
+"""
+import os
+import asyncio
+
+import msgpack
+
+from web_gui import api, server_asgi
+
+
+def test_server():
+    def request(app, method, path, body=b'', headers=()):
+        scope = {'type': 'http', 'method': method, 'path': path,
+                 'headers': list(headers)}
+        messages = [{'type': 'http.request', 'body': body}]
+        sent = []
+        async def receive():
+            return messages.pop(0)
+        async def send(message):
+            sent.append(message)
+        asyncio.run(app(scope, receive, send))
+        start, body = sent
+        return start['status'], dict(start['headers']), body['body']
+
+    app = server_asgi.create_app({"data_sources": [], "instruments": ["refl"]}, workers=1)
+    try:
+        # light methods run in the thread pool
+        status, headers, body = request(app, 'POST', '/RPC2/list_instruments')
+        assert status == 200 and headers[b'content-type'] == b'application/msgpack'
+        assert msgpack.unpackb(body) == api.list_instruments()
+
+        # errors are returned as a msgpack payload
+        status, _, body = request(app, 'POST', '/get_instrument', body=b'{"bad": 1}')
+        content = msgpack.unpackb(body)
+        assert status == 500 and 'TypeError' in content['exception']
+        status, _, body = request(app, 'POST', '/get_instrument', body=b'{')
+        assert status == 400 and 'traceback' in msgpack.unpackb(body)
+
+        # unknown methods and paths outside the static directory are not found
+        assert request(app, 'POST', '/RPC2/no_such_method')[0] == 404
+        assert request(app, 'GET', '/static/../server_asgi.py')[0] == 404
+        assert request(app, 'GET', '/static/no_such_file.js')[0] == 404
+
+        status, headers, body = request(app, 'GET', '/static/index.html')
+        assert status == 200 and headers[b'content-type'] == b'text/html'
+        assert body == server_asgi._read_file(os.path.join(server_asgi.STATIC_PATH, 'index.html'))
+    finally:
+        app.shutdown()
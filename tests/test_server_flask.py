@@ -0,0 +1,60 @@
+"""
+Tests for the flask reduction server using the flask test client.
+"""
+import gzip
+
+import msgpack
+
+from dataflow.lib.msgpack_ndarray import BINARY_ARRAYS_MIMETYPE
+from web_gui import api, server_flask
+
+
+def test_compression():
+    config = {"data_sources": [], "instruments": ["refl"]}
+    headers = {'Accept-Encoding': 'gzip'}
+    # responses are sent as is unless compression is configured
+    response = server_flask.create_app(config).test_client().post('/list_instruments', headers=headers)
+    assert 'Content-Encoding' not in response.headers
+    config['compression'] = {'min_size': 0}
+    response = server_flask.create_app(config).test_client().post('/list_instruments', headers=headers)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert msgpack.unpackb(gzip.decompress(response.data)) == api.list_instruments()
+
+
+def test_etag():
+    app = server_flask.create_app({"data_sources": [], "instruments": ["refl"]})
+    template = {"name": "test", "instrument": "ncnr.refl", "wires": [],
+                "modules": [{"module": "ncnr.refl.super_load", "version": "0.0"}]}
+    params = {"template_def": template, "config": {}, "nodenum": 0,
+              "terminal_id": "output", "return_type": "plottable"}
+    etag = api.response_etag('calc_terminal', params)
+
+    # the tag depends on the response options as well as the template
+    options = [
+        {"return_type": "full"}, {"return_type": "metadata"},
+        {"return_type": "export", "export_type": "column"},
+        {"return_type": "export", "export_type": "NeXus"},
+        {"start": 1}, {"stop": 2}, {"fields": ["v"]},
+        {"config": {"0": {"intent": "specular"}}},
+    ]
+    tags = set(api.response_etag('calc_terminal', dict(params, **option))
+               for option in options)
+    assert len(tags | set([etag])) == len(options) + 1
+    assert api.response_etag('list_instruments', {}) is None
+
+    # matching tags, including tags weakened by a proxy, return 304
+    # without computing the node
+    client = app.test_client()
+    binary_etag = etag + "-binary"
+    for accept, tag in (('application/msgpack', etag),
+                        (BINARY_ARRAYS_MIMETYPE, binary_etag)):
+        for if_none_match in ('"%s"' % tag, 'W/"%s"' % tag, '"x", "%s"' % tag):
+            response = client.post('/calc_terminal', json=params, headers={
+                'Accept': accept, 'If-None-Match': if_none_match})
+            assert response.status_code == 304
+            assert response.headers['ETag'] == '"%s"' % tag
+            assert response.headers['Vary'] == 'Accept, Accept-Encoding'
+    # binary arrays are a separate representation with their own tag
+    response = client.post('/calc_terminal', json=params, headers={
+        'Accept': BINARY_ARRAYS_MIMETYPE, 'If-None-Match': '"%s"' % etag})
+    assert response.headers['ETag'] == '"%s"' % binary_etag
@@ -0,0 +1,53 @@
+"""
+Tests for the pre-fork server, using a trivial WSGI application.
+"""
+import os
+import time
+import signal
+import socket
+import multiprocessing
+from urllib.request import urlopen
+
+from web_gui import server_prefork
+
+
+def test_prefork_server():
+    if not hasattr(os, 'fork'):
+        return
+
+    def app(environ, start_response):
+        if environ['PATH_INFO'] == '/hang':
+            time.sleep(60)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [str(os.getpid()).encode('ascii')]
+
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    server = server_prefork.PreforkServer(app, port=port, workers=1, max_requests=2, timeout=1.)
+    process = multiprocessing.Process(target=server.serve)
+    process.start()
+    url = "http://127.0.0.1:%d/" % port
+    def get(path=''):
+        for _ in range(50):
+            try:
+                return urlopen(url + path, timeout=10).read().decode('ascii')
+            except (IOError, OSError):
+                time.sleep(0.1)
+        raise RuntimeError("server not responding")
+    try:
+        # workers are replaced after max_requests
+        pids = [get() for _ in range(5)]
+        assert pids[0] == pids[1] != pids[2] == pids[3] != pids[4]
+        # a worker stuck on a request is killed and replaced
+        try:
+            urlopen(url + 'hang', timeout=10).read()
+        except (IOError, OSError):
+            pass
+        else:
+            raise AssertionError("hung request should fail")
+        assert get() not in pids
+    finally:
+        os.kill(process.pid, signal.SIGTERM)
+        process.join(20)
@@ -0,0 +1,44 @@
+"""
+Checks for the webreduce client code which handles the arrays sent by
+the server.  These run the functions under node, and are skipped if node
+is not installed.
+"""
+from __future__ import print_function
+
+import json
+import subprocess
+from os.path import dirname, join as joinpath, abspath
+from shutil import which
+
+import pytest
+
+WEBREDUCE_PATH = abspath(joinpath(
+    dirname(__file__), '..', 'web_gui', 'static', 'js', 'webreduce'))
+NODE = which('node') or which('nodejs')
+
+def extract_function(filename, name):
+    """
+    Return the source of the function *name* from *filename*, which must
+    end with a closing brace at the indent of the function definition.
+    """
+    with open(joinpath(WEBREDUCE_PATH, filename)) as fid:
+        source = fid.read()
+    start = source.index("function %s(" % name)
+    indent = source[source.rindex("\n", 0, start)+1:start]
+    end = source.index("\n" + indent + "}", start) + len(indent) + 2
+    return source[start:end]
+
+def run_node(script):
+    output = subprocess.check_output([NODE, '-e', script])
+    return json.loads(output.decode('utf-8'))
+
+@pytest.mark.skipif(NODE is None, reason="node is not installed")
+def test_zip_typed_arrays():
+    # Plot columns arrive as typed arrays (see server_api/hug_msgpack.js).
+    script = extract_function('editor.js', 'zip_arrays') + """
+        var x = new Float64Array([1, 2, 3]), y = new Float32Array([4, 5]);
+        console.log(JSON.stringify([zip_arrays(x, y), zip_arrays([1, 2], [3, 4])]));
+    """
+    typed, plain = run_node(script)
+    assert typed == [[1, 4], [2, 5]]
+    assert plain == [[1, 3], [2, 4]]
@@ -1,10 +1,11 @@
 from posixpath import basename, join
 from copy import copy, deepcopy
-from io import BytesIO
+from functools import partial
 import sys
 import numpy as np
 
 from dataflow.lib.uncertainty import Uncertainty
+from dataflow.precision import detector_array
 
 # Action names
 __all__ = [] # type: List[str]
@@ -94,7 +95,7 @@ def _LoadVSANS(filelist=None, check_timestamps=True):
 
     2018-04-29 Brian Maranville
     """
-    from dataflow.fetch import url_get
+    from dataflow.fetch import cached_load
     from .loader import readVSANSNexuz
     if filelist is None:
         filelist = []
@@ -102,8 +103,8 @@ def _LoadVSANS(filelist=None, check_timestamps=True):
     for fileinfo in filelist:
         path, mtime, entries = fileinfo['path'], fileinfo.get('mtime', None), fileinfo.get('entries', None)
         name = basename(path)
-        fid = BytesIO(url_get(fileinfo, mtime_check=check_timestamps))
-        entries = readVSANSNexuz(name, fid)
+        entries = cached_load(fileinfo, readVSANSNexuz,
+                              mtime_check=check_timestamps)
         if fileinfo['path'].endswith("DIV.h5"):
             print('div file...')
             for entry in entries:
@@ -208,7 +209,7 @@ def LoadVSANSHe3(filelist=None, check_timestamps=True):
 
     2018-04-29 Brian Maranville
     """
-    from dataflow.fetch import url_get
+    from dataflow.fetch import cached_load
     from .loader import readVSANSNexuz, he3_metadata_lookup
     if filelist is None:
         filelist = []
@@ -216,8 +217,8 @@ def LoadVSANSHe3(filelist=None, check_timestamps=True):
     for fileinfo in filelist:
         path, mtime, entries = fileinfo['path'], fileinfo.get('mtime', None), fileinfo.get('entries', None)
         name = basename(path)
-        fid = BytesIO(url_get(fileinfo, mtime_check=check_timestamps))
-        entries = readVSANSNexuz(name, fid, metadata_lookup=he3_metadata_lookup)
+        loader = partial(readVSANSNexuz, metadata_lookup=he3_metadata_lookup)
+        entries = cached_load(fileinfo, loader, mtime_check=check_timestamps)
         data.extend(entries)
 
     return data
@@ -287,7 +288,7 @@ def LoadVSANSDIV(filelist=None, check_timestamps=True):
 
     2019-10-30 Brian Maranville
     """
-    from dataflow.fetch import url_get
+    from dataflow.fetch import cached_load
     from .loader import readVSANSNexuz
     
 
@@ -298,8 +299,9 @@ def LoadVSANSDIV(filelist=None, check_timestamps=True):
     for fileinfo in filelist:
         path, mtime, entries = fileinfo['path'], fileinfo.get('mtime', None), fileinfo.get('entries', None)
         name = basename(path)
-        fid = BytesIO(url_get(fileinfo, mtime_check=check_timestamps))
-        entries = readVSANSNexuz(name, fid) # metadata_lookup=div_metadata_lookup)
+        # metadata_lookup=div_metadata_lookup
+        entries = cached_load(fileinfo, readVSANSNexuz,
+                              mtime_check=check_timestamps)
         for entry in entries:
             div_entries = _loadDivData(entry)
             data.extend(div_entries)
@@ -325,7 +327,8 @@ def _loadDivData(entry):
             data_variance = np.sqrt(det['linear_data_error']['value'])
         else:
             data_variance = data
-        udata = Uncertainty(data, data_variance)
+        udata = Uncertainty(detector_array('vsans', data),
+                            detector_array('vsans', data_variance))
         det['data'] = udata
         det['norm'] = 1.0
         xDim, yDim = data.shape[:2]
@@ -612,7 +615,8 @@ def calculate_XY(raw_data, solid_angle_correction=True):
                     data_variance = np.sqrt(det['linear_data_error']['value'])
                 else:
                     data_variance = data
-                udata = Uncertainty(data, data_variance)
+                udata = Uncertainty(detector_array('vsans', data),
+                                    detector_array('vsans', data_variance))
 
             else:
                 
@@ -639,7 +643,8 @@ def calculate_XY(raw_data, solid_angle_correction=True):
                     data_variance = np.sqrt(det['linear_data_error']['value'])
                 else:
                     data_variance = data
-                udata = Uncertainty(data, data_variance)
+                udata = Uncertainty(detector_array('vsans', data),
+                                    detector_array('vsans', data_variance))
                 position_key = sn[-1]
                 if position_key == 'T':
                     # FROM IGOR: (q,p = 0 for lower-left pixel) 
@@ -16,10 +16,17 @@ import dataflow
 from dataflow.core import Template, load_instrument, lookup_instrument
 from dataflow.core import list_instruments as _list_instruments
 from dataflow.cache import get_cache
-from dataflow.calc import process_template
+from dataflow.calc import process_template, fingerprint_template
+from dataflow.calc import generate_fingerprint, _format_ordered
 from dataflow.rev import revision_info
+from dataflow.lib.pyramid import build_pyramid, select_tile
 from dataflow import configure
 from dataflow import fetch
+from dataflow.catalog import get_catalog
+from dataflow.jobs import get_jobs
+
+#: Longest time (seconds) that job_status and job_result will wait for a job
+MAX_JOB_WAIT = 30.
 
 api_methods = []
 
@@ -67,6 +74,12 @@ def get_file_metadata(source="ncnr", pathlist=None):
 
     if source not in [s['name'] for s in fetch.DATA_SOURCES]:
         raise ValueError("Source '{source}' not in available data sources".format(source=source))
+    catalog = get_catalog()
+    if catalog is not None and catalog.is_current(source, pathlist):
+        return catalog.listing(source, pathlist)
+    if source == "local" and catalog is not None:
+        catalog.update_local(source, pathlist)
+        return catalog.listing(source, pathlist)
     if source == "local":
         metadata = local_file_metadata(pathlist)
     else:
@@ -82,9 +95,24 @@ def get_file_metadata(source="ncnr", pathlist=None):
         #print("parsed response", metadata)
         # this converts json to python object, then the json-rpc lib converts it
         # right back, but it is more consistent for the client this way:
+        if catalog is not None:
+            catalog.update_listing(source, pathlist, metadata)
 
     return metadata
 
+@expose
+def find_files(source="ncnr", pathlist=None, **conditions):
+    """
+    Search the file catalog for entries matching *conditions*, which may
+    be any of *instrument, sample, intent, polarization, scan_min, scan_max*.
+
+    Only directories which have already been listed are searched.
+    """
+    catalog = get_catalog()
+    if catalog is None:
+        raise RuntimeError("File catalog is not configured")
+    return catalog.find(source, pathlist=pathlist, **conditions)
+
 @expose
 def get_instrument(instrument_id="ncnr.refl"):
     """
@@ -114,7 +142,8 @@ def find_calculated(template_def, config):
     return retval
 
 @expose
-def calc_terminal(template_def, config, nodenum, terminal_id, return_type='full', export_type="column", concatenate=True):
+def calc_terminal(template_def, config, nodenum, terminal_id, return_type='full', export_type="column", concatenate=True,
+                  start=None, stop=None, fields=None):
     """ json-rpc wrapper for calc_single
     template_def =
     {"name": "template_name",
@@ -144,6 +173,10 @@ def calc_terminal(template_def, config, nodenum, terminal_id, return_type='full'
 
     terminal_id is the id of the terminal for that module, that you want to get the value from
     (output terminals only).
+
+    For return_type 'full', start and stop select a range of datasets from
+    the bundle and fields lists the dataset attributes to return, such as
+    ["x", "v", "dv", "sample.angle_x"].  See Bundle.todict.
     """
     template = Template(**template_def)
     #print "template_def:", template_def, "config:", config, "target:",nodenum,terminal_id
@@ -156,25 +189,14 @@ def calc_terminal(template_def, config, nodenum, terminal_id, return_type='full'
         traceback.print_exc()
         raise
     if return_type == 'full':
-        return retval.todict()
+        return retval.todict(start=start, stop=stop, fields=fields)
     elif return_type == 'plottable':
         return retval.get_plottable()
     elif return_type == 'metadata':
         return retval.get_metadata()
     elif return_type == 'export':
-        # inject git version hash into export data:
-        rev_id = revision_info()
-        template_data = {
-            "template_data": {
-                "template": template_def,
-                "config": config,
-                "node": nodenum,
-                "terminal": terminal_id,
-                "server_git_hash": rev_id,
-                "export_type": export_type,
-                #"datasources": fetch.DATA_SOURCES, # Is this needed?
-            }
-        }
+        template_data = _export_template_data(
+            template_def, config, nodenum, terminal_id, export_type)
         to_export = retval.get_export(
             export_type=export_type, template_data=template_data,
             concatenate=concatenate)
@@ -183,6 +205,66 @@ def calc_terminal(template_def, config, nodenum, terminal_id, return_type='full'
 
     raise KeyError(return_type + " not a valid return_type (should be one of ['full', 'plottable', 'metadata', 'export'])")
 
+def _export_template_data(template_def, config, nodenum, terminal_id, export_type):
+    # inject git version hash into export data:
+    rev_id = revision_info()
+    return {
+        "template_data": {
+            "template": template_def,
+            "config": config,
+            "node": nodenum,
+            "terminal": terminal_id,
+            "server_git_hash": rev_id,
+            "export_type": export_type,
+            #"datasources": fetch.DATA_SOURCES, # Is this needed?
+        }
+    }
+
+def stream_export(template_def, config, nodenum, terminal_id, export_type="column", concatenate=True):
+    """
+    Streaming version of *calc_terminal(..., return_type='export')*.
+
+    Returns *(filename, chunks)*, where chunks is an iterator over the
+    bytes of the exported file, or of a zip archive of the files if they
+    are not concatenated.  The server sends the chunks as they are
+    produced rather than building the entire export in memory.
+    """
+    template = Template(**template_def)
+    retval = process_template(template, config, target=(nodenum, terminal_id))
+    template_data = _export_template_data(
+        template_def, config, nodenum, terminal_id, export_type)
+    return retval.stream_export(
+        export_type=export_type, template_data=template_data,
+        concatenate=concatenate)
+
+@expose
+def calc_tiles(template_def, config, nodenum, terminal_id, viewport=None, resolution=(512, 512)):
+    """
+    Return the part of each 2-D dataset on the terminal that is visible in
+    *viewport = [xmin, xmax, ymin, ymax]* (default all), at the coarsest
+    level of detail giving *resolution = [nx, ny]* pixels.
+
+    The level of detail pyramids are cached with the node fingerprint so
+    zooming and panning does not recompute or resend the full images.
+    See :func:`dataflow.lib.pyramid.select_tile` for the returned values.
+    """
+    template = Template(**template_def)
+    fingerprint = fingerprint_template(template, config)[nodenum]
+    key = generate_fingerprint(["pyramid", fingerprint, str(terminal_id)])
+    cache = get_cache()
+    if cache.exists(key):
+        datatype, pyramids = cache.retrieve(key)
+    else:
+        retval = process_template(template, config, target=(nodenum, terminal_id))
+        if not all(hasattr(v, 'get_image') for v in retval.values):
+            raise ValueError("%s does not provide 2-D images" % retval.datatype.id)
+        datatype = retval.datatype.id
+        pyramids = [build_pyramid(*v.get_image()) for v in retval.values]
+        cache.store(key, (datatype, pyramids))
+    values = [select_tile(p, viewport=viewport, resolution=resolution)
+              for p in pyramids]
+    return {'datatype': datatype, 'values': values}
+
 @expose
 def calc_template(template_def, config):
     """ json-rpc wrapper for process_template """
@@ -197,12 +279,96 @@ def calc_template(template_def, config):
         raise
     output = {}
     for rkey, rv in retvals.items():
-        module_id, terminal_id = rkey
+        module_id, terminal_id = rkey.split(":", 1)
         module_key = str(module_id)
         output.setdefault(module_key, {})
         output[module_key][terminal_id] = rv.todict()
     return output
 
+JOB_METHODS = {
+    'calc_terminal': calc_terminal,
+    'calc_template': calc_template,
+}
+
+#: Methods whose response is determined by the template fingerprints
+FINGERPRINT_METHODS = ('calc_terminal', 'calc_template', 'calc_tiles', 'stream_export')
+
+def _request_fingerprint(method, params):
+    """
+    Key the request by the fingerprints of the nodes it computes and the
+    response options, so that identical requests share jobs and cache
+    validators.
+    """
+    template = Template(**params['template_def'])
+    fingerprints = fingerprint_template(template, params['config'])
+    if 'nodenum' in params:
+        parts = [fingerprints[params['nodenum']]]
+        options = dict((k, v) for k, v in params.items()
+                       if k not in ('template_def', 'config'))
+        if method == 'stream_export' or options.get('return_type', None) == 'export':
+            # the template is embedded in the export, so it must match too
+            options['template_def'] = params['template_def']
+            options['config'] = params['config']
+        parts.append(str(_format_ordered(options)))
+    else:
+        parts = [fingerprints[node] for node in sorted(fingerprints)]
+    return generate_fingerprint([method] + parts)
+
+def response_etag(method, params):
+    """
+    Return the entity tag for the response to *method* with *params*, or
+    None if the response is not determined by the template.
+
+    The tag is built from the node fingerprints without computing the
+    nodes, so it is cheap to check against If-None-Match.  It includes the
+    server revision since the calculations may change between versions.
+    """
+    if method not in FINGERPRINT_METHODS:
+        return None
+    return generate_fingerprint(
+        [_request_fingerprint(method, params), revision_info()])
+
+def _get_jobs():
+    jobs = get_jobs()
+    if jobs is None:
+        raise RuntimeError("Job queue is not configured")
+    return jobs
+
+@expose
+def submit_job(method, params):
+    r"""
+    Queue the calculation *method(\*\*params)*, where *method* is one of
+    *calc_terminal* or *calc_template*.
+
+    Returns the job status, *{job_id, status}*.  The job id is determined
+    by the calculation, so identical submissions return the same job.
+    """
+    if method not in JOB_METHODS:
+        raise ValueError("method %r cannot be run as a job (should be one of %s)"
+                         % (method, list(sorted(JOB_METHODS))))
+    job_id = _request_fingerprint(method, params)
+    return _get_jobs().submit(job_id, JOB_METHODS[method], kwargs=params)
+
+@expose
+def job_status(job_id, timeout=0):
+    """
+    Return the job status, *{job_id, status}* where status is one of
+    pending, running, done or error, with *exception* and *traceback*
+    for failed jobs.
+
+    If *timeout* is given, wait up to that many seconds for the job to
+    finish before returning.
+    """
+    return _get_jobs().status(job_id, timeout=min(timeout, MAX_JOB_WAIT))
+
+@expose
+def job_result(job_id, timeout=0):
+    """
+    Return the result of the job, waiting up to *timeout* seconds for it
+    to finish.  Raises an error if the job failed or is not yet finished.
+    """
+    return _get_jobs().result(job_id, timeout=min(timeout, MAX_JOB_WAIT))
+
 @expose
 def list_datasources():
     return fetch.DATA_SOURCES
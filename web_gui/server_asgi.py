@@ -0,0 +1,201 @@
+"""
+Asynchronous server for the reduction api.
+
+To serve with uvicorn (or any other ASGI server):
+
+uvicorn --factory web_gui.server_asgi:create_app --port 8002
+
+To serve with python (requires uvicorn):
+
+python -m web_gui.server_asgi 8002
+(then visit http://localhost:8002/static/index.html in your browser)
+
+The api methods are the same as for server_flask.  Calculations run in a
+pool of worker processes, each configured like the server, with the
+response packed in the worker so that only bytes are returned.  Light
+requests such as file listings and instrument definitions run in threads,
+so a single server process can handle many concurrent clients.
+"""
+import os
+import sys
+import json
+import asyncio
+import logging
+import mimetypes
+import posixpath
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import msgpack as msgpack_converter
+
+from dataflow.lib.msgpack_ndarray import packb, BINARY_ARRAYS_MIMETYPE
+
+RPC_ENDPOINT = '/RPC2'
+STATIC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+#: Methods which compute reductions and run in the process pool
+CPU_METHODS = frozenset(('calc_terminal', 'calc_template', 'calc_tiles'))
+
+
+def _initialize_worker(config):
+    from web_gui import api
+    api.initialize(config)
+
+def _error_content(exc):
+    return {'exception': repr(exc), 'traceback': traceback.format_exc()}
+
+def call_method(method, kwargs, binary_arrays=False):
+    """
+    Call the api *method* and pack the result, returning *(status, bytes)*.
+    """
+    from web_gui import api
+    try:
+        content = getattr(api, method)(**kwargs)
+        return 200, packb(content, binary_arrays=binary_arrays)
+    except Exception as exc:
+        content = _error_content(exc)
+        logging.info(content['traceback'])
+        return 500, msgpack_converter.packb(content, use_bin_type=True)
+
+
+class ReductionServer(object):
+    """
+    ASGI application serving the reduction api.
+
+    *workers* is the number of processes for calculations and *threads*
+    the number of threads for the remaining requests.
+    """
+    def __init__(self, config=None, workers=None, threads=32):
+        from web_gui import api
+        self.config = config
+        self.workers = workers
+        self.threads = threads
+        self.methods = frozenset(api.api_methods)
+        self._processes = None
+        self._threads = None
+
+    def startup(self):
+        from web_gui import api
+        from dataflow.rev import print_revision
+        api.initialize(self.config)
+        self._processes = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_initialize_worker,
+            initargs=(self.config,))
+        self._threads = ThreadPoolExecutor(max_workers=self.threads)
+        print_revision()
+
+    def shutdown(self):
+        if self._processes is not None:
+            self._processes.shutdown(wait=False)
+            self._threads.shutdown(wait=False)
+            self._processes = self._threads = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            if self._processes is None:
+                # Server did not send lifespan events.
+                self.startup()
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        path = scope['path']
+        if scope['method'] == 'GET':
+            if path == '/':
+                await _respond(send, 302, b'', headers=[(b'location', b'static/index.html')])
+            elif path == '/robots.txt' or path.startswith('/static/'):
+                await self._static(send, path)
+            else:
+                await _respond(send, 404, b'not found')
+            return
+
+        method = posixpath.basename(path)
+        if (scope['method'] != 'POST' or method not in self.methods
+                or posixpath.dirname(path) not in ('/', RPC_ENDPOINT)):
+            await _respond(send, 404, b'not found')
+            return
+
+        body = await _read_body(receive)
+        headers = dict(scope['headers'])
+        binary_arrays = BINARY_ARRAYS_MIMETYPE.encode('ascii') in headers.get(b'accept', b'')
+        try:
+            kwargs = json.loads(body.decode('utf-8')) if body else {}
+        except Exception as exc:
+            content = _error_content(exc)
+            await _respond(send, 400, msgpack_converter.packb(content, use_bin_type=True))
+            return
+        pool = self._processes if method in CPU_METHODS else self._threads
+        loop = asyncio.get_running_loop()
+        status, packed = await loop.run_in_executor(
+            pool, call_method, method, kwargs, binary_arrays)
+        content_type = (BINARY_ARRAYS_MIMETYPE if binary_arrays and status == 200
+                        else 'application/msgpack')
+        await _respond(send, status, packed, content_type=content_type)
+
+    async def _static(self, send, path):
+        relpath = posixpath.normpath(path[len('/static/'):] if path.startswith('/static/') else path[1:])
+        if relpath.startswith('..') or relpath.startswith('/'):
+            await _respond(send, 404, b'not found')
+            return
+        filename = os.path.join(STATIC_PATH, *relpath.split('/'))
+        if not os.path.isfile(filename):
+            await _respond(send, 404, b'not found')
+            return
+        loop = asyncio.get_running_loop()
+        content = await loop.run_in_executor(self._threads, _read_file, filename)
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        await _respond(send, 200, content, content_type=content_type,
+                       headers=[(b'cache-control', b'no-cache')])
+
+def _read_file(filename):
+    with open(filename, 'rb') as fid:
+        return fid.read()
+
+async def _read_body(receive):
+    body = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        body.append(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    return b''.join(body)
+
+async def _respond(send, status, content, content_type='text/plain', headers=()):
+    headers = [
+        (b'content-type', content_type.encode('ascii')),
+        (b'content-length', str(len(content)).encode('ascii')),
+    ] + list(headers)
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': content})
+
+
+def create_app(config=None, workers=None):
+    """
+    Create the ASGI application.  If *config* is not given, then the
+    server configuration is loaded from configurations/config.py.
+    """
+    if config is None:
+        from dataflow.configure import load_config
+        config = load_config('config')
+    return ReductionServer(config=config, workers=workers)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    logging.basicConfig(level=logging.WARNING)
+    port = 8002
+    if len(sys.argv) > 1:
+        port = int(sys.argv[1])
+    uvicorn.run(create_app(), port=port)
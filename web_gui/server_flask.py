@@ -8,18 +8,44 @@ To serve with python:
 python server_flask.py 8002
 (then visit http://localhost:8002/static/index.html in your browser)
 
+Calculation responses carry an ETag derived from the node fingerprints,
+and requests with a matching If-None-Match return 304 Not Modified without
+recomputing.  The responses may be stored by a reverse proxy, which must
+revalidate them.  Since the api uses POST, the proxy must be told to cache
+POST requests keyed on the body, e.g., for nginx:
+
+    proxy_cache_methods POST;
+    proxy_cache_key "$request_uri|$request_body|$http_accept";
+    proxy_cache_revalidate on;
+
+If the "compression" entry is given in the configuration, responses are
+compressed according to Accept-Encoding; see configurations/default.py.
 """
 import os, sys, posixpath
 import traceback
 import logging
+from itertools import chain
 import pkg_resources
 
-from flask import Flask, request, make_response, redirect, send_from_directory
+from flask import Flask, Response, request, make_response, redirect, send_from_directory
+from flask import stream_with_context
 from werkzeug.exceptions import HTTPException
 import msgpack as msgpack_converter
 
+from dataflow.lib.msgpack_ndarray import packb, BINARY_ARRAYS_MIMETYPE
+from dataflow.lib.compression import ResponseEncoder
+
+#: Exports which are already compressed and are sent as is
+PRECOMPRESSED_SUFFIXES = ('.zip', '.hdf5')
+
 def create_app(config=None):
     from web_gui import api
+    from dataflow.configure import load_config
+
+    if config is None:
+        config = load_config('config')
+    # Compression is opt-in; with no encodings the responses are sent as is.
+    encoder = ResponseEncoder(**config.get('compression', {'encodings': []}))
 
     RPC_ENDPOINT = '/RPC2'
     STATIC_PATH = pkg_resources.resource_filename('web_gui', 'static/')
@@ -35,6 +61,14 @@ def create_app(config=None):
     def static_from_root():
         return send_from_directory(app.static_folder, request.path[1:])
 
+    @app.route('/health')
+    def health():
+        # For load balancers and process monitors.
+        response = make_response("ok %d" % os.getpid())
+        response.headers['Content-Type'] = 'text/plain'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
     @app.errorhandler(Exception)
     def handle_error(e):
         code = 500
@@ -42,23 +76,93 @@ def create_app(config=None):
             code = e.code
         content = {'exception': repr(e), 'traceback': traceback.format_exc()}
         logging.info(content['traceback'])
-        return make_response(msgpack_converter.packb(content, use_bin_type=True), code)
-
-    def wrap_method(mfunc):
+        response = make_response(msgpack_converter.packb(content, use_bin_type=True), code)
+        response.headers['Content-Type'] = 'application/msgpack'
+        return response
+
+    def set_validators(response, etag):
+        # The content is fixed by the fingerprint, but proxies must check
+        # with the server in case the inputs or server revision changed.
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'public, max-age=0, must-revalidate'
+        response.headers['Vary'] = 'Accept, Accept-Encoding'
+        return response
+
+    def not_modified(etag):
+        return set_validators(Response(status=304), etag)
+
+    def encoded_etag(etag, encoding):
+        # Each encoding is a different representation, needing its own tag.
+        return etag if encoding is None else etag + "-" + encoding
+
+    def match_etag(etag, encoding):
+        # If-None-Match uses weak comparison (RFC 7232), so tags weakened
+        # by proxies that recompress the response still match.
+        for tag in (etag, encoded_etag(etag, encoding)):
+            if request.if_none_match.contains_weak(tag):
+                return tag
+        return None
+
+    def wrap_method(method, mfunc):
         def wrapper(*args, **kwargs):
             real_kwargs = request.get_json() if request.get_data() else {}
-            content = mfunc(*args, **real_kwargs)
-            packed = msgpack_converter.packb(content, use_bin_type=True)
-            response = make_response(packed)
-            response.headers['Content-Type'] = 'application/msgpack'
+            # Clients that understand binary arrays ask for them in Accept.
+            binary_arrays = BINARY_ARRAYS_MIMETYPE in request.headers.get('Accept', '')
+            content_type = BINARY_ARRAYS_MIMETYPE if binary_arrays else 'application/msgpack'
+            encoding = encoder.choose(request.headers.get('Accept-Encoding', ''))
+            etag = api.response_etag(method, real_kwargs)
+            body = None
+            if etag is not None:
+                etag += "-binary" if binary_arrays else ""
+                matched = match_etag(etag, encoding)
+                if matched is not None:
+                    return not_modified(matched)
+                body = encoder.lookup(etag, encoding)
+            if body is None:
+                content = mfunc(*args, **real_kwargs)
+                packed = packb(content, binary_arrays=binary_arrays)
+                body, encoding = encoder.encode(packed, encoding, etag=etag)
+            response = make_response(body)
+            response.headers['Content-Type'] = content_type
+            response.headers['Vary'] = 'Accept, Accept-Encoding'
+            if encoding is not None:
+                response.headers['Content-Encoding'] = encoding
+            if etag is not None:
+                set_validators(response, encoded_etag(etag, encoding))
             return response
         return wrapper
 
+    @app.route(posixpath.join(RPC_ENDPOINT, 'stream_export'), methods=["POST"])
+    @app.route('/stream_export', methods=["POST"])
+    def stream_export():
+        # Export chunks are sent as they are produced (chunked transfer).
+        kwargs = request.get_json() if request.get_data() else {}
+        encoding = encoder.choose(request.headers.get('Accept-Encoding', ''))
+        etag = api.response_etag('stream_export', kwargs)
+        matched = match_etag(etag, encoding)
+        if matched is not None:
+            return not_modified(matched)
+        filename, chunks = api.stream_export(**kwargs)
+        if filename.endswith(PRECOMPRESSED_SUFFIXES):
+            encoding = None
+        # Produce the first chunk before responding so that a failing export
+        # is reported by handle_error instead of truncating the stream.
+        chunks = iter(chunks)
+        chunks = chain([next(chunks, b"")], chunks)
+        chunks = encoder.encode_stream(chunks, encoding)
+        response = Response(stream_with_context(chunks),
+                            mimetype='application/octet-stream')
+        response.headers['Content-Disposition'] = (
+            'attachment; filename="%s"' % filename.replace('"', ''))
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        return set_validators(response, encoded_etag(etag, encoding))
+
     api.initialize(config)
 
     for method in api.api_methods:
         mfunc = getattr(api, method)
-        wrapped = wrap_method(mfunc)
+        wrapped = wrap_method(method, mfunc)
         path = posixpath.join(RPC_ENDPOINT, method)
         shortpath = posixpath.join("/", method)
         app.add_url_rule(path, path, wrapped, methods=["POST"])
@@ -69,6 +173,7 @@ def create_app(config=None):
 
     return app
 
+
 if __name__ == '__main__':
     logging.basicConfig(level=logging.WARNING)
     port = 8002
@@ -0,0 +1,310 @@
+"""
+Pre-forking server for the reduction api.
+
+To serve on port 8002 with 8 worker processes:
+
+python -m web_gui.server_prefork --port 8002 --workers 8
+
+The parent process loads the configuration, registers the instruments
+(parsing all module definitions), imports the numerical libraries and
+builds the instrument definitions before forking, so the workers start
+warm and share these pages copy-on-write.  Database connections are
+closed before forking and reopened by each worker.
+
+Each worker serves requests from the shared listening socket one at a
+time.  A worker exits after *max_requests* requests or once its resident
+memory has grown by more than *max_rss* megabytes since it was forked,
+and the parent starts a replacement.  The parent also checks the worker
+heartbeats, killing workers which stop responding or which spend more
+than *timeout* seconds on one request.
+Send SIGHUP to the parent to recycle all workers, or SIGTERM to stop.
+
+Jobs submitted with submit_job must use the redis broker when there is
+more than one worker, since the local job pool is private to each process.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import errno
+import signal
+import socket
+import logging
+import importlib
+import multiprocessing
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+
+#: Modules imported by the parent so that the workers need not load them
+PRELOAD_MODULES = (
+    "numpy", "scipy", "scipy.special", "scipy.optimize", "scipy.interpolate",
+    "h5py", "msgpack",
+)
+
+#: Seconds an idle worker may go without a heartbeat before it is killed
+IDLE_TIMEOUT = 30.
+
+
+def warm_up(config):
+    """
+    Initialize the server in the current process, returning the app.
+    """
+    from web_gui.server_flask import create_app
+    from web_gui import api
+
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    app = create_app(config)
+    for instrument_id in api.list_instruments():
+        api.get_instrument(instrument_id)
+    return app
+
+def _close_connections():
+    """
+    Close the cache and catalog connections so that they are not shared
+    between the forked processes.
+    """
+    from dataflow.cache import CACHE_MANAGER
+    from dataflow import catalog
+    for store in (CACHE_MANAGER._cache, CACHE_MANAGER._file_cache):
+        if hasattr(store, 'close'):
+            store.close()
+    if catalog.get_catalog() is not None:
+        catalog.get_catalog().close()
+        catalog.CATALOG = None
+
+def _current_rss():
+    """
+    Resident memory of the current process in megabytes.
+
+    Uses /proc/self/statm where available.  Otherwise falls back to the
+    peak resident memory from getrusage, which never decreases.
+    """
+    try:
+        with open('/proc/self/statm') as fid:
+            pages = int(fid.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2.**20
+    except (IOError, OSError, ValueError, IndexError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on linux but in bytes on mac
+        return rss / (2.**20 if sys.platform == 'darwin' else 2.**10)
+
+
+class _RequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        logging.info("%s - %s", self.address_string(), format % args)
+
+class _SharedSocketServer(WSGIServer):
+    """
+    WSGI server accepting connections from an existing listening socket.
+    """
+    def __init__(self, sock, app):
+        WSGIServer.__init__(self, sock.getsockname()[:2], _RequestHandler,
+                            bind_and_activate=False)
+        self.socket.close()
+        self.socket = sock
+        host, port = sock.getsockname()[:2]
+        self.server_name = socket.getfqdn(host)
+        self.server_port = port
+        self.setup_environ()
+        self.set_app(app)
+
+    def get_request(self):
+        # The listening socket is non-blocking so that workers which lose
+        # the race for a connection return to their loop.
+        conn, addr = self.socket.accept()
+        conn.setblocking(True)
+        return conn, addr
+
+
+class PreforkServer(object):
+    """
+    Serve the WSGI *app* from *workers* forked processes.
+
+    *max_requests* and *max_rss* (megabytes) limit the requests and memory
+    growth of each worker before it is replaced, and *timeout* is the
+    longest time in seconds a worker may spend on a request.  Each worker
+    calls *initializer* with *initargs* after it is forked, before serving
+    requests.
+    """
+    def __init__(self, app, host='127.0.0.1', port=8002, workers=4,
+                 max_requests=1000, max_rss=None, timeout=600.,
+                 initializer=None, initargs=()):
+        self.app = app
+        self.initializer = initializer
+        self.initargs = initargs
+        self.address = (host, port)
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_rss = max_rss
+        self.timeout = timeout
+        self._pids = {}  # pid => worker slot
+        self._stopping = False
+        self._recycle = False
+        self.socket = None
+        self.heartbeat = self.busy = None
+
+    def serve(self):
+        if not hasattr(os, 'fork'):
+            raise RuntimeError("pre-fork server requires os.fork")
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(self.address)
+        self.socket.listen(128)
+        self.socket.setblocking(False)
+        self.address = self.socket.getsockname()[:2]
+        # Shared memory for worker health: last heartbeat and whether the
+        # worker is handling a request.
+        self.heartbeat = multiprocessing.RawArray('d', self.workers)
+        self.busy = multiprocessing.RawArray('b', self.workers)
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_recycle)
+        print("serving on http://%s:%d with %d workers"
+              % (self.address[0], self.address[1], self.workers))
+        for slot in range(self.workers):
+            self._spawn(slot)
+        try:
+            while not self._stopping:
+                if self._recycle:
+                    self._recycle = False
+                    self._signal_workers(signal.SIGTERM)
+                self._reap()
+                self._check_health()
+                time.sleep(0.5)
+        finally:
+            self._stop_workers()
+            self.socket.close()
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def _handle_recycle(self, signum, frame):
+        self._recycle = True
+
+    def _spawn(self, slot):
+        self.heartbeat[slot] = time.time()
+        self.busy[slot] = 0
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                self._run_worker(slot)
+            except Exception:
+                logging.exception("worker %d failed", slot)
+                status = 1
+            finally:
+                os._exit(status)
+        self._pids[pid] = slot
+
+    def _reap(self):
+        while self._pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as exc:
+                if exc.errno == errno.ECHILD:
+                    break
+                raise
+            if pid == 0:
+                break
+            slot = self._pids.pop(pid, None)
+            if slot is not None and not self._stopping:
+                self._spawn(slot)
+
+    def _check_health(self):
+        now = time.time()
+        for pid, slot in list(self._pids.items()):
+            limit = self.timeout if self.busy[slot] else IDLE_TIMEOUT
+            if now - self.heartbeat[slot] > limit:
+                logging.warning("killing unresponsive worker %d (pid %d)", slot, pid)
+                _kill(pid, signal.SIGKILL)
+
+    def _signal_workers(self, signum):
+        for pid in list(self._pids):
+            _kill(pid, signum)
+
+    def _stop_workers(self, grace=10.):
+        self._signal_workers(signal.SIGTERM)
+        deadline = time.time() + grace
+        while self._pids and time.time() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        self._signal_workers(signal.SIGKILL)
+        self._reap()
+
+    def _run_worker(self, slot):
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(True))
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        if self.initializer is not None:
+            self.initializer(*self.initargs)
+        # Right after the fork, the resident memory includes the pages
+        # shared with the warmed parent, so measure growth from here.
+        baseline_rss = _current_rss()
+        requests = [0]
+        def app(environ, start_response):
+            self.busy[slot] = 1
+            self.heartbeat[slot] = time.time()
+            requests[0] += 1
+            return self.app(environ, start_response)
+        server = _SharedSocketServer(self.socket, app)
+        server.timeout = 1.
+        while not stopping and requests[0] < self.max_requests:
+            self.busy[slot] = 0
+            self.heartbeat[slot] = time.time()
+            if (self.max_rss is not None
+                    and _current_rss() - baseline_rss > self.max_rss):
+                break
+            server.handle_request()
+
+def _kill(pid, signum):
+    try:
+        os.kill(pid, signum)
+    except OSError:
+        pass
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="pre-forking reduction server")
+    parser.add_argument('-p', '--port', default=8002, type=int, help='port on which to start the server')
+    parser.add_argument('--external', action='store_true', help='listen on all interfaces')
+    parser.add_argument('-w', '--workers', default=4, type=int, help='number of worker processes')
+    parser.add_argument('--max-requests', default=1000, type=int, help='requests before a worker is replaced')
+    parser.add_argument('--max-rss', default=None, type=float, help='memory growth (MB) before a worker is replaced')
+    parser.add_argument('--timeout', default=600., type=float, help='longest time (s) for a request')
+    parser.add_argument('-c', '--config-file', type=str, help='path to JSON configuration to load')
+    args = parser.parse_args()
+    if args.config_file is not None:
+        config = json.loads(open(args.config_file, 'rt').read())
+    else:
+        from dataflow.configure import load_config
+        config = load_config(name="config", fallback=True)
+    jobs_config = config.get('jobs', None)
+    if args.workers > 1 and jobs_config and jobs_config.get('broker', None) is None:
+        # Local jobs are only known to the worker that submitted them.
+        parser.error("jobs need a broker when serving with more than one worker")
+
+    logging.basicConfig(level=logging.WARNING)
+    app = warm_up(config)
+    _close_connections()
+    # Workers reopen the connections; the instruments are already loaded.
+    from dataflow.configure import apply_config
+    host = '0.0.0.0' if args.external else '127.0.0.1'
+    server = PreforkServer(
+        app, host=host, port=args.port, workers=args.workers,
+        max_requests=args.max_requests, max_rss=args.max_rss,
+        timeout=args.timeout, initializer=apply_config, initargs=(config,))
+    server.serve()
+
+
+if __name__ == '__main__':
+    main()
@@ -487,7 +487,8 @@ webreduce.editor = webreduce.editor || {};
         .append("div").append("pre")
         .style("overflow", "auto")
         .classed("paramsDisplay", true)
-        .text(function(d) {return JSON.stringify(d, null, 2)})
+        .text(function(d) {return JSON.stringify(d, function(k, v) {
+          return ArrayBuffer.isView(v) ? Array.from(v) : v }, 2)})
     return data
   }
 
@@ -814,7 +815,8 @@ webreduce.editor = webreduce.editor || {};
         return a.length<b.length ? a : b
     });
 
-    return shortest.map(function(_,i){
+    // Columns may be typed arrays, whose map would coerce each pair to NaN.
+    return Array.from(shortest, function(_,i){
         return args.map(function(array){return array[i]})
     });
   }
@@ -1617,10 +1619,12 @@ webreduce.editor = webreduce.editor || {};
       })
     
     
-    function isObject(val) { return typeof val === 'object' && !Array.isArray(val)};
+    // Numeric arrays may arrive as typed arrays (see server_api/hug_msgpack.js)
+    function isArray(val) { return Array.isArray(val) || ArrayBuffer.isView(val) };
+    function isObject(val) { return typeof val === 'object' && !isArray(val)};
     function get_all_keys(obj) {
       var keys = Object.keys(obj);
-      keys = keys.filter(function(k) { return !Array.isArray(obj[k]) });
+      keys = keys.filter(function(k) { return !isArray(obj[k]) });
       var output_keys = [];
       keys.forEach(function(k) {
         if (obj[k] && isObject(obj[k])) {
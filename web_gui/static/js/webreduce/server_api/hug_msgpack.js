@@ -2,6 +2,49 @@ webreduce = window.webreduce || {};
 webreduce.server_api = webreduce.server_api || {};
 
 (function(app) {
+  // Numeric arrays arrive as msgpack extensions holding [dtype, shape, bytes]
+  // (see dataflow/lib/msgpack_ndarray.py).  They are returned as typed
+  // arrays, with n-D arrays as nested lists of row views into one buffer,
+  // so no per-element work is done.  64-bit integers are converted to
+  // numbers since BigInt values cannot be mixed with numbers in the plots.
+  var NDARRAY_EXT = 16;
+  var BINARY_ARRAYS_MIMETYPE = "application/x-msgpack-ndarray";
+  var TYPED_ARRAYS = {
+    "|u1": Uint8Array, "|i1": Int8Array, "<u2": Uint16Array, "<i2": Int16Array,
+    "<u4": Uint32Array, "<i4": Int32Array, "<f4": Float32Array, "<f8": Float64Array,
+    "<i8": (typeof BigInt64Array === "undefined") ? null : BigInt64Array,
+    "<u8": (typeof BigUint64Array === "undefined") ? null : BigUint64Array
+  };
+  var BIGINT_DTYPES = {"<i8": true, "<u8": true};
+  function reshape(values, shape, offset) {
+    if (shape.length <= 1) {
+      return values.subarray(offset, offset + (shape.length ? shape[0] : 1));
+    }
+    var stride = shape.slice(1).reduce(function(a, b) { return a*b }, 1);
+    var output = [];
+    for (var i=0; i<shape[0]; i++) {
+      output.push(reshape(values, shape.slice(1), offset + i*stride));
+    }
+    return output;
+  }
+  function unpack_ndarray(buffer) {
+    var parts = msgpack.decode(buffer),
+        dtype = parts[0], shape = parts[1], data = parts[2],
+        TypedArray = TYPED_ARRAYS.hasOwnProperty(dtype) ? TYPED_ARRAYS[dtype] : null;
+    if (!TypedArray) {
+      throw new Error("unsupported binary array type " + dtype);
+    }
+    // Copy the bytes so the typed array is aligned on its element size.
+    var bytes = data.buffer.slice(data.byteOffset, data.byteOffset + data.byteLength),
+        values = new TypedArray(bytes);
+    if (BIGINT_DTYPES[dtype]) {
+      values = Float64Array.from(values, Number);
+    }
+    return (shape.length == 0) ? values[0] : reshape(values, shape, 0);
+  }
+  var codec = msgpack.createCodec();
+  codec.addExtUnpacker(NDARRAY_EXT, unpack_ndarray);
+
   function wrap_hug_msgpack(method_name) {
     function wrapped(args) {
       var r = new Promise(function(resolve, reject) {
@@ -10,12 +53,13 @@ webreduce.server_api = webreduce.server_api || {};
         xhr.open("POST", endpoint, true);
         
         xhr.setRequestHeader("Content-type", "application/json");
+        xhr.setRequestHeader("Accept", BINARY_ARRAYS_MIMETYPE + ", application/msgpack");
         xhr.responseType = "arraybuffer";
 
         xhr.onreadystatechange = function() {
           if (xhr.readyState == XMLHttpRequest.DONE) {
             var responseArray = new Uint8Array(xhr.response),
-            decoded = msgpack.decode(responseArray);
+            decoded = msgpack.decode(responseArray, {codec: codec});
             ((xhr.status == 200) ? resolve : reject)(decoded);
           }
         }